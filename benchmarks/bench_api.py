@@ -0,0 +1,163 @@
+"""Load benchmark for the /api read path
+
+Starts the fake upstream and the app on a local threaded server, against
+a throwaway database and with the scheduler off, runs one fetch cycle by
+hand, then drives every /api route with concurrent clients and records
+throughput and latency percentiles:
+
+    python -m benchmarks.bench_api --requests 2000 --concurrency 16
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.common import fake_upstream_environment, percentiles, save_results
+from benchmarks.fake_upstream import start_fake_upstream
+
+# Route name -> path under /api; the event stream is long-lived and left out.
+# {portfolio_id} is the portfolio the benchmark creates.
+ROUTES = {
+    'currency-rates': '/currency-rates',
+    'stock-indices': '/stock-indices',
+    'commodity-prices': '/commodity-prices',
+    'crypto-prices': '/crypto-prices',
+    'financial-news': '/financial-news',
+    'gainers-losers': '/gainers-losers',
+    'gainers-losers-top': '/gainers-losers?n=5',
+    'news-search': '/news/search?q=markets',
+    'snapshot': '/snapshot',
+    'snapshot-subset': '/snapshot?sections=currency-rates,crypto-prices',
+    'convert': '/convert?from=USD&to=INR&amount=100',
+    'history': '/history/currency/USD-INR',
+    'stats': '/stats/USD-INR',
+    'convert-batch': '/convert/batch',
+    'portfolio-valuation': '/portfolio/{portfolio_id}/valuation',
+}
+
+# Route name -> JSON body of the routes that are POSTed
+BODIES = {
+    'convert-batch': {'from': ['USD', 'EUR', 'GBP', 'JPY'] * 25, 'to': ['INR'] * 100,
+                      'amount': list(range(1, 101))},
+}
+
+PORTFOLIO = {
+    'name': 'Benchmark',
+    'holdings': [
+        {'asset_class': 'equity', 'symbol': 'RELIANCE.NS', 'quantity': 10},
+        {'asset_class': 'crypto', 'symbol': 'BITCOIN', 'quantity': 0.5},
+        {'asset_class': 'commodity', 'symbol': 'GOLD', 'quantity': 100},
+        {'asset_class': 'cash', 'symbol': 'USD', 'quantity': 1000},
+    ],
+}
+
+def wait_for_data(base_url: str, timeout: float) -> bool:
+    """Wait until the snapshot holds freshly fetched data"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'{base_url}/api/snapshot', timeout=2).json().get('stale') is False:
+                return True
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.2)
+    return False
+
+def run_route(url: str, total: int, concurrency: int, conditional: bool, body=None):
+    sessions = threading.local()
+    etags = {}
+
+    def one(_):
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        headers = {'Accept-Encoding': 'gzip'}
+        if conditional and url in etags:
+            headers['If-None-Match'] = etags[url]
+        started = time.perf_counter()
+        if body is None:
+            response = session.get(url, headers=headers, timeout=10)
+        else:
+            response = session.post(url, json=body, headers=headers, timeout=10)
+        elapsed = time.perf_counter() - started
+        if conditional and 'ETag' in response.headers:
+            etags[url] = response.headers['ETag']
+        return elapsed, response.status_code, len(response.content)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    statuses = {}
+    for _, status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': total,
+        'throughput_rps': total / wall,
+        'latency': percentiles([elapsed for elapsed, _, _ in outcomes]),
+        'statuses': statuses,
+        'bytes': sum(size for _, _, size in outcomes),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', help='comma-separated route names (default: all)')
+    parser.add_argument('--conditional', action='store_true', help='revalidate with If-None-Match')
+    parser.add_argument('--latency', type=float, default=20, help='mean upstream latency in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream requests that fail')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/)')
+    args = parser.parse_args()
+    routes = {name: ROUTES[name] for name in args.routes.split(',')} if args.routes else ROUTES
+
+    upstream, upstream_url = start_fake_upstream(args.latency / 1000, 0.0, args.error_rate)
+    os.environ.update(fake_upstream_environment(upstream_url))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Keep the tracked database and runtime files out of it, and store what
+    # is fetched so history and news search have rows to read
+    workdir = tempfile.mkdtemp(prefix='wealth_vista_bench_')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'RUNTIME_DIR': os.path.join(workdir, 'runtime'),
+        'SCHEDULER_ENABLED': 'false',
+        'PERSIST_SNAPSHOTS': 'true',
+    })
+
+    started = time.perf_counter()
+    from core import app, scheduler
+    startup = time.perf_counter() - started
+    # One fetch cycle from the fake upstream; nothing refetches while routes are measured
+    scheduler.get_job('initial_fetch').func()
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    if not wait_for_data(base_url, timeout=5):
+        print("Warning: the fetch cycle did not publish fresh data; measuring whatever is cached")
+    portfolio_id = requests.post(f'{base_url}/api/portfolio', json=PORTFOLIO, timeout=10).json()['data']['id']
+
+    results = {'startup_ms': startup * 1000, 'routes': {}}
+    try:
+        for name, path in routes.items():
+            results['routes'][name] = run_route(f'{base_url}/api{path.format(portfolio_id=portfolio_id)}',
+                                                args.requests, args.concurrency, args.conditional,
+                                                BODIES.get(name))
+            route = results['routes'][name]
+            print(f"{name:18} {route['throughput_rps']:8.0f} req/s  p50 {route['latency']['p50_ms']:6.2f} ms"
+                  f"  p99 {route['latency']['p99_ms']:6.2f} ms  {route['statuses']}")
+    finally:
+        server.shutdown()
+        upstream.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Saved {save_results('api', vars(args), results, args.output)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Fetch-cycle benchmark against the fake upstream
+
+Runs complete fetch cycles (every provider in parallel under the cycle
+deadline) and records the cycle time, the time per data set and the
+upstream request counts, then saves the run as JSON:
+
+    python -m benchmarks.bench_fetch --cycles 10 --latency 80 --error-rate 0.05
+"""
+import argparse
+import os
+import time
+from benchmarks.common import fake_upstream_environment, percentiles, save_results
+from benchmarks.fake_upstream import start_fake_upstream
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=50, help='mean upstream latency in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='upstream latency standard deviation in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream requests that fail')
+    parser.add_argument('--universe', type=int, default=0,
+                        help='synthetic stock universe size (default: the configured universe)')
+    parser.add_argument('--no-rate-limits', action='store_true',
+                        help="ignore the providers' free-tier rate limits")
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/)')
+    args = parser.parse_args()
+
+    server, base_url = start_fake_upstream(args.latency / 1000, args.jitter / 1000, args.error_rate)
+    os.environ.update(fake_upstream_environment(base_url))
+    if args.universe:
+        os.environ['STOCK_UNIVERSE'] = ','.join(f'BENCH{i}.NS' for i in range(args.universe))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    # Imported after the environment points the settings at the fake upstream
+    import logging
+    from config import Config
+    from services.data_fetcher import DataFetcher
+    from services.metrics import UPSTREAM_BYTES, UPSTREAM_RESPONSES
+    from services.scheduler import has_data
+    logging.basicConfig(level=Config.LOG_LEVEL)
+
+    fetcher = DataFetcher()
+    if args.no_rate_limits:
+        for guard in fetcher.guards.values():
+            guard.bucket = None
+    jobs = {
+        'currency_rates': fetcher.fetch_currency_rates,
+        'stock_indices': fetcher.fetch_stock_indices,
+        'commodity_prices': fetcher.fetch_commodity_prices,
+        'crypto_prices': fetcher.fetch_crypto_prices,
+        'financial_news': fetcher.fetch_financial_news,
+        'gainers_losers': fetcher.fetch_top_gainers_losers,
+    }
+    cycle_times = []
+    job_times = {key: [] for key in jobs}
+    empty = {key: 0 for key in jobs}
+
+    def timed(key):
+        def run():
+            started = time.perf_counter()
+            try:
+                return jobs[key]()
+            finally:
+                job_times[key].append(time.perf_counter() - started)
+        return run
+
+    try:
+        for cycle in range(args.cycles):
+            started = time.perf_counter()
+            results = fetcher.engine.run_cycle({key: timed(key) for key in jobs})
+            cycle_times.append(time.perf_counter() - started)
+            for key in jobs:
+                if key not in results or not has_data(key, results[key]):
+                    empty[key] += 1
+            print(f"cycle {cycle + 1}/{args.cycles}: {cycle_times[-1] * 1000:.0f} ms")
+    finally:
+        fetcher.engine.shutdown()
+        server.shutdown()
+
+    responses = UPSTREAM_RESPONSES.items()
+    providers = sorted({provider for (provider, _), _ in responses})
+    results = {
+        'cycle': percentiles(cycle_times),
+        'jobs': {key: {**percentiles(times), 'empty_cycles': empty[key]} for key, times in job_times.items()},
+        'upstream': {provider: {
+            'responses': {status: count for (name, status), count in responses if name == provider},
+            'bytes': UPSTREAM_BYTES.value(provider),
+        } for provider in providers},
+    }
+    parameters = {**vars(args), 'universe_size': len(fetcher.stock_universe),
+                  'cycle_deadline': Config.FETCH_CYCLE_DEADLINE}
+    print(f"cycle p50 {results['cycle']['p50_ms']:.0f} ms, p99 {results['cycle']['p99_ms']:.0f} ms")
+    print(f"Saved {save_results('fetch_cycle', parameters, results, args.output)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def fake_upstream_environment(base_url: str) -> Dict[str, str]:
+    """Settings that send every provider's requests to the fake upstream"""
+    return {
+        'EXCHANGE_RATE_API_URL': base_url,
+        'YAHOO_API_URL': base_url,
+        'METALS_API_URL': base_url,
+        'ALPHA_VANTAGE_API_URL': base_url,
+        'COINGECKO_API_URL': base_url,
+        'NEWS_API_URL': base_url,
+        'EXCHANGE_RATE_API_KEY': 'bench',
+        'METALS_API_KEY': 'bench',
+        'ALPHA_VANTAGE_API_KEY': 'bench',
+        'NEWS_API_KEY': 'bench',
+        # Every run should measure the upstream path, not a warm response cache
+        'HTTP_CACHE_ENABLED': 'false',
+        'PERSIST_SNAPSHOTS': 'false',
+    }
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summary of latency samples in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        'min_ms': ordered[0] * 1000,
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': ordered[-1] * 1000,
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+    }
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR), check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def save_results(name: str, parameters: Dict, results: Dict, output: str = None) -> str:
+    """Write one benchmark run as JSON, tagged with the revision and platform it ran on"""
+    document = {
+        'benchmark': name,
+        'revision': _git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'parameters': parameters,
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{document['revision']}-{int(time.time())}.json")
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+    return output
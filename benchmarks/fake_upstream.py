@@ -0,0 +1,153 @@
+"""Local stand-in for the upstream market data APIs
+
+Serves payloads shaped like exchangerate-api, Yahoo Finance (spark
+and chart), metals.live, Alpha Vantage, CoinGecko and NewsAPI, with
+configurable latency and error injection. Run it standalone with
+
+    python -m benchmarks.fake_upstream --port 8900 --latency 80 --error-rate 0.05
+
+and point the *_API_URL settings at it, or start it in-process with
+start_fake_upstream().
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONVERSION_RATES = {'USD': 1.0, 'INR': 83.2, 'EUR': 0.92, 'GBP': 0.79, 'AED': 3.67, 'SGD': 1.35, 'JPY': 151.3}
+CRYPTO_PRICES = {
+    'bitcoin': 5600000.0, 'ethereum': 290000.0, 'binancecoin': 48000.0, 'cardano': 38.0,
+    'solana': 12500.0, 'dogecoin': 13.0, 'polygon': 60.0, 'chainlink': 1200.0,
+}
+
+def _price(symbol: str) -> float:
+    """A stable base price per symbol with a little noise, so deltas are not all empty"""
+    base = 100 + (sum(map(ord, symbol)) * 37) % 4000
+    return round(base * random.uniform(0.99, 1.01), 2)
+
+def _quote(symbol: str) -> dict:
+    price = _price(symbol)
+    return {
+        'symbol': symbol,
+        'shortName': symbol.split('.')[0].lstrip('^'),
+        'regularMarketPrice': price,
+        'regularMarketPreviousClose': round(price / random.uniform(0.97, 1.03), 2),
+    }
+
+def exchangerate_payload(path, query):
+    return {'result': 'success', 'base_code': 'USD',
+            'conversion_rates': {code: rate * random.uniform(0.999, 1.001) for code, rate in CONVERSION_RATES.items()}}
+
+def _chart_meta(symbol: str) -> dict:
+    quote = _quote(symbol)
+    return {
+        'symbol': quote['symbol'], 'shortName': quote['shortName'],
+        'regularMarketPrice': quote['regularMarketPrice'],
+        'previousClose': quote['regularMarketPreviousClose'],
+    }
+
+def yahoo_spark_payload(path, query):
+    symbols = query.get('symbols', [''])[0].split(',')
+    return {'spark': {'result': [{'symbol': symbol, 'response': [{'meta': _chart_meta(symbol)}]}
+                                 for symbol in symbols if symbol], 'error': None}}
+
+def yahoo_chart_payload(path, query):
+    return {'chart': {'result': [{'meta': _chart_meta(path.rsplit('/', 1)[-1])}], 'error': None}}
+
+def metals_payload(path, query):
+    return [{'metal': 'gold', 'price': 2350.0 * random.uniform(0.99, 1.01)},
+            {'metal': 'silver', 'price': 29.5 * random.uniform(0.99, 1.01)}]
+
+def alphavantage_payload(path, query):
+    today = datetime.now(timezone.utc).date().isoformat()
+    return {'name': 'Crude Oil Prices WTI', 'interval': 'daily', 'unit': 'dollars per barrel',
+            'data': [{'date': today, 'value': f'{78.4 * random.uniform(0.98, 1.02):.2f}'}]}
+
+def coingecko_payload(path, query):
+    ids = query.get('ids', [''])[0].split(',')
+    return {crypto_id: {'inr': price * random.uniform(0.99, 1.01), 'inr_24h_change': random.uniform(-5, 5)}
+            for crypto_id, price in CRYPTO_PRICES.items() if crypto_id in ids}
+
+def newsapi_payload(path, query):
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    size = int(query.get('pageSize', ['10'])[0])
+    return {'status': 'ok', 'totalResults': size, 'articles': [{
+        'source': {'id': None, 'name': f'Wire {i % 3}'},
+        'title': f'Markets update {i}',
+        'description': 'Indian equities and the rupee in focus.',
+        'url': f'https://news.example.com/markets-{i}',
+        'publishedAt': now,
+    } for i in range(size)]}
+
+# Path prefix -> payload builder
+ROUTES = [
+    ('/v6/', exchangerate_payload),
+    ('/v8/finance/spark', yahoo_spark_payload),
+    ('/v8/finance/chart/', yahoo_chart_payload),
+    ('/v1/spot', metals_payload),
+    ('/query', alphavantage_payload),
+    ('/api/v3/simple/price', coingecko_payload),
+    ('/v2/top-headlines', newsapi_payload),
+]
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        delay = max(0.0, random.gauss(server.latency, server.jitter)) if server.jitter else server.latency
+        if delay:
+            time.sleep(delay)
+        url = urlparse(self.path)
+        builder = next((builder for prefix, builder in ROUTES if url.path.startswith(prefix)), None)
+        if builder is None:
+            return self._send(404, {'error': 'not found'})
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send(random.choice([429, 500, 503]), {'error': 'injected failure'}, {'Retry-After': '1'})
+        self._send(200, builder(url.path, parse_qs(url.query)))
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_upstream(latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                        host: str = '127.0.0.1', port: int = 0):
+    """Serve the fake upstream on a background thread; returns (server, base URL)"""
+    server = ThreadingHTTPServer((host, port), FakeUpstreamHandler)
+    server.daemon_threads = True
+    # Latency and jitter in seconds, read by every request
+    server.latency, server.jitter, server.error_rate = latency, jitter, error_rate
+    threading.Thread(target=server.serve_forever, name='fake-upstream', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=50, help='mean latency in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='latency standard deviation in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    args = parser.parse_args()
+    server, base_url = start_fake_upstream(args.latency / 1000, args.jitter / 1000, args.error_rate,
+                                           args.host, args.port)
+    print(f"Fake upstream listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
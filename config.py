@@ -1,7 +1,20 @@
 import os
+import tempfile
+
+# Owner-only directory for the shared cache, HTTP cache, leader lock and
+# snapshot file; other local users must not be able to plant files there
+RUNTIME_DIR = os.environ.get('RUNTIME_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'instance', 'runtime'))
+
+def ensure_private_dir(path: str):
+    """Create a directory readable and writable by this user alone"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
+    # Root log level; DEBUG logs every request and scheduler tick
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
     
     # API Keys
     ALPHA_VANTAGE_API_KEY = os.environ.get('ALPHA_VANTAGE_API_KEY', 'demo')
@@ -9,14 +22,160 @@ class Config:
     EXCHANGE_RATE_API_KEY = os.environ.get('EXCHANGE_RATE_API_KEY', '')
     METALS_API_KEY = os.environ.get('METALS_API_KEY', '')
     COINMARKETCAP_API_KEY = os.environ.get('COINMARKETCAP_API_KEY', '')
+
+    # Upstream base URLs; the benchmarks point these at a local stand-in
+    EXCHANGE_RATE_API_URL = os.environ.get('EXCHANGE_RATE_API_URL', 'https://v6.exchangerate-api.com')
+    YAHOO_API_URL = os.environ.get('YAHOO_API_URL', 'https://query1.finance.yahoo.com')
+    METALS_API_URL = os.environ.get('METALS_API_URL', 'https://api.metals.live')
+    ALPHA_VANTAGE_API_URL = os.environ.get('ALPHA_VANTAGE_API_URL', 'https://www.alphavantage.co')
+    COINGECKO_API_URL = os.environ.get('COINGECKO_API_URL', 'https://api.coingecko.com')
+    NEWS_API_URL = os.environ.get('NEWS_API_URL', 'https://newsapi.org')
     
     # Cache configuration
-    CACHE_TYPE = 'simple'
+    # SimpleCache is per process. With several gunicorn workers use a shared
+    # backend (FileSystemCache or RedisCache): one elected worker fetches and
+    # the others read what it publishes. Point RUNTIME_DIR at a private tmpfs
+    # directory to keep the file-backed stores in memory.
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
     CACHE_DEFAULT_TIMEOUT = 900  # 15 minutes
+    CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(RUNTIME_DIR, 'cache'))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    SHARED_CACHE = CACHE_TYPE not in ('SimpleCache', 'simple', 'NullCache', 'null')
+    # Held by the one process that runs the fetch jobs in shared-cache mode
+    LEADER_LOCK_FILE = os.environ.get('LEADER_LOCK_FILE', os.path.join(RUNTIME_DIR, 'scheduler.lock'))
+    # How often follower workers check for new data and for a vacant leader lock
+    FOLLOWER_POLL_SECONDS = int(os.environ.get('FOLLOWER_POLL_SECONDS', 2))
+    # Memory-mapped columnar snapshot that workers read without unpickling;
+    # on by default whenever the cache is shared between processes
+    COLUMNAR_SNAPSHOT = os.environ.get('COLUMNAR_SNAPSHOT', str(SHARED_CACHE)).lower() == 'true'
+    SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE', os.path.join(RUNTIME_DIR, 'snapshot.bin'))
     
     # Scheduler configuration
     SCHEDULER_API_ENABLED = True
+    # With the scheduler off the fetch jobs are registered but only run when
+    # called, e.g. by the API benchmark
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+
+    # Fetch engine configuration
+    FETCH_MAX_WORKERS = int(os.environ.get('FETCH_MAX_WORKERS', 16))
+    FETCH_CYCLE_DEADLINE = float(os.environ.get('FETCH_CYCLE_DEADLINE', 20))
+    # Maximum concurrent requests per upstream provider
+    PROVIDER_CONCURRENCY = {
+        'exchangerate': 2,
+        'yahoo': 8,
+        'metals': 2,
+        'alphavantage': 1,
+        'coingecko': 2,
+        'newsapi': 1,
+    }
+
+    # Requests allowed per provider: 'requests' per 'per' seconds, in bursts of
+    # up to 'burst'. Sized to each provider's free tier.
+    PROVIDER_RATE_LIMITS = {
+        'exchangerate': {'requests': 1500, 'per': 30 * 86400, 'burst': 5},
+        'yahoo': {'requests': 2000, 'per': 3600, 'burst': 60},
+        'metals': {'requests': 60, 'per': 60, 'burst': 5},
+        'alphavantage': {'requests': 25, 'per': 86400, 'burst': 2},
+        'coingecko': {'requests': 10, 'per': 60, 'burst': 5},
+        'newsapi': {'requests': 100, 'per': 86400, 'burst': 3},
+    }
+    # Consecutive failures that open a provider's circuit, and how long it
+    # stays open before a probe request is let through
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', 120))
+    FETCH_MAX_RETRIES = int(os.environ.get('FETCH_MAX_RETRIES', 2))
+
+    # Upstream HTTP response cache, revalidated with ETag/Last-Modified
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+    HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', os.path.join(RUNTIME_DIR, 'http_cache'))
+    HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    # Seconds a cached response is reused without contacting the provider;
+    # 0 revalidates on every fetch
+    HTTP_CACHE_TTLS = {
+        'exchangerate': 3600,
+        'yahoo': 0,
+        'metals': 600,
+        # The WTI series is daily
+        'alphavantage': 6 * 3600,
+        'coingecko': 0,
+        'newsapi': 600,
+    }
+    # Responses up to this old are served when the provider fails or is slow
+    HTTP_CACHE_MAX_STALE = int(os.environ.get('HTTP_CACHE_MAX_STALE', 86400))
+    # Timeout for a request that has a cached response to fall back on
+    HTTP_CACHE_REVALIDATE_TIMEOUT = float(os.environ.get('HTTP_CACHE_REVALIDATE_TIMEOUT', 3))
+
+    # Per-provider refresh schedules. Intervals and jitter are in seconds;
+    # market_hours providers only refresh during the NSE session (09:15-15:30
+    # IST on trading days), plus one catch-up run within
+    # MARKET_CLOSE_GRACE_MINUTES of the close.
+    PROVIDER_SCHEDULES = {
+        'currency_rates': {'interval': int(os.environ.get('CURRENCY_FETCH_INTERVAL', 900)), 'jitter': 30},
+        'stock_indices': {'interval': int(os.environ.get('EQUITY_FETCH_INTERVAL', 60)), 'jitter': 5, 'market_hours': True},
+        'gainers_losers': {'interval': int(os.environ.get('EQUITY_FETCH_INTERVAL', 60)), 'jitter': 5, 'market_hours': True},
+        # Alpha Vantage's free tier allows 25 requests a day and WTI is a daily series
+        'commodity_prices': {'interval': int(os.environ.get('COMMODITY_FETCH_INTERVAL', 3600)), 'jitter': 60},
+        'crypto_prices': {'interval': int(os.environ.get('CRYPTO_FETCH_INTERVAL', 60)), 'jitter': 10},
+        'financial_news': {'interval': int(os.environ.get('NEWS_FETCH_INTERVAL', 1800)), 'jitter': 60},
+    }
+    MARKET_CLOSE_GRACE_MINUTES = 15
+    # Recent prices kept in memory per symbol for change percentages and rolling
+    # stats; the default holds over a day of the one-minute providers
+    TICK_BUFFER_SIZE = int(os.environ.get('TICK_BUFFER_SIZE', 2048))
+    # Comma-separated ISO dates on which NSE is closed
+    NSE_HOLIDAYS = [day.strip() for day in os.environ.get('NSE_HOLIDAYS', '').split(',') if day.strip()]
+
+    # Yahoo Finance quotes; the spark endpoint answers at most 20 symbols per request
+    YAHOO_QUOTE_BATCH_SIZE = int(os.environ.get('YAHOO_QUOTE_BATCH_SIZE', 20))
+    STOCK_INDICES = {
+        'NIFTY 50': '^NSEI',
+        'SENSEX': '^BSESN',
+        'BANK NIFTY': '^NSEBANK'
+    }
+    # Comma-separated symbols, or a file with one symbol per line (e.g. NIFTY 500)
+    STOCK_UNIVERSE = os.environ.get('STOCK_UNIVERSE', ','.join([
+        'RELIANCE.NS', 'TCS.NS', 'HDFCBANK.NS', 'INFY.NS', 'HINDUNILVR.NS',
+        'ICICIBANK.NS', 'KOTAKBANK.NS', 'SBIN.NS', 'BHARTIARTL.NS', 'ITC.NS'
+    ]))
+    STOCK_UNIVERSE_FILE = os.environ.get('STOCK_UNIVERSE_FILE', '')
+    # Lines of symbol,sector,INDEX|INDEX for the gainers/losers filters; a
+    # universe file may carry the same columns itself
+    STOCK_METADATA_FILE = os.environ.get('STOCK_METADATA_FILE', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'stock_metadata.csv'))
+    # Largest n accepted by /api/gainers-losers
+    GAINERS_LOSERS_MAX_N = int(os.environ.get('GAINERS_LOSERS_MAX_N', 500))
+
+    # Server-sent events; run gunicorn with gevent workers to hold many streams
+    STREAM_KEEPALIVE_SECONDS = int(os.environ.get('STREAM_KEEPALIVE_SECONDS', 15))
+    # Streams are closed after this long; EventSource reconnects with Last-Event-ID
+    STREAM_MAX_SECONDS = int(os.environ.get('STREAM_MAX_SECONDS', 600))
+
+    # Rows accepted by one POST /api/convert/batch
+    CONVERT_BATCH_MAX_ROWS = int(os.environ.get('CONVERT_BATCH_MAX_ROWS', 1000000))
+
+    # Price alerts: rules registered per request, fired alerts kept for
+    # polling, and an optional URL every fired alert is POSTed to
+    ALERT_RULES_MAX_PER_REQUEST = int(os.environ.get('ALERT_RULES_MAX_PER_REQUEST', 10000))
+    ALERT_HISTORY_SIZE = int(os.environ.get('ALERT_HISTORY_SIZE', 1000))
+    ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL', '')
+
+    # Holdings accepted in one portfolio
+    PORTFOLIO_MAX_HOLDINGS = int(os.environ.get('PORTFOLIO_MAX_HOLDINGS', 10000))
+
+    # Request profiling middleware, off unless PROFILING_ENABLED is set. When on,
+    # every response carries a Server-Timing header and slow requests are logged;
+    # PROFILE_SAMPLE_RATE of the requests under PROFILE_ROUTES (comma-separated
+    # path prefixes, all when empty) are also profiled into PROFILE_DIR.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_ROUTES = [route.strip() for route in os.environ.get('PROFILE_ROUTES', '').split(',') if route.strip()]
+    # 'cprofile' or 'pyinstrument'
+    PROFILER = os.environ.get('PROFILER', 'cprofile')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'wealth_vista_profiles'))
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
 
     # Database configuration
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///wealth_vista.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///wealth_vista.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Append every fetch cycle to the time-series tables
+    PERSIST_SNAPSHOTS = os.environ.get('PERSIST_SNAPSHOTS', 'true').lower() == 'true'
@@ -8,35 +8,51 @@ from apscheduler.triggers.interval import IntervalTrigger
 import atexit
 import pytz
 
+# Load configuration, including the cache backend and log level
+from config import RUNTIME_DIR, Config, ensure_private_dir
+
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=Config.LOG_LEVEL)
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+if Config.PROFILING_ENABLED:
+    from profiling import ProfilingMiddleware
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        sample_rate=Config.PROFILE_SAMPLE_RATE,
+        profile_dir=Config.PROFILE_DIR,
+        slow_request_ms=Config.SLOW_REQUEST_MS,
+        routes=Config.PROFILE_ROUTES,
+        profiler=Config.PROFILER
+    )
+app.config.from_object(Config)
 
-# Configure cache
-app.config['CACHE_TYPE'] = 'simple'
-app.config['CACHE_DEFAULT_TIMEOUT'] = 900  # 15 minutes
+# Configure cache; its files, the leader lock and the snapshot live in the private runtime directory
+ensure_private_dir(RUNTIME_DIR)
 cache = Cache(app)
 
 # Configure timezone
 IST = pytz.timezone('Asia/Kolkata')
 
-# Import and initialize database
-from config import Config
-app.config.from_object(Config)
-
+# Initialize database
 from db import init_db
 init_db(app)
 
+# Key stored news and create its full-text index
+from services.news import init_news_search
+init_news_search(app)
+
 # Import routes
 from routes.main import main_bp
 from routes.api import api_bp
+from routes.metrics import metrics_bp
 
 app.register_blueprint(main_bp)
 app.register_blueprint(api_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp)
 
 # Make cache available to api routes
 import routes.api
@@ -44,11 +60,12 @@ routes.api.cache = cache
 
 # Initialize scheduler
 scheduler = BackgroundScheduler()
-scheduler.start()
+if Config.SCHEDULER_ENABLED:
+    scheduler.start()
 
 # Import and start background data fetching
 from services.scheduler import start_data_fetching
-start_data_fetching(scheduler, cache)
+start_data_fetching(scheduler, cache, app)
 
 # Shut down the scheduler when exiting the app
-atexit.register(lambda: scheduler.shutdown())
+atexit.register(lambda: scheduler.running and scheduler.shutdown())
@@ -1,8 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text
 
 db = SQLAlchemy()
 
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """Let readers proceed while the scheduler writes a fetch cycle"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+def _ensure_columns():
+    """Add nullable columns added to models after their tables already existed"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def _ensure_indexes():
+    """Create indexes added to models after their tables already existed"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
 def init_db(app):
+    # The models must be registered before create_all can create their tables
+    import models
     db.init_app(app)
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _enable_sqlite_wal)
+            db.engine.dispose()
         db.create_all()
+        _ensure_columns()
+        _ensure_indexes()
@@ -3,17 +3,19 @@ from db import db
 
 class CurrencyRate(db.Model):
     __tablename__ = 'currency_rates'
+    __table_args__ = (db.Index('ix_currency_rates_symbol_last_updated', 'symbol', 'last_updated'),)
     id = db.Column(db.Integer, primary_key=True)
-    symbol = db.Column(db.String(10), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
     rate = db.Column(db.Float, nullable=False)
     change_percent = db.Column(db.Float, nullable=False)
     last_updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class StockIndex(db.Model):
     __tablename__ = 'stock_indices'
+    __table_args__ = (db.Index('ix_stock_indices_symbol_last_updated', 'symbol', 'last_updated'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    symbol = db.Column(db.String(10), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
     value = db.Column(db.Float, nullable=False)
     change = db.Column(db.Float, nullable=False)
     change_percent = db.Column(db.Float, nullable=False)
@@ -21,9 +23,10 @@ class StockIndex(db.Model):
 
 class CommodityPrice(db.Model):
     __tablename__ = 'commodity_prices'
+    __table_args__ = (db.Index('ix_commodity_prices_symbol_last_updated', 'symbol', 'last_updated'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    symbol = db.Column(db.String(10), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
     price = db.Column(db.Float, nullable=False)
     change_percent = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(20), nullable=False)
@@ -31,8 +34,9 @@ class CommodityPrice(db.Model):
 
 class CryptoPrice(db.Model):
     __tablename__ = 'crypto_prices'
+    __table_args__ = (db.Index('ix_crypto_prices_symbol_last_updated', 'symbol', 'last_updated'),)
     id = db.Column(db.Integer, primary_key=True)
-    symbol = db.Column(db.String(10), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     price_inr = db.Column(db.Float, nullable=False)
     change_percent = db.Column(db.Float, nullable=False)
@@ -40,19 +44,65 @@ class CryptoPrice(db.Model):
 
 class NewsItem(db.Model):
     __tablename__ = 'news_items'
+    __table_args__ = (
+        db.Index('ix_news_items_source_published_at', 'source', 'published_at'),
+        db.Index('ix_news_items_published_at', 'published_at'),
+        db.Index('ux_news_items_url_hash', 'url_hash', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
     url = db.Column(db.String(255), nullable=False)
     source = db.Column(db.String(100), nullable=False)
     published_at = db.Column(db.DateTime, nullable=False)
+    # services.news.url_hash of the article, so each is stored once
+    url_hash = db.Column(db.String(40), nullable=True)
 
 class StockData(db.Model):
     __tablename__ = 'stock_data'
+    __table_args__ = (db.Index('ix_stock_data_symbol_last_updated', 'symbol', 'last_updated'),)
     id = db.Column(db.Integer, primary_key=True)
-    symbol = db.Column(db.String(10), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
     change = db.Column(db.Float, nullable=False)
     change_percent = db.Column(db.Float, nullable=False)
     last_updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class AlertRule(db.Model):
+    __tablename__ = 'alert_rules'
+    __table_args__ = (
+        db.Index('ix_alert_rules_owner', 'owner'),
+        # Ids are never reused, so (count, max id) tells the alert engine when rules change
+        {'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # Whose watchlist the rule belongs to; alerts can be polled per owner
+    owner = db.Column(db.String(100), nullable=True)
+    symbol = db.Column(db.String(32), nullable=False)
+    # 'above', 'below' or 'move'; see services.alerts
+    kind = db.Column(db.String(16), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class Portfolio(db.Model):
+    __tablename__ = 'portfolios'
+    __table_args__ = (db.Index('ix_portfolios_owner', 'owner'),)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    owner = db.Column(db.String(100), nullable=True)
+    # Bumped whenever the holdings change, so cached valuations know to recompute
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class Holding(db.Model):
+    __tablename__ = 'holdings'
+    __table_args__ = (db.Index('ix_holdings_portfolio_id', 'portfolio_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id', ondelete='CASCADE'), nullable=False)
+    # 'equity', 'crypto', 'commodity' or 'cash'; see services.portfolio
+    asset_class = db.Column(db.String(16), nullable=False)
+    # Ticker, crypto or commodity symbol, or the currency code of cash
+    symbol = db.Column(db.String(32), nullable=False)
+    # Shares, coins, units of the commodity's quote (e.g. grams) or the cash amount
+    quantity = db.Column(db.Float, nullable=False)
@@ -0,0 +1,124 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument is optional; cProfile is always available
+    pyinstrument = None
+
+# Phase durations of the request being handled, or None when profiling is off
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('server_timings', default=None)
+_NULL_PHASE = nullcontext()
+
+class _Phase:
+    __slots__ = ('timings', 'name', 'started')
+
+    def __init__(self, timings: Dict[str, float], name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.started
+
+def phase(name: str):
+    """Time a block as one Server-Timing phase of the current request
+
+    Without the profiling middleware this returns a shared no-op context
+    manager, so handlers can stay instrumented in production.
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _NULL_PHASE
+    return _Phase(timings, name)
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f'{name};dur={duration * 1000:.2f}' for name, duration in timings.items()]
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+class ProfilingMiddleware:
+    """Opt-in WSGI middleware for finding where request time goes
+
+    Every request gets a Server-Timing header with the phases its handler
+    recorded through ``phase()``, and requests slower than
+    ``slow_request_ms`` are logged with the same breakdown. A
+    ``sample_rate`` fraction of requests whose path starts with one of
+    ``routes`` (all when empty) is captured with cProfile, or pyinstrument
+    when chosen and installed, into ``profile_dir``.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, profile_dir: Optional[str] = None,
+                 slow_request_ms: float = 500.0, routes: Sequence[str] = (), profiler: str = 'cprofile'):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.profile_dir = profile_dir
+        self.slow_request_ms = slow_request_ms
+        self.routes = tuple(routes)
+        self.profiler = profiler
+        if profiler == 'pyinstrument' and pyinstrument is None:
+            logging.warning("pyinstrument is not installed; sampling with cProfile instead")
+            self.profiler = 'cprofile'
+        if sample_rate and profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def _sampled(self, path: str) -> bool:
+        if not self.sample_rate or not self.profile_dir:
+            return False
+        if self.routes and not path.startswith(self.routes):
+            return False
+        return random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        profiler = None
+        if self._sampled(path):
+            if self.profiler == 'pyinstrument':
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        started = time.perf_counter()
+
+        def timed_start_response(status, headers, exc_info=None):
+            # The handler is done once it starts the response; streamed bodies are not counted
+            elapsed = time.perf_counter() - started
+            header = server_timing(timings, elapsed)
+            headers.append(('Server-Timing', header))
+            if elapsed * 1000 >= self.slow_request_ms:
+                logging.warning(f"Slow request {environ.get('REQUEST_METHOD')} {path}: "
+                                f"{elapsed * 1000:.0f} ms ({header})")
+            return start_response(status, headers, exc_info)
+
+        try:
+            return self.app(environ, timed_start_response)
+        finally:
+            _timings.reset(token)
+            if profiler is not None:
+                self._save(profiler, environ.get('REQUEST_METHOD', 'GET'), path)
+
+    def _save(self, profiler, method: str, path: str):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_') or 'root'
+        name = os.path.join(self.profile_dir, f'{int(time.time() * 1000)}-{method}-{slug}')
+        try:
+            if self.profiler == 'pyinstrument':
+                profiler.stop()
+                with open(f'{name}.html', 'w') as f:
+                    f.write(profiler.output_html())
+            else:
+                profiler.disable()
+                profiler.dump_stats(f'{name}.prof')
+        except Exception as e:
+            logging.error(f"Error saving profile of {path}: {e}")
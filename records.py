@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+# Immutable, slotted quote records carried from the fetchers through the cache
+# to the API. They mirror the column names of the models in models.py and are
+# only turned into ORM rows when a cycle is persisted.
+
+@dataclass(frozen=True, slots=True)
+class CurrencyQuote:
+    symbol: str
+    rate: float
+    change_percent: float
+    last_updated: datetime
+
+@dataclass(frozen=True, slots=True)
+class IndexQuote:
+    name: str
+    symbol: str
+    value: float
+    change: float
+    change_percent: float
+    last_updated: datetime
+
+@dataclass(frozen=True, slots=True)
+class CommodityQuote:
+    name: str
+    symbol: str
+    price: float
+    change_percent: float
+    unit: str
+    last_updated: datetime
+
+@dataclass(frozen=True, slots=True)
+class CryptoQuote:
+    symbol: str
+    name: str
+    price_inr: float
+    change_percent: float
+    last_updated: datetime
+
+@dataclass(frozen=True, slots=True)
+class NewsArticle:
+    title: str
+    description: Optional[str]
+    url: str
+    source: str
+    published_at: datetime
+
+@dataclass(frozen=True, slots=True)
+class StockQuote:
+    symbol: str
+    name: str
+    price: float
+    change: float
+    change_percent: float
+    last_updated: datetime
@@ -1,194 +1,557 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from services.data_fetcher import DataFetcher
+from services.history import DEFAULT_MAX_POINTS, default_range, parse_bucket, parse_time, query_ohlc
+from services.publisher import (GENERATION_KEY, SNAPSHOT_KEY, empty_payload, empty_snapshot, make_snapshot,
+                                payload_key, serialize_gainers_losers)
 import logging
+import time
+from dataclasses import asdict
+import numpy as np
+from config import Config
 from core import cache
+from services.alerts import (ALERTS_KEY, create_rules, delete_rule, fired_since, list_rules, parse_rule,
+                             serialize_rule)
+from services.broadcast import broadcaster
+from services.columnar import SnapshotReader
+from services.fx import FX_RATES_KEY, UnknownCurrency, current as current_rate_table
+from services.fx_batch import BatchError, media_types, read_batch, write_batch
+from services.metrics import API_CACHE
+from services.news import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, search_news
+from services.portfolio import (create_portfolio, get_portfolio, latest_quote_book, parse_holding,
+                                portfolio_valuation, replace_holdings, serialize_portfolio)
+from services.ranking import RANKING_KEY, RankingIndex, current as current_ranking
+from services.universe import load_listings
+from services.ticks import TICK_STATS_KEY
+from profiling import phase
 
 api_bp = Blueprint('api', __name__)
 
-@api_bp.route('/currency-rates')
-def get_currency_rates():
-    """Get cached currency rates"""
+# Zero-copy view of the scheduler's snapshot file, shared by every worker
+snapshot_reader = SnapshotReader(Config.SNAPSHOT_FILE) if Config.COLUMNAR_SNAPSHOT else None
+
+def _send_payload(payload, encoded=None):
+    """Build a response for a pre-rendered payload
+
+    Picks a pre-compressed body when the client accepts one. Conditional
+    requests get a 304 while the ETag still matches, and clients may reuse
+    the body until the next scheduled fetch.
+    """
+    encoding = None
+    if encoded:
+        encoding = next((name for name in ('br', 'gzip')
+                         if name in encoded and request.accept_encodings[name]), None)
+    # Bodies may be memoryviews into the mapped snapshot; WSGI servers only write bytes
+    body = bytes(encoded[encoding] if encoding else payload.body)
+    response = Response([body], mimetype='application/json')
+    response.content_length = len(body)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{payload.etag}-{encoding}")
+    else:
+        response.set_etag(payload.etag)
+    if encoded:
+        response.vary.add('Accept-Encoding')
+    response.headers['X-Data-Generation'] = str(payload.generation)
+    response.cache_control.max_age = max(0, int(payload.expires_at - time.time()))
+    return response.make_conditional(request)
+
+def _payload_response(section):
+    """Serve a section's pre-rendered payload straight from the cache"""
     try:
-        rates = cache.get('currency_rates') or {}
-        return jsonify({
-            'success': True,
-            'data': {symbol: {
-                'symbol': rate.symbol,
-                'rate': rate.rate,
-                'change_percent': rate.change_percent,
-                'last_updated': rate.last_updated.isoformat()
-            } for symbol, rate in rates.items()}
-        })
+        with phase('cache'):
+            payload = snapshot_reader.payload(section) if snapshot_reader else None
+            source = 'mapped'
+            if payload is None:
+                payload = cache.get(payload_key(section))
+                source = 'cache'
+            if payload is None:
+                payload = empty_payload(section)
+                source = 'miss'
+        API_CACHE.inc(section, source)
+        with phase('render'):
+            return _send_payload(payload)
     except Exception as e:
-        logging.error(f"Error getting currency rates: {e}")
+        logging.error(f"Error getting {section}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@api_bp.route('/stock-indices')
-def get_stock_indices():
-    """Get cached stock indices"""
+# (snapshot generation, sections) -> (payload, encoded bodies) for ?sections= subsets
+_snapshot_subsets = {}
+
+@api_bp.route('/snapshot')
+def get_snapshot():
+    """Get every section in one pre-rendered, pre-compressed response"""
     try:
-        indices = cache.get('stock_indices') or {}
-        return jsonify({
-            'success': True,
-            'data': {name: {
-                'name': index.name,
-                'symbol': index.symbol,
-                'value': index.value,
-                'change': index.change,
-                'change_percent': index.change_percent,
-                'last_updated': index.last_updated.isoformat()
-            } for name, index in indices.items()}
-        })
+        requested = request.args.get('sections')
+        with phase('cache'):
+            mapped = snapshot_reader.payload('snapshot') if snapshot_reader and not requested else None
+            if mapped is not None:
+                encoded = {encoding: snapshot_reader.blob(f'snapshot.{encoding}') for encoding in ('gzip', 'br')}
+        if mapped is not None:
+            API_CACHE.inc('snapshot', 'mapped')
+            with phase('render'):
+                return _send_payload(mapped, {encoding: body for encoding, body in encoded.items() if body is not None})
+
+        with phase('cache'):
+            snapshot = cache.get(SNAPSHOT_KEY)
+        API_CACHE.inc('snapshot', 'miss' if snapshot is None else 'cache')
+        snapshot = snapshot or empty_snapshot()
+        if not requested:
+            with phase('render'):
+                return _send_payload(snapshot.payload, snapshot.encoded)
+
+        names = tuple(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+        unknown = [name for name in names if name not in snapshot.sections]
+        if unknown:
+            return jsonify({'success': False, 'error': f"Unknown sections: {', '.join(unknown)}"}), 400
+
+        subset_key = (snapshot.payload.generation, names)
+        subset = _snapshot_subsets.get(subset_key)
+        if subset is None:
+            if len(_snapshot_subsets) >= 64:
+                _snapshot_subsets.clear()
+            with phase('serialize'):
+                subset = make_snapshot({name: snapshot.sections[name] for name in names},
+                                       snapshot.payload.generation, snapshot.payload.expires_at,
+                                       snapshot.payload.as_of, snapshot.payload.stale)
+            _snapshot_subsets[subset_key] = subset
+        with phase('render'):
+            return _send_payload(subset.payload, subset.encoded)
     except Exception as e:
-        logging.error(f"Error getting stock indices: {e}")
+        logging.error(f"Error getting snapshot: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@api_bp.route('/stream')
+def stream():
+    """Push a delta event whenever the scheduler publishes new data"""
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_id') or broadcaster.last_id)
+    except ValueError:
+        last_id = broadcaster.last_id
+
+    def events(last_id):
+        yield b'retry: 5000\n\n'
+        deadline = time.monotonic() + Config.STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            frames = broadcaster.wait(last_id, timeout=Config.STREAM_KEEPALIVE_SECONDS)
+            if frames is None:
+                # Too far behind for deltas; the client reloads the snapshot
+                last_id = broadcaster.last_id
+                yield b'id: %d\nevent: reset\ndata: {}\n\n' % last_id
+            elif frames:
+                for last_id, frame in frames:
+                    yield frame
+            else:
+                yield b': keepalive\n\n'
+
+    response = Response(events(last_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_bp.route('/currency-rates')
+def get_currency_rates():
+    """Get cached currency rates"""
+    return _payload_response('currency-rates')
+
+@api_bp.route('/stock-indices')
+def get_stock_indices():
+    """Get cached stock indices"""
+    return _payload_response('stock-indices')
+
 @api_bp.route('/commodity-prices')
 def get_commodity_prices():
     """Get cached commodity prices"""
-    try:
-        commodities = cache.get('commodity_prices') or {}
-        return jsonify({
-            'success': True,
-            'data': {symbol: {
-                'name': commodity.name,
-                'symbol': commodity.symbol,
-                'price': commodity.price,
-                'change_percent': commodity.change_percent,
-                'unit': commodity.unit,
-                'last_updated': commodity.last_updated.isoformat()
-            } for symbol, commodity in commodities.items()}
-        })
-    except Exception as e:
-        logging.error(f"Error getting commodity prices: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _payload_response('commodity-prices')
 
 @api_bp.route('/crypto-prices')
 def get_crypto_prices():
     """Get cached crypto prices"""
-    try:
-        cryptos = cache.get('crypto_prices') or {}
-        return jsonify({
-            'success': True,
-            'data': {symbol: {
-                'symbol': crypto.symbol,
-                'name': crypto.name,
-                'price_inr': crypto.price_inr,
-                'change_percent': crypto.change_percent,
-                'last_updated': crypto.last_updated.isoformat()
-            } for symbol, crypto in cryptos.items()}
-        })
-    except Exception as e:
-        logging.error(f"Error getting crypto prices: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _payload_response('crypto-prices')
 
 @api_bp.route('/financial-news')
 def get_financial_news():
     """Get cached financial news"""
+    return _payload_response('financial-news')
+
+@api_bp.route('/news/search')
+def search_financial_news():
+    """Search stored news by text and/or symbol, newest first, with cursor pagination"""
     try:
-        news = cache.get('financial_news') or []
-        return jsonify({
-            'success': True,
-            'data': [{
-                'title': item.title,
-                'description': item.description,
-                'url': item.url,
-                'source': item.source,
-                'published_at': item.published_at.isoformat()
-            } for item in news]
-        })
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        q = request.args.get('q', '').strip()
+        symbol = request.args.get('symbol', '').strip()
+        with phase('db'):
+            items, next_cursor = search_news(q, symbol, limit, request.args.get('cursor'))
+        return jsonify({'success': True, 'data': items, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        logging.error(f"Error getting financial news: {e}")
+        logging.error(f"Error searching news: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# cache key -> (data generation, value), so each object is unpickled once per generation
+_generation_memo = {}
+
+def _cached_by_generation(key):
+    """A cached object, read from the cache again only when the data generation moves on
+
+    The scheduler sets these keys before publishing the generation that
+    brings them.
+    """
+    generation = cache.get(GENERATION_KEY) or 0
+    memo = _generation_memo.get(key)
+    if memo is None or memo[0] != generation:
+        memo = _generation_memo[key] = (generation, cache.get(key))
+    return memo[1]
+
+# (ranking update, n, sector, index) -> response data for filtered gainers/losers
+_ranking_queries = {}
+
+# (mapped snapshot generation, ranking index over its stock columns)
+_mapped_ranking = (None, None)
+_listings = None
+
+def _ranking():
+    """The latest ranking index and where it came from
+
+    With a columnar snapshot the index is built from the mapped stock
+    columns once per generation, so no request unpickles it.
+    """
+    global _mapped_ranking, _listings
+    mapped = snapshot_reader.table('stocks') if snapshot_reader else None
+    if mapped is None:
+        return current_ranking(_cached_by_generation(RANKING_KEY)), 'cache'
+    generation, columns = mapped
+    if _mapped_ranking[0] != generation:
+        if _listings is None:
+            _listings = load_listings()
+        _mapped_ranking = (generation, RankingIndex.from_columns(columns, _listings, float(generation)))
+    return _mapped_ranking[1], 'mapped'
+
 @api_bp.route('/gainers-losers')
 def get_gainers_losers():
-    """Get cached top gainers and losers"""
+    """Get the top gainers and losers, optionally n of each within a sector or index"""
+    if not any(name in request.args for name in ('n', 'sector', 'index')):
+        return _payload_response('gainers-losers')
     try:
-        data = cache.get('gainers_losers') or {'gainers': [], 'losers': []}
-        return jsonify({
-            'success': True,
-            'data': {
-                'gainers': [{
-                    'symbol': stock.symbol,
-                    'name': stock.name,
-                    'price': stock.price,
-                    'change': stock.change,
-                    'change_percent': stock.change_percent
-                } for stock in data.get('gainers', [])],
-                'losers': [{
-                    'symbol': stock.symbol,
-                    'name': stock.name,
-                    'price': stock.price,
-                    'change': stock.change,
-                    'change_percent': stock.change_percent
-                } for stock in data.get('losers', [])]
-            }
-        })
+        count = int(request.args.get('n', 5))
+    except ValueError:
+        return jsonify({'success': False, 'error': "n must be a whole number"}), 400
+    if not 1 <= count <= Config.GAINERS_LOSERS_MAX_N:
+        return jsonify({'success': False, 'error': f"n must be between 1 and {Config.GAINERS_LOSERS_MAX_N}"}), 400
+    sector = request.args.get('sector', '').strip().upper() or None
+    index = request.args.get('index', '').strip().upper() or None
+
+    try:
+        with phase('cache'):
+            ranking, source = _ranking()
+        API_CACHE.inc('gainers-losers', 'miss' if ranking is None else source)
+        if ranking is None:
+            return jsonify({'success': True, 'data': {'gainers': [], 'losers': []}})
+        query_key = (ranking.updated_at, count, sector, index)
+        data = _ranking_queries.get(query_key)
+        if data is None:
+            if len(_ranking_queries) >= 256:
+                _ranking_queries.clear()
+            with phase('rank'):
+                data = serialize_gainers_losers(ranking.top(count, sector, index))
+            _ranking_queries[query_key] = data
+        with phase('serialize'):
+            return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        logging.error(f"Error ranking gainers/losers: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/history/<kind>/<path:symbol>')
+def get_history(kind, symbol):
+    """Get downsampled OHLC history for a symbol"""
+    try:
+        default_start, default_end = default_range()
+        start = parse_time(request.args.get('from'), default_start)
+        end = parse_time(request.args.get('to'), default_end)
+        bucket = parse_bucket(request.args.get('bucket'))
+        max_points = min(int(request.args.get('max_points', DEFAULT_MAX_POINTS)), DEFAULT_MAX_POINTS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f"Invalid history query: {e}"}), 400
+
+    try:
+        with phase('db'):
+            history = query_ohlc(kind, symbol.upper(), start, end, bucket, max(1, max_points))
+        with phase('serialize'):
+            return jsonify({'success': True, 'data': history})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error getting history for {kind}/{symbol}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/stats/<path:symbol>')
+def get_tick_stats(symbol):
+    """Get rolling statistics over a symbol's recent prices"""
+    try:
+        with phase('cache'):
+            stats = (_cached_by_generation(TICK_STATS_KEY) or {}).get(symbol.upper())
+        if stats is None:
+            return jsonify({'success': False, 'error': f"No recent prices for {symbol}"}), 404
+        return jsonify({'success': True, 'data': asdict(stats)})
     except Exception as e:
-        logging.error(f"Error getting gainers/losers: {e}")
+        logging.error(f"Error getting stats for {symbol}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _rate_table():
+    """The latest cross-rate table, reusing this process's matrix until the next fetch"""
+    return current_rate_table(cache.get(FX_RATES_KEY))
+
 @api_bp.route('/convert')
 def convert_currency():
-    """Convert currency using current rates"""
-    try:
-        from_currency = request.args.get('from', 'USD').upper()
-        to_currency = request.args.get('to', 'INR').upper()
-        amount = float(request.args.get('amount', 1))
-        
-        rates = cache.get('currency_rates') or {}
-        conversion_key = f"{from_currency}-{to_currency}"
-        
-        if conversion_key in rates:
-            rate = rates[conversion_key].rate
-            converted_amount = amount * rate
+    """Convert between any two currencies the rate provider quotes
+
+    Comma-separated ``from``, ``to`` and ``amount`` lists convert many pairs
+    in one vectorized pass; a list with a single value applies to every row.
+    """
+    try:
+        from_codes = request.args.get('from', 'USD').upper().split(',')
+        to_codes = request.args.get('to', 'INR').upper().split(',')
+        amounts = [float(amount) for amount in request.args.get('amount', '1').split(',')]
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f"Invalid amount: {e}"}), 400
+    if not np.isfinite(amounts).all():
+        return jsonify({'success': False, 'error': "Amounts must be finite numbers"}), 400
+    lengths = {len(from_codes), len(to_codes), len(amounts)} - {1}
+    if len(lengths) > 1:
+        return jsonify({'success': False, 'error': "Batch lists must have the same length or a single value"}), 400
+
+    try:
+        # A currency converts to itself at par, even before the first rates arrive
+        same_currency = not lengths and from_codes[0] == to_codes[0]
+        if not same_currency:
+            with phase('cache'):
+                table = _rate_table()
+            if table is None:
+                return jsonify({'success': False, 'error': "Conversion rates are not available yet"}), 400
+
+        if not lengths:
+            rate = 1.0 if same_currency else table.rate(from_codes[0], to_codes[0])
+            if not np.isfinite(amounts[0] * rate):
+                return jsonify({'success': False, 'error': "Converted amounts are out of range"}), 400
             return jsonify({
                 'success': True,
                 'data': {
+                    'from_currency': from_codes[0],
+                    'to_currency': to_codes[0],
+                    'amount': amounts[0],
+                    'converted_amount': amounts[0] * rate,
+                    'rate': rate
+                }
+            })
+
+        with phase('convert'):
+            rates, converted = table.convert_many(from_codes, to_codes, amounts)
+            rows = np.broadcast_arrays(np.asarray(from_codes), np.asarray(to_codes), np.asarray(amounts))
+        if not np.isfinite(converted).all():
+            return jsonify({'success': False, 'error': "Converted amounts are out of range"}), 400
+        with phase('serialize'):
+            return jsonify({
+                'success': True,
+                'data': [{
                     'from_currency': from_currency,
                     'to_currency': to_currency,
                     'amount': amount,
                     'converted_amount': converted_amount,
                     'rate': rate
-                }
+                } for from_currency, to_currency, amount, converted_amount, rate
+                    in zip(*(column.tolist() for column in rows), converted.tolist(), rates.tolist())]
             })
-        else:
-            # Try reverse conversion if available
-            reverse_key = f"{to_currency}-{from_currency}"
-            if reverse_key in rates:
-                rate = rates[reverse_key].rate
-                if rate != 0:
-                    converted_amount = amount / rate
-                    return jsonify({
-                        'success': True,
-                        'data': {
-                            'from_currency': from_currency,
-                            'to_currency': to_currency,
-                            'amount': amount,
-                            'converted_amount': converted_amount,
-                            'rate': 1 / rate
-                        }
-                    })
-            
-            # Fallback: if no conversion rate found, try to use 1:1 conversion for same currency
-            if from_currency == to_currency:
-                return jsonify({
-                    'success': True,
-                    'data': {
-                        'from_currency': from_currency,
-                        'to_currency': to_currency,
-                        'amount': amount,
-                        'converted_amount': amount,
-                        'rate': 1.0
-                    }
-                })
-            
-            return jsonify({
-                'success': False,
-                'error': f"Conversion rate not available for {conversion_key} or {reverse_key}"
-            }), 400
 
+    except UnknownCurrency as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error converting currency: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/convert/batch', methods=['POST'])
+def convert_batch():
+    """Convert many rows of from, to and amount in one vectorized pass
+
+    Takes a JSON list of rows or object of columns, a CSV body with a header
+    row, or an Arrow stream when pyarrow is installed. The results are
+    streamed back in the request's format, or whichever the Accept header
+    prefers.
+    """
+    try:
+        with phase('parse'):
+            from_codes, to_codes, amounts = read_batch(request.get_data(), request.mimetype,
+                                                       Config.CONVERT_BATCH_MAX_ROWS)
+    except BatchError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        with phase('cache'):
+            table = _rate_table()
+        if table is None:
+            return jsonify({'success': False, 'error': "Conversion rates are not available yet"}), 400
+        with phase('convert'):
+            rates, converted = table.convert_many(from_codes, to_codes, amounts)
+        if not np.isfinite(converted).all():
+            return jsonify({'success': False, 'error': "Converted amounts are out of range"}), 400
+        types = media_types(request.mimetype)
+        media_type = request.accept_mimetypes.best_match(types, default=types[0])
+        return Response(write_batch(from_codes, to_codes, amounts, rates, converted, media_type),
+                        mimetype=media_type)
+    except UnknownCurrency as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error converting currency batch: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/alerts', methods=['GET'])
+def get_alert_rules():
+    """List the registered alert rules, optionally one owner's"""
+    try:
+        with phase('db'):
+            rules = list_rules(request.args.get('owner'))
+        return jsonify({'success': True, 'data': [serialize_rule(rule) for rule in rules]})
+    except Exception as e:
+        logging.error(f"Error listing alert rules: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/alerts', methods=['POST'])
+def create_alert_rules():
+    """Register one rule, or a list of them
+
+    A rule is ``{symbol, kind, threshold, owner}``: kind 'above' or 'below'
+    fires when the price crosses the threshold, 'move' when the change
+    percentage moves beyond plus or minus the threshold.
+    """
+    body = request.get_json(silent=True)
+    rules = body if isinstance(body, list) else [body]
+    if not rules or len(rules) > Config.ALERT_RULES_MAX_PER_REQUEST:
+        return jsonify({'success': False,
+                        'error': f"Send between 1 and {Config.ALERT_RULES_MAX_PER_REQUEST} rules"}), 400
+    try:
+        rules = [parse_rule(rule) for rule in rules]
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        with phase('db'):
+            created = create_rules(rules)
+        return jsonify({'success': True, 'data': [serialize_rule(rule) for rule in created]}), 201
+    except Exception as e:
+        logging.error(f"Error creating alert rules: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/alerts/<int:rule_id>', methods=['DELETE'])
+def delete_alert_rule(rule_id):
+    """Remove an alert rule"""
+    try:
+        with phase('db'):
+            deleted = delete_rule(rule_id)
+        if not deleted:
+            return jsonify({'success': False, 'error': f"No alert rule {rule_id}"}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        logging.error(f"Error deleting alert rule {rule_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/alerts/fired')
+def get_fired_alerts():
+    """Get the alerts fired after the ``after`` id, optionally for one owner's rules"""
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({'success': False, 'error': "after must be an alert id"}), 400
+
+    try:
+        with phase('cache'):
+            recent = cache.get(ALERTS_KEY) or []
+            alerts = fired_since(recent, after, request.args.get('owner'))
+        return jsonify({
+            'success': True,
+            'data': [asdict(alert) for alert in alerts],
+            'last_id': recent[-1].id if recent else after
+        })
+    except Exception as e:
+        logging.error(f"Error getting fired alerts: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _parse_holdings(holdings):
+    """Validate a request's list of holdings, raising ValueError"""
+    if not isinstance(holdings, list) or len(holdings) > Config.PORTFOLIO_MAX_HOLDINGS:
+        raise ValueError(f"holdings must be a list of up to {Config.PORTFOLIO_MAX_HOLDINGS} holdings")
+    return [parse_holding(holding) for holding in holdings]
+
+@api_bp.route('/portfolio', methods=['POST'])
+def add_portfolio():
+    """Create a portfolio from ``{name, owner, holdings}``
+
+    Each holding is ``{asset_class, symbol, quantity}``: shares of an
+    equity, coins of a crypto, units of a commodity's quote (e.g. grams of
+    gold) or an amount of cash in any currency the rate provider quotes.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        name = str(body.get('name') or '').strip()
+        if not name or len(name) > 100:
+            raise ValueError("A portfolio needs a name of up to 100 characters")
+        owner = body.get('owner')
+        if owner is not None and (not isinstance(owner, str) or len(owner) > 100):
+            raise ValueError("Portfolio owner must be a string of up to 100 characters")
+        holdings = _parse_holdings(body.get('holdings', []))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        with phase('db'):
+            portfolio, rows = create_portfolio(name, owner, holdings)
+        return jsonify({'success': True, 'data': serialize_portfolio(portfolio, rows)}), 201
+    except Exception as e:
+        logging.error(f"Error creating portfolio: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/portfolio/<int:portfolio_id>')
+def show_portfolio(portfolio_id):
+    """Get a portfolio and its holdings"""
+    try:
+        with phase('db'):
+            found = get_portfolio(portfolio_id)
+        if found is None:
+            return jsonify({'success': False, 'error': f"No portfolio {portfolio_id}"}), 404
+        return jsonify({'success': True, 'data': serialize_portfolio(*found)})
+    except Exception as e:
+        logging.error(f"Error getting portfolio {portfolio_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/portfolio/<int:portfolio_id>/holdings', methods=['PUT'])
+def replace_portfolio_holdings(portfolio_id):
+    """Replace a portfolio's holdings with the list in the body"""
+    try:
+        holdings = _parse_holdings(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        with phase('db'):
+            replaced = replace_holdings(portfolio_id, holdings)
+        if replaced is None:
+            return jsonify({'success': False, 'error': f"No portfolio {portfolio_id}"}), 404
+        return jsonify({'success': True, 'data': serialize_portfolio(*replaced)})
+    except Exception as e:
+        logging.error(f"Error replacing holdings of portfolio {portfolio_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/portfolio/<int:portfolio_id>/valuation')
+def get_portfolio_valuation(portfolio_id):
+    """Value a portfolio in INR at the latest prices: market value, day P&L and allocation"""
+    try:
+        with phase('cache'):
+            book = latest_quote_book(cache)
+        with phase('value'):
+            valuation = portfolio_valuation(portfolio_id, book)
+        if valuation is None:
+            return jsonify({'success': False, 'error': f"No portfolio {portfolio_id}"}), 404
+        with phase('serialize'):
+            return jsonify({'success': True, 'data': valuation})
+    except Exception as e:
+        logging.error(f"Error valuing portfolio {portfolio_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
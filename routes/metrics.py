@@ -0,0 +1,21 @@
+import time
+from flask import Blueprint, Response, g, request
+from services.metrics import REQUEST_SECONDS, render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@metrics_bp.after_app_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.endpoint or 'unmatched', str(response.status_code))
+    return response
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics of this worker process"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
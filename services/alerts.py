@@ -0,0 +1,267 @@
+import bisect
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+import numpy as np
+import requests
+from sqlalchemy import func, select
+from db import db
+from models import AlertRule
+from services.ticks import QUOTE_VALUES
+
+# Cache key of the most recently fired alerts, oldest first
+ALERTS_KEY = 'fired_alerts'
+
+# 'above' and 'below' watch the price; 'move' fires when the change
+# percentage moves beyond +threshold or -threshold
+KINDS = ('above', 'below', 'move')
+
+PRICE = 'price'
+CHANGE = 'change_percent'
+UP = 1
+DOWN = -1
+
+@dataclass(frozen=True, slots=True)
+class Alert:
+    rule_id: int
+    owner: Optional[str]
+    symbol: str
+    kind: str
+    threshold: float
+    price: float
+    previous_price: float
+    change_percent: float
+    fired_at: float
+    # Numbered when published, so clients can poll for the ones they missed
+    id: int = 0
+
+def parse_rule(data) -> Dict:
+    """Validate one rule from a request body into AlertRule columns"""
+    if not isinstance(data, dict):
+        raise ValueError("A rule must be an object")
+    symbol = str(data.get('symbol') or '').strip().upper()
+    if not symbol or len(symbol) > 32:
+        raise ValueError("A rule needs a symbol of up to 32 characters")
+    kind = str(data.get('kind') or '').lower()
+    if kind not in KINDS:
+        raise ValueError(f"Rule kind must be one of {', '.join(KINDS)}")
+    try:
+        threshold = float(data.get('threshold'))
+    except (TypeError, ValueError):
+        raise ValueError("A rule needs a numeric threshold") from None
+    if not math.isfinite(threshold) or threshold <= 0:
+        raise ValueError("Rule thresholds must be positive")
+    owner = data.get('owner')
+    if owner is not None and (not isinstance(owner, str) or len(owner) > 100):
+        raise ValueError("Rule owner must be a string of up to 100 characters")
+    return {'symbol': symbol, 'kind': kind, 'threshold': threshold, 'owner': owner or None}
+
+def serialize_rule(rule: AlertRule) -> Dict:
+    return {
+        'id': rule.id,
+        'owner': rule.owner,
+        'symbol': rule.symbol,
+        'kind': rule.kind,
+        'threshold': rule.threshold,
+        'created_at': rule.created_at.isoformat() if rule.created_at else None
+    }
+
+def create_rules(rules: List[Dict]) -> List[AlertRule]:
+    """Store validated rules; the engine picks them up at its next cycle"""
+    created = [AlertRule(**rule) for rule in rules]
+    db.session.add_all(created)
+    db.session.commit()
+    return created
+
+def list_rules(owner: Optional[str] = None) -> List[AlertRule]:
+    query = select(AlertRule).order_by(AlertRule.id)
+    if owner is not None:
+        query = query.where(AlertRule.owner == owner)
+    return list(db.session.execute(query).scalars())
+
+def delete_rule(rule_id: int) -> bool:
+    deleted = db.session.execute(db.delete(AlertRule).where(AlertRule.id == rule_id)).rowcount
+    db.session.commit()
+    return bool(deleted)
+
+def _triggers(kind: str, threshold: float) -> List[Tuple[str, int, float]]:
+    """The (value, direction, level) crossings that fire a rule"""
+    if kind == 'above':
+        return [(PRICE, UP, threshold)]
+    if kind == 'below':
+        return [(PRICE, DOWN, threshold)]
+    return [(CHANGE, UP, threshold), (CHANGE, DOWN, -threshold)]
+
+class ThresholdIndex:
+    """The levels of every rule on one value of one symbol, sorted for bisection"""
+
+    __slots__ = ('levels', 'rule_ids')
+
+    def __init__(self, levels: Iterable[float], rule_ids: Iterable[int]):
+        levels = np.asarray(levels, dtype=np.float64)
+        order = np.argsort(levels, kind='stable')
+        self.levels = levels[order]
+        self.rule_ids = np.asarray(rule_ids, dtype=np.int64)[order]
+
+    def crossed(self, old: float, new: float, direction: int) -> slice:
+        """The rules whose level the value passed on its way from old to new
+
+        Rising, a level fires when old < level <= new; falling, when
+        new <= level < old. Either is one contiguous run of the sorted
+        levels, found with two binary searches.
+        """
+        if direction == UP and new > old:
+            return slice(int(np.searchsorted(self.levels, old, 'right')),
+                         int(np.searchsorted(self.levels, new, 'right')))
+        if direction == DOWN and new < old:
+            return slice(int(np.searchsorted(self.levels, new, 'left')),
+                         int(np.searchsorted(self.levels, old, 'left')))
+        return slice(0, 0)
+
+def quote_values(results: Dict) -> Dict[str, Tuple[float, float]]:
+    """The price and change percentage of every symbol in a fetch cycle's results"""
+    values = {}
+    for key, field in QUOTE_VALUES.items():
+        for quote in (results.get(key) or {}).values():
+            values[quote.symbol] = (getattr(quote, field), quote.change_percent)
+    for stock in (results.get('gainers_losers') or {}).get('stocks', []):
+        values[stock.symbol] = (stock.price, stock.change_percent)
+    return values
+
+class AlertEngine:
+    """Threshold and percent-move rules, checked against each fetch cycle's prices
+
+    Rules are grouped per symbol into sorted ThresholdIndexes, one per value
+    and direction. A cycle costs two binary searches per index of each
+    quoted symbol plus one step per rule that fires, however many rules
+    are registered. A rule fires each time its level is crossed, never while
+    the price merely stays beyond it.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, Dict[Tuple[str, int], ThresholdIndex]] = {}
+        self._owners: Dict[int, Optional[str]] = {}
+        self._last: Dict[str, Tuple[float, float]] = {}
+        # (rule count, highest id) of the rules loaded; ids are never reused
+        self.version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._owners)
+
+    def load(self, rules: Iterable[Tuple[int, Optional[str], str, str, float]]):
+        """Replace the rules with (id, owner, symbol, kind, threshold) rows"""
+        grouped: Dict[Tuple[str, str, int], Tuple[List[float], List[int]]] = {}
+        owners = {}
+        for rule_id, owner, symbol, kind, threshold in rules:
+            owners[rule_id] = owner
+            for field, direction, level in _triggers(kind, threshold):
+                levels, rule_ids = grouped.setdefault((symbol, field, direction), ([], []))
+                levels.append(level)
+                rule_ids.append(rule_id)
+        indexes: Dict[str, Dict[Tuple[str, int], ThresholdIndex]] = {}
+        for (symbol, field, direction), (levels, rule_ids) in grouped.items():
+            indexes.setdefault(symbol, {})[field, direction] = ThresholdIndex(levels, rule_ids)
+        with self._lock:
+            self._indexes = indexes
+            self._owners = owners
+
+    def sync(self, app):
+        """Reload the rules from the database if any were added or removed since the last load"""
+        with app.app_context():
+            try:
+                version = tuple(db.session.execute(
+                    select(func.count(AlertRule.id), func.coalesce(func.max(AlertRule.id), 0))).one())
+                if version != self.version:
+                    self.load(db.session.execute(select(
+                        AlertRule.id, AlertRule.owner, AlertRule.symbol, AlertRule.kind, AlertRule.threshold)).all())
+                    self.version = version
+                    logging.debug(f"Loaded {version[0]} alert rules")
+            finally:
+                db.session.remove()
+
+    def prime(self, values: Mapping[str, Tuple[float, float]]):
+        """Take prices as the starting point without firing, e.g. persisted ones at startup"""
+        with self._lock:
+            self._last.update(values)
+
+    def evaluate(self, values: Mapping[str, Tuple[float, float]], at: Optional[float] = None) -> List[Alert]:
+        """Record new prices and return the alerts of every rule they crossed"""
+        at = time.time() if at is None else at
+        fired = []
+        with self._lock:
+            for symbol, (price, change) in values.items():
+                if not (math.isfinite(price) and math.isfinite(change)):
+                    continue
+                previous = self._last.get(symbol)
+                self._last[symbol] = (price, change)
+                indexes = self._indexes.get(symbol)
+                if previous is None or indexes is None:
+                    continue
+                for (field, direction), index in indexes.items():
+                    old, new = (previous[0], price) if field == PRICE else (previous[1], change)
+                    crossed = index.crossed(old, new, direction)
+                    if crossed.start == crossed.stop:
+                        continue
+                    kind = 'move' if field == CHANGE else ('above' if direction == UP else 'below')
+                    for rule_id, level in zip(index.rule_ids[crossed].tolist(), index.levels[crossed].tolist()):
+                        fired.append(Alert(rule_id, self._owners.get(rule_id), symbol, kind, abs(level),
+                                           price, previous[0], change, at))
+        return fired
+
+class WebhookSink:
+    """Posts fired alerts to a webhook from a background thread, so fetch cycles never wait on it"""
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=1000)
+        self._session = requests.Session()
+        threading.Thread(target=self._run, name='alert-webhook', daemon=True).start()
+
+    def send(self, alerts: List[Alert]):
+        try:
+            self._queue.put_nowait(alerts)
+        except queue.Full:
+            logging.warning(f"Alert webhook is backed up; dropped {len(alerts)} alerts")
+
+    def _run(self):
+        while True:
+            alerts = self._queue.get()
+            try:
+                response = self._session.post(self.url, json={'alerts': [asdict(alert) for alert in alerts]},
+                                              timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logging.error(f"Error delivering {len(alerts)} alerts to the webhook: {e}")
+
+class AlertOutbox:
+    """Numbers fired alerts and publishes the most recent to the cache, and to a webhook if set"""
+
+    def __init__(self, cache, history: int = 1000, webhook: Optional[WebhookSink] = None):
+        self.cache = cache
+        self.webhook = webhook
+        # Carry on from a previous leader's numbering
+        self._recent = deque(cache.get(ALERTS_KEY) or [], maxlen=history)
+        self.last_id = self._recent[-1].id if self._recent else 0
+
+    def dispatch(self, alerts: List[Alert]) -> List[Alert]:
+        if not alerts:
+            return []
+        numbered = [replace(alert, id=self.last_id + offset) for offset, alert in enumerate(alerts, 1)]
+        self.last_id = numbered[-1].id
+        self._recent.extend(numbered)
+        self.cache.set(ALERTS_KEY, list(self._recent), timeout=0)
+        if self.webhook:
+            self.webhook.send(numbered)
+        return numbered
+
+def fired_since(recent: List[Alert], after: int = 0, owner: Optional[str] = None) -> List[Alert]:
+    """Alerts numbered after ``after``, optionally for one owner's rules"""
+    start = bisect.bisect_right(recent, after, key=lambda alert: alert.id)
+    return [alert for alert in recent[start:] if owner is None or alert.owner == owner]
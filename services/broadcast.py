@@ -0,0 +1,55 @@
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+class Broadcaster:
+    """Fan-out of pre-encoded server-sent events to any number of subscribers
+
+    Each event is encoded into one SSE frame when it is published and that
+    same bytes object is written to every subscriber. Subscribers block on a
+    shared condition instead of owning a thread each; under gevent workers
+    the wait is a greenlet switch, so idle connections cost almost nothing.
+    """
+
+    def __init__(self, history: int = 64):
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=history)
+        self.last_id = 0
+        # Id of the newest event that has fallen out of the history
+        self._dropped_id = 0
+
+    def publish(self, event: str, data: bytes, event_id: Optional[int] = None) -> int:
+        """Encode and broadcast one event, returning its id
+
+        Publishers pass the data generation as ``event_id``, so ids mean the
+        same in every process and survive restarts of a shared cache. Ids
+        only move forward and may skip numbers.
+        """
+        with self._condition:
+            self.last_id = max(self.last_id + 1, event_id or 0)
+            frame = b'id: %d\nevent: %s\ndata: %s\n\n' % (self.last_id, event.encode(), data)
+            if len(self._events) == self._events.maxlen:
+                self._dropped_id = self._events[0][0]
+            self._events.append((self.last_id, frame))
+            self._condition.notify_all()
+            return self.last_id
+
+    def wait(self, last_id: int, timeout: float) -> Optional[List[Tuple[int, bytes]]]:
+        """Block until events newer than ``last_id`` exist or ``timeout`` passes
+
+        Returns the missed ``(id, frame)`` pairs, an empty list on timeout, or
+        None when the subscriber has to resynchronise from a full snapshot:
+        events it missed have been dropped from the history, or its id is
+        ahead of this process's, e.g. from before a restart.
+        """
+        with self._condition:
+            if last_id > self.last_id:
+                return None
+            self._condition.wait_for(lambda: self.last_id > last_id, timeout)
+            if self.last_id <= last_id:
+                return []
+            if last_id < self._dropped_id:
+                return None
+            return [(event_id, frame) for event_id, frame in self._events if event_id > last_id]
+
+broadcaster = Broadcaster()
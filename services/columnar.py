@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# File layout:
+#   MAGIC | uint32 header length | JSON header | 8-byte aligned data regions
+# The header records, per section, the offset of each fixed-width column and
+# string table, plus the offset/length of every pre-rendered response blob.
+MAGIC = b'WVCOL001'
+PREFIX = struct.Struct('<8sI')
+ALIGNMENT = 8
+
+NUMERIC_COLUMNS = ('price', 'change', 'change_percent', 'timestamp')
+STRING_COLUMNS = ('symbol', 'name')
+
+def _rows_currency(rates):
+    for key, rate in rates.items():
+        yield key, key, rate.rate, None, rate.change_percent, rate.last_updated
+
+def _rows_indices(indices):
+    for name, index in indices.items():
+        yield index.symbol, name, index.value, index.change, index.change_percent, index.last_updated
+
+def _rows_commodities(commodities):
+    for key, commodity in commodities.items():
+        yield key, commodity.name, commodity.price, None, commodity.change_percent, commodity.last_updated
+
+def _rows_crypto(cryptos):
+    for key, crypto in cryptos.items():
+        yield key, crypto.name, crypto.price_inr, None, crypto.change_percent, crypto.last_updated
+
+def _rows_stocks(gainers_losers):
+    for stock in gainers_losers.get('stocks', []):
+        yield stock.symbol, stock.name, stock.price, stock.change, stock.change_percent, stock.last_updated
+
+# Column section -> (cache key of the fetched data, row extractor)
+COLUMN_SECTIONS = {
+    'currency-rates': ('currency_rates', _rows_currency),
+    'stock-indices': ('stock_indices', _rows_indices),
+    'commodity-prices': ('commodity_prices', _rows_commodities),
+    'crypto-prices': ('crypto_prices', _rows_crypto),
+    'stocks': ('gainers_losers', _rows_stocks),
+}
+
+class _Builder:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> int:
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        return offset
+
+def _string_table(builder: _Builder, values: List[str]) -> List[int]:
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return [builder.add(offsets.tobytes()), builder.add(b''.join(encoded))]
+
+def build_columns(value_rows: Iterable) -> Dict:
+    """Split (symbol, name, price, change, change_percent, last_updated) rows into columns"""
+    rows = list(value_rows)
+    columns = {
+        'symbol': [str(row[0]) for row in rows],
+        'name': [str(row[1]) for row in rows],
+        'price': np.array([row[2] for row in rows], dtype='<f8'),
+        'change': np.array([np.nan if row[3] is None else row[3] for row in rows], dtype='<f8'),
+        'change_percent': np.array([row[4] for row in rows], dtype='<f8'),
+        'timestamp': np.array([row[5].timestamp() if row[5] else np.nan for row in rows], dtype='<f8'),
+    }
+    # Derive absolute change from the percentage where the source only has the latter
+    missing = np.isnan(columns['change'])
+    if missing.any():
+        price, percent = columns['price'][missing], columns['change_percent'][missing]
+        columns['change'][missing] = price - price / (1 + percent / 100)
+    return columns
+
+def write_snapshot(path: str, generation: int, columns: Dict[str, Dict], blobs: Dict[str, bytes],
+                   meta: Optional[Dict] = None) -> None:
+    """Write a snapshot file and atomically replace the previous one
+
+    Readers that still map the old file keep a valid view of it until they
+    notice the replacement, so a write never tears a read.
+    """
+    builder = _Builder()
+    header = {'generation': generation, 'meta': meta or {}, 'sections': {}, 'blobs': {}}
+    for section, section_columns in columns.items():
+        entry = {'count': len(section_columns['symbol']), 'columns': {}, 'strings': {}}
+        for name in NUMERIC_COLUMNS:
+            entry['columns'][name] = builder.add(section_columns[name].astype('<f8').tobytes())
+        for name in STRING_COLUMNS:
+            entry['strings'][name] = _string_table(builder, section_columns[name])
+        header['sections'][section] = entry
+    for name, blob in blobs.items():
+        header['blobs'][name] = [builder.add(blob), len(blob)]
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    data_start = PREFIX.size + len(header_bytes)
+    data_start += -data_start % ALIGNMENT
+    prefix = PREFIX.pack(MAGIC, len(header_bytes)) + header_bytes
+    prefix += b'\0' * (data_start - len(prefix))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(prefix)
+            for chunk in builder.chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+@dataclass(frozen=True)
+class MappedPayload:
+    """A response body served straight out of the mapped snapshot file"""
+    body: memoryview
+    etag: str
+    generation: int
+    expires_at: float
+
+class _MappedSnapshot:
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = PREFIX.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        self.header = json.loads(self.buffer[PREFIX.size:PREFIX.size + header_length])
+        start = PREFIX.size + header_length
+        self.data_start = start + (-start % ALIGNMENT)
+        self.view = memoryview(self.buffer)
+        self.generation = self.header['generation']
+
+    def column(self, section: str, name: str) -> np.ndarray:
+        entry = self.header['sections'][section]
+        return np.frombuffer(self.buffer, dtype='<f8', count=entry['count'],
+                             offset=self.data_start + entry['columns'][name])
+
+    def strings(self, section: str, name: str) -> List[str]:
+        entry = self.header['sections'][section]
+        offsets_at, blob_at = entry['strings'][name]
+        offsets = np.frombuffer(self.buffer, dtype='<u4', count=entry['count'] + 1,
+                                offset=self.data_start + offsets_at)
+        blob = self.view[self.data_start + blob_at:self.data_start + blob_at + int(offsets[-1])]
+        return [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(entry['count'])]
+
+    def table(self, section: str) -> Dict[str, Sequence]:
+        """Every column of a section: zero-copy views of the numeric ones and the decoded strings"""
+        columns: Dict[str, Sequence] = {name: self.column(section, name) for name in NUMERIC_COLUMNS}
+        columns.update((name, self.strings(section, name)) for name in STRING_COLUMNS)
+        return columns
+
+    def blob(self, name: str) -> Optional[memoryview]:
+        location = self.header['blobs'].get(name)
+        if location is None:
+            return None
+        offset, length = location
+        return self.view[self.data_start + offset:self.data_start + offset + length]
+
+class SnapshotReader:
+    """Maps the snapshot file and remaps it when the writer replaces it
+
+    Every worker maps the same file, so the OS page cache holds one copy of
+    the data no matter how many processes serve it.
+    """
+
+    def __init__(self, path: str, check_interval: float = 0.25):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[_MappedSnapshot] = None
+        self._identity = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[_MappedSnapshot]:
+        """The latest mapped snapshot, or None when none has been written yet"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._snapshot, self._identity = None, None
+                return None
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if identity != self._identity:
+                # The old map is left to the garbage collector: arrays handed
+                # out earlier may still reference it
+                self._snapshot = _MappedSnapshot(self.path)
+                self._identity = identity
+            return self._snapshot
+
+    def payload(self, name: str) -> Optional[MappedPayload]:
+        snapshot = self.current()
+        if snapshot is None:
+            return None
+        body = snapshot.blob(name)
+        meta = snapshot.header['meta'].get(name)
+        if body is None or meta is None:
+            return None
+        return MappedPayload(body, meta['etag'], snapshot.generation, meta['expires_at'])
+
+    def blob(self, name: str) -> Optional[memoryview]:
+        snapshot = self.current()
+        return snapshot.blob(name) if snapshot is not None else None
+
+    def table(self, section: str) -> Optional[Tuple[int, Dict[str, Sequence]]]:
+        """(generation, columns) of a section of the latest snapshot, if it has one"""
+        snapshot = self.current()
+        if snapshot is None or section not in snapshot.header['sections']:
+            return None
+        return snapshot.generation, snapshot.table(section)
@@ -1,52 +1,192 @@
 import requests
+import json
 import logging
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
 import pytz
-from models import CurrencyRate, StockIndex, CommodityPrice, CryptoPrice, NewsItem, StockData
+from requests.adapters import HTTPAdapter
+from config import Config
+from records import CurrencyQuote, IndexQuote, CommodityQuote, CryptoQuote, NewsArticle, StockQuote
+from services.fetch_engine import FetchEngine
+from services.http_cache import HttpCache
+from services.metrics import UPSTREAM_BYTES, UPSTREAM_CACHE, UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES
+from services.resilience import ProviderGuard, ProviderUnavailable, build_guards
+from services.ticks import TickStore
+from services.ranking import RankingIndex
+from services.universe import load_listings
 
 IST = pytz.timezone('Asia/Kolkata')
 
 class DataFetcher:
-    def __init__(self):
+    def __init__(self, engine: Optional[FetchEngine] = None, http_cache: Optional[HttpCache] = None):
+        self.engine = engine or FetchEngine(
+            max_workers=Config.FETCH_MAX_WORKERS,
+            provider_limits=Config.PROVIDER_CONCURRENCY,
+            cycle_deadline=Config.FETCH_CYCLE_DEADLINE
+        )
         self.alpha_vantage_key = os.getenv("ALPHA_VANTAGE_API_KEY", "")
         self.news_api_key = os.getenv("NEWS_API_KEY", "")
         self.metals_api_key = os.getenv("METALS_API_KEY", "")
         self.coinmarketcap_api_key = os.getenv("COINMARKETCAP_API_KEY", "")
         self.exchange_rate_api_key = os.getenv("EXCHANGE_RATE_API_KEY", "")
+        listings = load_listings()
+        self.stock_universe = list(listings)
+        # Every stock's latest change, for gainers/losers queries of any size and filter
+        self.ranking = RankingIndex(listings, capacity=max(len(listings), 1))
+        # The provider's whole USD-based table, of which currency_rates is the INR subset
+        self.usd_rates: Dict[str, float] = {}
+        # Recent prices per symbol, so quotes without an upstream change can report one
+        self.ticks = TickStore(Config.TICK_BUFFER_SIZE)
+        if http_cache is None and Config.HTTP_CACHE_ENABLED:
+            http_cache = HttpCache(Config.HTTP_CACHE_DIR, Config.HTTP_CACHE_MAX_BYTES)
+        self.http_cache = http_cache
+        self.guards = build_guards(Config.PROVIDER_RATE_LIMITS, Config.CIRCUIT_FAILURE_THRESHOLD,
+                                   Config.CIRCUIT_RESET_SECONDS, Config.FETCH_MAX_RETRIES)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # Keep enough pooled connections for every concurrent request
+        adapter = HTTPAdapter(pool_connections=len(Config.PROVIDER_CONCURRENCY),
+                              pool_maxsize=Config.FETCH_MAX_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         if not self.news_api_key:
             logging.warning("NEWS_API_KEY is missing. Financial news may be unavailable.")
 
-    def fetch_currency_rates(self) -> Dict[str, CurrencyRate]:
+    def _get_json(self, provider: str, url: str, params: Optional[Dict] = None, timeout: float = 10):
+        """GET a JSON document, holding one of the provider's concurrency slots
+
+        Cached responses younger than the provider's TTL are used without a
+        request; older ones are revalidated with their ETag/Last-Modified.
+        Requests pass the provider's rate limit and circuit breaker and are
+        retried with backoff within the cycle deadline. When the provider
+        still fails, a cached response up to HTTP_CACHE_MAX_STALE old is
+        served instead.
+        """
+        cached = self.http_cache.get(url, params) if self.http_cache else None
+        if cached is not None and cached.age() < Config.HTTP_CACHE_TTLS.get(provider, 0):
+            UPSTREAM_CACHE.inc(provider, 'fresh')
+            return json.loads(cached.body)
+        fallback = cached is not None and cached.age() < Config.HTTP_CACHE_MAX_STALE
+        if fallback:
+            # Don't wait long on a slow provider when there is something to serve
+            timeout = min(timeout, Config.HTTP_CACHE_REVALIDATE_TIMEOUT)
+
+        def send():
+            with self.engine.limit(provider), UPSTREAM_REQUEST_SECONDS.time(provider):
+                try:
+                    response = self.session.get(url, params=params, headers=cached.validators() if cached else None,
+                                                timeout=self.engine.timeout(timeout))
+                except requests.RequestException:
+                    UPSTREAM_RESPONSES.inc(provider, 'error')
+                    raise
+            UPSTREAM_RESPONSES.inc(provider, str(response.status_code))
+            UPSTREAM_BYTES.inc(provider, amount=len(response.content))
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+
+        guard = self.guards.get(provider) or self.guards.setdefault(provider, ProviderGuard(provider))
+        try:
+            response = guard.call(send, self.engine.remaining)
+            if response.status_code == 304 and cached is not None:
+                UPSTREAM_CACHE.inc(provider, 'revalidated')
+                return json.loads(self.http_cache.refresh(cached, params).body)
+            data = response.json()
+        except (requests.RequestException, ProviderUnavailable, ValueError) as e:
+            if not fallback:
+                raise
+            logging.warning(f"Serving cached {provider} response from {cached.age():.0f}s ago: {e}")
+            UPSTREAM_CACHE.inc(provider, 'stale')
+            return json.loads(cached.body)
+
+        if self.http_cache is not None:
+            self.http_cache.store(url, params, response.content,
+                                  response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return data
+
+    @staticmethod
+    def _quote_from_meta(symbol: str, meta: Dict) -> Dict:
+        """A quote from the meta block Yahoo's chart and spark endpoints share"""
+        return {
+            'symbol': symbol,
+            'name': meta.get('shortName') or meta.get('longName') or meta.get('symbol', symbol),
+            'price': meta.get('regularMarketPrice', 0),
+            'previous_close': meta.get('previousClose') or meta.get('chartPreviousClose', 0)
+        }
+
+    def _fetch_chart_quote(self, symbol: str, timeout: float = 10) -> Optional[Dict]:
+        """Fetch one symbol from the Yahoo chart endpoint"""
+        data = self._get_json('yahoo', f"{Config.YAHOO_API_URL}/v8/finance/chart/{symbol}", timeout=timeout)
+        if 'chart' in data and data['chart']['result']:
+            return self._quote_from_meta(symbol, data['chart']['result'][0]['meta'])
+        return None
+
+    def _fetch_quote_batch(self, symbols: tuple, timeout: float = 10) -> List[Dict]:
+        """Fetch one chunk of symbols from the Yahoo spark endpoint
+
+        Unlike /v7/finance/quote, spark takes many symbols per request
+        without a session cookie and crumb.
+        """
+        data = self._get_json(
+            'yahoo', f"{Config.YAHOO_API_URL}/v8/finance/spark",
+            params={'symbols': ','.join(symbols), 'range': '1d', 'interval': '1d'}, timeout=timeout
+        )
+        quotes = []
+        for result in (data.get('spark') or {}).get('result') or []:
+            responses = result.get('response') or []
+            if responses and responses[0].get('meta'):
+                quotes.append(self._quote_from_meta(result['symbol'], responses[0]['meta']))
+        return quotes
+
+    def fetch_quotes(self, symbols: List[str], timeout: float = 10) -> Dict[str, Dict]:
+        """Fetch quotes for many symbols, YAHOO_QUOTE_BATCH_SIZE symbols per request
+
+        Chunks are fetched in parallel. Symbols missing from the batch
+        responses fall back to the per-symbol chart endpoint.
+        """
+        size = max(1, Config.YAHOO_QUOTE_BATCH_SIZE)
+        chunks = [tuple(symbols[i:i + size]) for i in range(0, len(symbols), size)]
+        batches = self.engine.map('yahoo', lambda chunk: self._fetch_quote_batch(chunk, timeout), chunks)
+
+        quotes = {}
+        for batch in batches.values():
+            for quote in batch:
+                quotes[quote['symbol']] = quote
+
+        missing = [symbol for symbol in symbols if symbol not in quotes]
+        if missing:
+            logging.info(f"Falling back to chart endpoint for {len(missing)} symbols")
+            fallback = self.engine.map('yahoo', lambda symbol: self._fetch_chart_quote(symbol, timeout), missing)
+            quotes.update({symbol: quote for symbol, quote in fallback.items() if quote})
+        return quotes
+
+    def fetch_currency_rates(self) -> Dict[str, CurrencyQuote]:
         """Fetch USD to INR and other major currency rates using key-based API"""
         try:
             if not self.exchange_rate_api_key:
                 logging.warning("EXCHANGE_RATE_API_KEY is missing. Currency rates may be incomplete.")
                 return {}
             
-            url = f"https://v6.exchangerate-api.com/v6/{self.exchange_rate_api_key}/latest/USD"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            url = f"{Config.EXCHANGE_RATE_API_URL}/v6/{self.exchange_rate_api_key}/latest/USD"
+            data = self._get_json('exchangerate', url, timeout=10)
             
             current_time = datetime.now(IST)
             currencies = {}
             
             if data.get('result') == 'success' and 'conversion_rates' in data:
                 rates = data['conversion_rates']
+                self.usd_rates = rates
                 
                 # Get INR rate
                 if 'INR' in rates:
                     inr_rate = rates['INR']
-                    currencies['USD-INR'] = CurrencyRate(
+                    currencies['USD-INR'] = CurrencyQuote(
                         symbol="USD-INR",
                         rate=inr_rate,
-                        change_percent=0.0,
+                        change_percent=self.ticks.record("USD-INR", inr_rate, current_time).change_percent,
                         last_updated=current_time
                     )
                 
@@ -55,10 +195,11 @@ class DataFetcher:
                 for currency in major_currencies:
                     if currency in rates:
                         rate_to_inr = rates['INR'] / rates[currency]
-                        currencies[f'{currency}-INR'] = CurrencyRate(
+                        currencies[f'{currency}-INR'] = CurrencyQuote(
                             symbol=f"{currency}-INR",
                             rate=rate_to_inr,
-                            change_percent=0.0,
+                            change_percent=self.ticks.record(f"{currency}-INR", rate_to_inr,
+                                                             current_time).change_percent,
                             last_updated=current_time
                         )
                 return currencies
@@ -70,7 +211,7 @@ class DataFetcher:
             logging.error(f"Error fetching currency rates: {e}")
             return {}
 
-    def fetch_stock_indices(self) -> Dict[str, StockIndex]:
+    def fetch_stock_indices(self) -> Dict[str, IndexQuote]:
         """Fetch major Indian stock indices"""
         try:
             # Using Yahoo Finance alternative API
@@ -78,41 +219,31 @@ class DataFetcher:
             current_time = datetime.now(IST)
             
             # Yahoo Finance symbols for Indian indices
-            symbols = {
-                'NIFTY 50': '^NSEI',
-                'SENSEX': '^BSESN',
-                'BANK NIFTY': '^NSEBANK'
-            }
+            symbols = Config.STOCK_INDICES
+            
+            quotes = self.fetch_quotes(list(symbols.values()))
             
             for name, symbol in symbols.items():
-                try:
-                    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-                    response = self.session.get(url, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if 'chart' in data and data['chart']['result']:
-                        result = data['chart']['result'][0]
-                        meta = result['meta']
-                        
-                        current_price = meta.get('regularMarketPrice', 0)
-                        prev_close = meta.get('previousClose', 0)
-                        
-                        if current_price and prev_close:
-                            change = current_price - prev_close
-                            change_percent = (change / prev_close) * 100
-                            
-                            indices[name] = StockIndex(
-                                name=name,
-                                symbol=symbol,
-                                value=current_price,
-                                change=change,
-                                change_percent=change_percent,
-                                last_updated=current_time
-                            )
-                except Exception as e:
-                    logging.error(f"Error fetching {name}: {e}")
+                quote = quotes.get(symbol)
+                if not quote:
                     continue
+                
+                current_price = quote['price']
+                prev_close = quote['previous_close']
+                
+                if current_price and prev_close:
+                    change = current_price - prev_close
+                    change_percent = (change / prev_close) * 100
+                    self.ticks.record(symbol, current_price, current_time)
+                    
+                    indices[name] = IndexQuote(
+                        name=name,
+                        symbol=symbol,
+                        value=current_price,
+                        change=change,
+                        change_percent=change_percent,
+                        last_updated=current_time
+                    )
             
             return indices
             
@@ -120,7 +251,7 @@ class DataFetcher:
             logging.error(f"Error fetching stock indices: {e}")
             return {}
 
-    def fetch_commodity_prices(self) -> Dict[str, CommodityPrice]:
+    def fetch_commodity_prices(self) -> Dict[str, CommodityQuote]:
         """Fetch gold, silver, and oil prices"""
         try:
             commodities = {}
@@ -131,10 +262,8 @@ class DataFetcher:
                 logging.warning("METALS_API_KEY is missing. Commodity prices may be incomplete.")
             else:
                 try:
-                    url = "https://api.metals.live/v1/spot"
-                    response = self.session.get(url, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
+                    url = f"{Config.METALS_API_URL}/v1/spot"
+                    data = self._get_json('metals', url, timeout=10)
                     
                     if isinstance(data, list) and len(data) > 0:
                         for item in data:
@@ -143,11 +272,12 @@ class DataFetcher:
                                 usd_inr_rate = 83.0
                                 gold_inr_per_gram = (gold_usd_per_oz * usd_inr_rate) / 31.1035
                                 
-                                commodities['GOLD'] = CommodityPrice(
+                                commodities['GOLD'] = CommodityQuote(
                                     name="Gold",
                                     symbol="GOLD",
                                     price=gold_inr_per_gram,
-                                    change_percent=0.0,
+                                    change_percent=self.ticks.record("GOLD", gold_inr_per_gram,
+                                                                     current_time).change_percent,
                                     unit="INR/gram",
                                     last_updated=current_time
                                 )
@@ -156,11 +286,12 @@ class DataFetcher:
                                 usd_inr_rate = 83.0
                                 silver_inr_per_gram = (silver_usd_per_oz * usd_inr_rate) / 31.1035
                                 
-                                commodities['SILVER'] = CommodityPrice(
+                                commodities['SILVER'] = CommodityQuote(
                                     name="Silver",
                                     symbol="SILVER",
                                     price=silver_inr_per_gram,
-                                    change_percent=0.0,
+                                    change_percent=self.ticks.record("SILVER", silver_inr_per_gram,
+                                                                     current_time).change_percent,
                                     unit="INR/gram",
                                     last_updated=current_time
                                 )
@@ -172,10 +303,8 @@ class DataFetcher:
                 logging.warning("ALPHA_VANTAGE_API_KEY is missing. Crude oil price may be unavailable.")
             else:
                 try:
-                    url = f"https://www.alphavantage.co/query?function=WTI&interval=daily&apikey={self.alpha_vantage_key}"
-                    response = self.session.get(url, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
+                    url = f"{Config.ALPHA_VANTAGE_API_URL}/query?function=WTI&interval=daily&apikey={self.alpha_vantage_key}"
+                    data = self._get_json('alphavantage', url, timeout=10)
                     
                     if 'data' in data and len(data['data']) > 0:
                         latest_oil = data['data'][0]
@@ -183,11 +312,11 @@ class DataFetcher:
                         usd_inr_rate = 83.0
                         oil_inr = oil_usd * usd_inr_rate
                         
-                        commodities['CRUDE_OIL'] = CommodityPrice(
+                        commodities['CRUDE_OIL'] = CommodityQuote(
                             name="Crude Oil",
                             symbol="CRUDE_OIL",
                             price=oil_inr,
-                            change_percent=0.0,
+                            change_percent=self.ticks.record("CRUDE_OIL", oil_inr, current_time).change_percent,
                             unit="INR/barrel",
                             last_updated=current_time
                         )
@@ -200,20 +329,18 @@ class DataFetcher:
             logging.error(f"Error fetching commodity prices: {e}")
             return {}
 
-    def fetch_crypto_prices(self) -> Dict[str, CryptoPrice]:
+    def fetch_crypto_prices(self) -> Dict[str, CryptoQuote]:
         """Fetch cryptocurrency prices in INR"""
         try:
             # Using CoinGecko API (free tier)
-            url = "https://api.coingecko.com/api/v3/simple/price"
+            url = f"{Config.COINGECKO_API_URL}/api/v3/simple/price"
             params = {
                 'ids': 'bitcoin,ethereum,binancecoin,cardano,solana,dogecoin,polygon,chainlink',
                 'vs_currencies': 'inr',
                 'include_24hr_change': 'true'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json('coingecko', url, params=params, timeout=10)
             
             current_time = datetime.now(IST)
             cryptos = {}
@@ -234,8 +361,9 @@ class DataFetcher:
                     crypto_data = data[crypto_id]
                     price_inr = crypto_data.get('inr', 0)
                     change_24h = crypto_data.get('inr_24h_change', 0)
+                    self.ticks.record(crypto_id.upper(), price_inr, current_time)
                     
-                    cryptos[crypto_id.upper()] = CryptoPrice(
+                    cryptos[crypto_id.upper()] = CryptoQuote(
                         symbol=crypto_id.upper(),
                         name=crypto_name,
                         price_inr=price_inr,
@@ -249,11 +377,11 @@ class DataFetcher:
             logging.error(f"Error fetching crypto prices: {e}")
             return {}
 
-    def fetch_financial_news(self) -> List[NewsItem]:
+    def fetch_financial_news(self) -> List[NewsArticle]:
         """Fetch latest financial news"""
         try:
             # Using NewsAPI (free tier)
-            url = "https://newsapi.org/v2/top-headlines"
+            url = f"{Config.NEWS_API_URL}/v2/top-headlines"
             params = {
                 'country': 'in',
                 'category': 'business',
@@ -261,9 +389,7 @@ class DataFetcher:
                 'pageSize': 10
             }
             
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json('newsapi', url, params=params, timeout=10)
             
             news_items = []
             if 'articles' in data:
@@ -272,7 +398,7 @@ class DataFetcher:
                         article['publishedAt'].replace('Z', '+00:00')
                     ).astimezone(IST)
                     
-                    news_items.append(NewsItem(
+                    news_items.append(NewsArticle(
                         title=article['title'],
                         description=article.get('description', ''),
                         url=article['url'],
@@ -286,63 +412,43 @@ class DataFetcher:
             logging.error(f"Error fetching financial news: {e}")
             return []
 
-    def fetch_top_gainers_losers(self) -> Dict[str, List[StockData]]:
+    def fetch_top_gainers_losers(self) -> Dict[str, List[StockQuote]]:
         """Fetch top gainers and losers from Indian stock market"""
         try:
             # Using Yahoo Finance API for Indian stocks
-            gainers = []
-            losers = []
-            
-            # Sample Indian stock symbols
-            symbols = [
-                'RELIANCE.NS', 'TCS.NS', 'HDFCBANK.NS', 'INFY.NS', 'HINDUNILVR.NS',
-                'ICICIBANK.NS', 'KOTAKBANK.NS', 'SBIN.NS', 'BHARTIARTL.NS', 'ITC.NS'
-            ]
+            symbols = self.stock_universe
+            current_time = datetime.now(IST)
             
             stocks_data = []
+            quotes = self.fetch_quotes(symbols, timeout=5)
             for symbol in symbols:
-                try:
-                    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-                    response = self.session.get(url, timeout=5)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if 'chart' in data and data['chart']['result']:
-                        result = data['chart']['result'][0]
-                        meta = result['meta']
-                        
-                        current_price = meta.get('regularMarketPrice', 0)
-                        prev_close = meta.get('previousClose', 0)
-                        
-                        if current_price and prev_close:
-                            change = current_price - prev_close
-                            change_percent = (change / prev_close) * 100
-                            
-                            stock_data = StockData(
-                                symbol=symbol,
-                                name=meta.get('symbol', symbol),
-                                price=current_price,
-                                change=change,
-                                change_percent=change_percent
-                            )
-                            stocks_data.append(stock_data)
-                            
-                except Exception as e:
-                    logging.error(f"Error fetching {symbol}: {e}")
+                quote = quotes.get(symbol)
+                if not quote:
                     continue
+                
+                current_price = quote['price']
+                prev_close = quote['previous_close']
+                
+                if current_price and prev_close:
+                    change = current_price - prev_close
+                    change_percent = (change / prev_close) * 100
+                    
+                    stock_data = StockQuote(
+                        symbol=symbol,
+                        name=quote['name'],
+                        price=current_price,
+                        change=change,
+                        change_percent=change_percent,
+                        last_updated=current_time
+                    )
+                    stocks_data.append(stock_data)
             
-            # Sort by change percentage
-            stocks_data.sort(key=lambda x: x.change_percent, reverse=True)
-            
-            # Top 5 gainers and losers
-            gainers = stocks_data[:5]
-            losers = stocks_data[-5:]
-            
-            return {
-                'gainers': gainers,
-                'losers': losers
-            }
+            # Top 5 gainers and losers by change percentage
+            self.ranking.update(stocks_data)
+            ranked = self.ranking.top(5)
+            ranked['stocks'] = stocks_data
+            return ranked
             
         except Exception as e:
             logging.error(f"Error fetching top gainers/losers: {e}")
-            return {'gainers': [], 'losers': []}
+            return {'gainers': [], 'losers': [], 'stocks': []}
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+
+class FetchEngine:
+    """Bounded thread pools that fan fetch work out across providers and symbols.
+
+    Provider jobs run side by side on one pool, per-symbol requests on another,
+    so a provider waiting on its own requests can never starve the pool it
+    depends on. Every cycle carries a deadline; per-request timeouts are
+    clamped to the time left, so a cycle lasts about as long as its slowest
+    request and never longer than ``cycle_deadline``.
+    """
+
+    def __init__(self, max_workers: int = 16, provider_limits: Optional[Dict[str, int]] = None,
+                 cycle_deadline: float = 20.0, default_limit: int = 4):
+        self.cycle_deadline = cycle_deadline
+        self.default_limit = default_limit
+        self.provider_limits = dict(provider_limits or {})
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._semaphores_lock = threading.Lock()
+        self._local = threading.local()
+        self._provider_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='fetch-provider')
+        self._request_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch-request')
+
+    def _limit_for(self, provider: str) -> int:
+        return self.provider_limits.get(provider, self.default_limit)
+
+    def _semaphore(self, provider: str) -> threading.BoundedSemaphore:
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            with self._semaphores_lock:
+                semaphore = self._semaphores.get(provider)
+                if semaphore is None:
+                    semaphore = threading.BoundedSemaphore(self._limit_for(provider))
+                    self._semaphores[provider] = semaphore
+        return semaphore
+
+    def _deadline(self) -> float:
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is None:
+            deadline = time.monotonic() + self.cycle_deadline
+        return deadline
+
+    def remaining(self) -> float:
+        """Seconds left before the current cycle's deadline"""
+        return max(0.0, self._deadline() - time.monotonic())
+
+    def timeout(self, timeout: float) -> float:
+        """Clamp a request timeout to the time left in the current cycle"""
+        return max(0.1, min(timeout, self.remaining()))
+
+    @contextmanager
+    def limit(self, provider: str):
+        """Hold one of the provider's concurrency slots for a single request"""
+        semaphore = self._semaphore(provider)
+        if not semaphore.acquire(timeout=self.remaining()):
+            raise TimeoutError(f"No {provider} request slot free before the cycle deadline")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def _run_with_deadline(self, deadline: float, func: Callable, *args):
+        self._local.deadline = deadline
+        try:
+            return func(*args)
+        finally:
+            self._local.deadline = None
+
+    def map(self, provider: str, func: Callable[[Hashable], Any], items: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Run ``func`` for every item in parallel, at most the provider's limit in flight.
+
+        Returns the results of the calls that finished without raising before
+        the deadline, keyed by item. Failed calls are logged and left out.
+        """
+        deadline = self._deadline()
+        in_flight = threading.BoundedSemaphore(self._limit_for(provider))
+        futures = {}
+        for item in items:
+            if not in_flight.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                logging.warning(f"{provider}: cycle deadline reached before all requests were sent")
+                break
+            future = self._request_pool.submit(self._run_with_deadline, deadline, func, item)
+            future.add_done_callback(lambda _: in_flight.release())
+            futures[future] = item
+
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            logging.warning(f"{provider}: {len(not_done)} requests missed the cycle deadline")
+
+        results = {}
+        for future in done:
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                logging.error(f"Error fetching {item}: {e}")
+        return results
+
+    def run_cycle(self, jobs: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """Run all provider jobs concurrently under one cycle deadline.
+
+        Jobs that raise or miss the deadline are logged and left out of the
+        result, so callers keep whatever they had cached before.
+        """
+        deadline = time.monotonic() + self.cycle_deadline
+        futures = {
+            self._provider_pool.submit(self._run_with_deadline, deadline, job): name
+            for name, job in jobs.items()
+        }
+        done, not_done = wait(futures, timeout=self.cycle_deadline)
+
+        results = {}
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logging.error(f"Error in {name} fetch: {e}")
+        for future in not_done:
+            logging.warning(f"{futures[future]} fetch missed the {self.cycle_deadline:.0f}s cycle deadline")
+        return results
+
+    def shutdown(self):
+        self._provider_pool.shutdown(wait=False, cancel_futures=True)
+        self._request_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,114 @@
+import math
+from typing import Mapping, Optional, Sequence, Tuple
+import numpy as np
+
+# Cache key of the latest RateTable, published with the currency rates
+FX_RATES_KEY = 'fx_rates'
+
+class UnknownCurrency(ValueError):
+    """Raised for currency codes the rate provider does not quote"""
+
+class RateTable:
+    """Units of every quoted currency per US dollar, with all the cross rates between them
+
+    Only the codes and the USD rate vector are pickled into the cache; the
+    N×N cross-rate matrix is built the first time a process needs it, so
+    each process builds it once per fetch (see ``current``).
+    """
+
+    def __init__(self, usd_rates: Mapping[str, float], as_of: float):
+        rates = {code.upper(): float(rate) for code, rate in usd_rates.items()
+                 if isinstance(rate, (int, float)) and math.isfinite(rate) and rate > 0}
+        rates.setdefault('USD', 1.0)
+        # Sorted, so codes can be looked up a whole array at a time with searchsorted
+        self.codes = np.array(sorted(rates))
+        self.usd = np.array([rates[code] for code in self.codes], dtype=np.float64)
+        self.as_of = as_of
+        self._index = None
+        self._cross = None
+
+    @classmethod
+    def from_quotes(cls, quotes: Mapping, as_of: float) -> 'RateTable':
+        """Rebuild the USD vector from ``XXX-INR`` quotes, e.g. persisted ones
+
+        Only covers the currencies those quotes name, until the next fetch
+        brings the provider's full table.
+        """
+        usd_inr = quotes.get('USD-INR')
+        if usd_inr is None or not usd_inr.rate:
+            return cls({}, as_of)
+        rates = {'INR': usd_inr.rate}
+        for symbol, quote in quotes.items():
+            base, _, quote_currency = symbol.partition('-')
+            if quote_currency == 'INR' and quote.rate:
+                rates[base] = usd_inr.rate / quote.rate
+        return cls(rates, as_of)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_index'] = state['_cross'] = None
+        return state
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {code: i for i, code in enumerate(self.codes.tolist())}
+        return self._index
+
+    @property
+    def cross(self) -> np.ndarray:
+        """cross[i, j] is the number of codes[j] one codes[i] buys"""
+        if self._cross is None:
+            self._cross = self.usd[np.newaxis, :] / self.usd[:, np.newaxis]
+        return self._cross
+
+    def position(self, code: str) -> int:
+        try:
+            return self.index[code]
+        except KeyError:
+            raise UnknownCurrency(f"Unknown currency: {code}") from None
+
+    def positions(self, codes: Sequence[str]) -> np.ndarray:
+        """Row/column numbers of many codes at once"""
+        wanted = np.asarray(codes, dtype=str)
+        found = np.minimum(np.searchsorted(self.codes, wanted), len(self.codes) - 1)
+        missing = self.codes[found] != wanted
+        if missing.any():
+            unknown = sorted(set(wanted[missing].tolist()))
+            raise UnknownCurrency(f"Unknown currencies: {', '.join(unknown)}")
+        return found
+
+    def rate(self, from_currency: str, to_currency: str) -> float:
+        return float(self.cross[self.position(from_currency), self.position(to_currency)])
+
+    def convert_many(self, from_codes: Sequence[str], to_codes: Sequence[str],
+                     amounts: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Rates and converted amounts for many pairs in one pass
+
+        The three inputs broadcast against each other, so a single code or
+        amount applies to every row.
+        """
+        rates = self.cross[self.positions(from_codes), self.positions(to_codes)]
+        with np.errstate(over='ignore'):
+            # Overflows come back as inf for the caller to reject
+            return rates, rates * np.asarray(amounts, dtype=np.float64)
+
+# This process's copy of the latest table, with its matrix built
+_current: Optional[RateTable] = None
+
+def current(table: Optional[RateTable]) -> Optional[RateTable]:
+    """Swap a freshly unpickled table for this process's built copy of the same fetch"""
+    global _current
+    if table is None:
+        return None
+    built = _current
+    if built is not None and built.as_of == table.as_of and len(built) == len(table):
+        return built
+    _current = table
+    return table
@@ -0,0 +1,127 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+import pytz
+from sqlalchemy import BigInteger, Integer, cast, func, select
+from sqlalchemy.orm import aliased
+from db import db
+from models import CurrencyRate, StockIndex, CommodityPrice, CryptoPrice, StockData
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# kind -> (model, price column)
+HISTORY_SERIES = {
+    'currency': (CurrencyRate, 'rate'),
+    'index': (StockIndex, 'value'),
+    'commodity': (CommodityPrice, 'price'),
+    'crypto': (CryptoPrice, 'price_inr'),
+    'stock': (StockData, 'price'),
+}
+
+# Bucket widths in seconds that automatic downsampling snaps to
+BUCKET_SIZES = [60, 300, 900, 1800, 3600, 4 * 3600, 86400, 7 * 86400, 30 * 86400]
+BUCKET_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+DEFAULT_MAX_POINTS = 500
+
+def parse_bucket(value: Optional[str]) -> Optional[int]:
+    """Parse a bucket width such as '300', '5m', '1h' or '1d' into seconds"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value[-1] in BUCKET_UNITS:
+        seconds = int(value[:-1]) * BUCKET_UNITS[value[-1]]
+    else:
+        seconds = int(value)
+    if seconds <= 0:
+        raise ValueError(f"Invalid bucket: {value}")
+    return seconds
+
+def parse_time(value: Optional[str], default: datetime) -> datetime:
+    """Parse an ISO timestamp into naive IST wall time, the way rows are stored"""
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(IST).replace(tzinfo=None)
+    return parsed
+
+def choose_bucket(start: datetime, end: datetime, requested: Optional[int], max_points: int) -> int:
+    """Widen the bucket until the range fits in max_points buckets"""
+    span = max(1.0, (end - start).total_seconds())
+    minimum = math.ceil(span / max_points)
+    if requested and requested >= minimum:
+        return requested
+    for size in BUCKET_SIZES:
+        if size >= minimum and size >= (requested or 0):
+            return size
+    return max(minimum, requested or 0)
+
+def _epoch(column):
+    """Seconds since the epoch for a DateTime column, per database dialect"""
+    if db.engine.dialect.name == 'sqlite':
+        return cast(func.strftime('%s', column), Integer)
+    return cast(func.extract('epoch', column), BigInteger)
+
+def query_ohlc(kind: str, symbol: str, start: datetime, end: datetime,
+               bucket: Optional[int] = None, max_points: int = DEFAULT_MAX_POINTS) -> Dict:
+    """Aggregate a symbol's history into at most max_points OHLC buckets in SQL
+
+    High/low come from MIN/MAX per bucket; open/close are the rows with the
+    lowest and highest id in the bucket, since rows are appended in time order.
+    """
+    if kind not in HISTORY_SERIES:
+        raise ValueError(f"Unknown history kind: {kind}")
+    if end <= start:
+        raise ValueError("'from' must be before 'to'")
+    model, value_name = HISTORY_SERIES[kind]
+    size = choose_bucket(start, end, bucket, max_points)
+
+    value = getattr(model, value_name)
+    bucket_index = (_epoch(model.last_updated) // size).label('bucket')
+    buckets = (
+        select(
+            bucket_index,
+            func.min(model.id).label('open_id'),
+            func.max(model.id).label('close_id'),
+            func.max(value).label('high'),
+            func.min(value).label('low')
+        )
+        .where(model.symbol == symbol, model.last_updated >= start, model.last_updated < end)
+        .group_by(bucket_index)
+        .subquery()
+    )
+    open_row = aliased(model)
+    close_row = aliased(model)
+    statement = (
+        select(
+            buckets.c.bucket,
+            getattr(open_row, value_name),
+            buckets.c.high,
+            buckets.c.low,
+            getattr(close_row, value_name)
+        )
+        .join(open_row, open_row.id == buckets.c.open_id)
+        .join(close_row, close_row.id == buckets.c.close_id)
+        .order_by(buckets.c.bucket)
+    )
+    result = db.session.execute(statement).all()
+
+    return {
+        'kind': kind,
+        'symbol': symbol,
+        'bucket': size,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        # Buckets count seconds of IST wall-clock time, the way timestamps are stored
+        'time': [IST.localize(datetime.fromtimestamp(row[0] * size, timezone.utc).replace(tzinfo=None)).isoformat()
+                 for row in result],
+        'open': [row[1] for row in result],
+        'high': [row[2] for row in result],
+        'low': [row[3] for row in result],
+        'close': [row[4] for row in result],
+    }
+
+def default_range(now: Optional[datetime] = None):
+    """The last 24 hours in IST wall time"""
+    end = now or datetime.now(IST).replace(tzinfo=None)
+    return end - timedelta(days=1), end
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """An upstream response body with its validators"""
+    url: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    # Unix time the body was last fetched or revalidated
+    fetched_at: float
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.fetched_at
+
+    def to_bytes(self) -> bytes:
+        """One line of JSON metadata followed by the raw body"""
+        meta = {'url': self.url, 'etag': self.etag, 'last_modified': self.last_modified, 'fetched_at': self.fetched_at}
+        return json.dumps(meta).encode('utf-8') + b'\n' + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CachedResponse':
+        header, _, body = data.partition(b'\n')
+        meta = json.loads(header)
+        return cls(meta['url'], body, meta['etag'], meta['last_modified'], float(meta['fetched_at']))
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional request that revalidates this response"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+def cache_key(url: str, params: Optional[Dict] = None) -> str:
+    """Stable file name for a URL and its query parameters"""
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.blake2b(f'{url}?{query}'.encode('utf-8'), digest_size=16).hexdigest()
+
+class HttpCache:
+    """Bounded on-disk store of upstream responses, evicted least recently used first
+
+    Each response is one file, written atomically, so the store survives
+    restarts and whatever is left after a crash is still readable. Files
+    hold JSON metadata and the raw body, never anything that is executed
+    when read. File access times are kept current, so recency also
+    survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> file size, least recently used first
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load_index(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_atime, entry.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def get(self, url: str, params: Optional[Dict] = None) -> Optional[CachedResponse]:
+        key = cache_key(url, params)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), 'rb') as f:
+                cached = CachedResponse.from_bytes(f.read())
+            os.utime(self._path(key))
+            return cached
+        except Exception as e:
+            logging.error(f"Error reading cached response for {url}: {e}")
+            self._discard(key)
+            return None
+
+    def store(self, url: str, params: Optional[Dict], body: bytes, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> CachedResponse:
+        cached = CachedResponse(url, body, etag, last_modified, time.time())
+        self._write(cache_key(url, params), cached)
+        return cached
+
+    def refresh(self, cached: CachedResponse, params: Optional[Dict] = None) -> CachedResponse:
+        """Record that the upstream confirmed a cached response is still current"""
+        refreshed = replace(cached, fetched_at=time.time())
+        self._write(cache_key(cached.url, params), refreshed)
+        return refreshed
+
+    def _write(self, key: str, cached: CachedResponse):
+        data = cached.to_bytes()
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.response-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            os.unlink(tmp_path)
+            logging.error(f"Error caching response for {cached.url}: {e}")
+            return
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            evicted = []
+            while self._size > self.max_bytes:
+                old_key, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove_file(old_key)
+
+    def _discard(self, key: str):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+        self._remove_file(key)
+
+    def _remove_file(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,41 @@
+import fcntl
+import logging
+import os
+
+class LeaderLock:
+    """Non-blocking inter-process lock electing the worker that runs the fetch jobs
+
+    The lock is an flock on a shared file, so the kernel releases it when the
+    holding process exits and another worker can take over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free; never blocks"""
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        logging.info(f"Process {os.getpid()} is the data fetch leader")
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
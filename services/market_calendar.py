@@ -0,0 +1,62 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import pytz
+from config import Config
+
+IST = pytz.timezone('Asia/Kolkata')
+
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+
+def _holidays():
+    return {date.fromisoformat(day) for day in Config.NSE_HOLIDAYS}
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in _holidays()
+
+def is_market_open(now: Optional[datetime] = None, grace: timedelta = timedelta(0)) -> bool:
+    """Whether NSE is in its regular session, optionally extended past the close"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    if not is_trading_day(now.date()):
+        return False
+    opens = IST.localize(datetime.combine(now.date(), MARKET_OPEN))
+    closes = IST.localize(datetime.combine(now.date(), MARKET_CLOSE)) + grace
+    return opens <= now <= closes
+
+def next_market_open(now: Optional[datetime] = None) -> datetime:
+    """Start of the next regular session after ``now``"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    day = now.date()
+    while True:
+        opens = IST.localize(datetime.combine(day, MARKET_OPEN))
+        if opens > now and is_trading_day(day):
+            return opens
+        day += timedelta(days=1)
+
+class SessionGate:
+    """Lets market-hours refreshes run during the session, plus one per provider after each close
+
+    The post-close run may happen any time within ``grace`` of the close and
+    picks up the closing prices.
+    """
+
+    def __init__(self, grace: timedelta):
+        self.grace = grace
+        # provider -> the trading day its post-close run was made for
+        self._closing_runs = {}
+
+    def due(self, key: str, when: Optional[datetime] = None) -> bool:
+        """Whether a refresh of ``key`` at ``when`` would run"""
+        when = (when or datetime.now(IST)).astimezone(IST)
+        if is_market_open(when):
+            return True
+        return is_market_open(when, self.grace) and self._closing_runs.get(key) != when.date()
+
+    def claim(self, key: str, now: Optional[datetime] = None) -> bool:
+        """Whether to refresh ``key`` now, using up today's post-close run if it is one"""
+        now = (now or datetime.now(IST)).astimezone(IST)
+        if not self.due(key, now):
+            return False
+        if not is_market_open(now):
+            self._closing_runs[key] = now.date()
+        return True
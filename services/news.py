@@ -0,0 +1,198 @@
+import base64
+import hashlib
+import logging
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+import pytz
+from sqlalchemy import and_, column, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+from config import Config
+from db import db
+from models import NewsItem, StockData
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# The FTS5 table, for joining in queries; its hidden column of the table's name takes MATCH
+news_fts = table('news_fts', column('rowid'), column('news_fts'))
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# External-content FTS5 index over news_items, kept in step by triggers.
+# Rows without a url_hash are duplicates from before deduplication and stay out.
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5("
+    "title, description, content='news_items', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news_items WHEN new.url_hash IS NOT NULL BEGIN "
+    "INSERT INTO news_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news_items WHEN old.url_hash IS NOT NULL BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE ON news_items BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, description) "
+    "SELECT 'delete', old.id, old.title, old.description WHERE old.url_hash IS NOT NULL; "
+    "INSERT INTO news_fts(rowid, title, description) "
+    "SELECT new.id, new.title, new.description WHERE new.url_hash IS NOT NULL; END",
+]
+
+def url_hash(url: str, title: str = '') -> str:
+    """Key that identifies an article however its URL is decorated
+
+    Scheme, host case, the fragment and a trailing slash are ignored; an
+    article without a URL is keyed by its title.
+    """
+    if url:
+        parts = urlsplit(url.strip())
+        key = urlunsplit(('', parts.netloc.lower().removeprefix('www.'), parts.path.rstrip('/'), parts.query, ''))
+    else:
+        key = 'title:' + ' '.join(title.lower().split())
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def dedupe_rows(rows: List[Dict]) -> List[Dict]:
+    """Add each row's url_hash, keeping the first of any repeats in the batch"""
+    unique = {}
+    for row in rows:
+        row['url_hash'] = url_hash(row['url'], row['title'])
+        unique.setdefault(row['url_hash'], row)
+    return list(unique.values())
+
+def insert_new_articles():
+    """An INSERT for news rows that skips articles already stored"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return db.insert(NewsItem).prefix_with('IGNORE')
+    return insert(NewsItem).on_conflict_do_nothing(index_elements=['url_hash'])
+
+# Set once init_news_search has the FTS5 index in place
+_fts_ready = False
+
+def _fts_available() -> bool:
+    return _fts_ready
+
+def _backfill_url_hashes():
+    """Key rows stored before deduplication; later repeats keep a NULL url_hash"""
+    rows = db.session.execute(
+        select(NewsItem.id, NewsItem.url, NewsItem.title).where(NewsItem.url_hash.is_(None)).order_by(NewsItem.id)
+    ).all()
+    if not rows:
+        return
+    seen = set(db.session.execute(select(NewsItem.url_hash).where(NewsItem.url_hash.is_not(None))).scalars())
+    updates = []
+    for row in rows:
+        key = url_hash(row.url, row.title)
+        if key not in seen:
+            seen.add(key)
+            updates.append({'id': row.id, 'url_hash': key})
+    if updates:
+        db.session.execute(db.update(NewsItem), updates)
+    db.session.commit()
+    logging.info(f"Keyed {len(updates)} stored news items; {len(rows) - len(updates)} repeats left out of search")
+
+def init_news_search(app):
+    """Key existing articles and create the full-text index, once per database"""
+    global _fts_ready
+    with app.app_context():
+        try:
+            _backfill_url_hashes()
+            if db.engine.dialect.name != 'sqlite':
+                return
+            connection = db.session.connection()
+            # Without its triggers (a new index, news_items was recreated, or an index from
+            # before the update trigger) the index is out of step
+            stale = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'news_fts_update'")).first() is None
+            for statement in FTS_SCHEMA:
+                connection.execute(text(statement))
+            if stale:
+                connection.execute(text("INSERT INTO news_fts(news_fts) VALUES ('delete-all')"))
+                connection.execute(text(
+                    "INSERT INTO news_fts(rowid, title, description) "
+                    "SELECT id, title, description FROM news_items WHERE url_hash IS NOT NULL"))
+            db.session.commit()
+            _fts_ready = True
+        except OperationalError as e:
+            # e.g. an SQLite build without FTS5; search falls back to LIKE
+            db.session.rollback()
+            logging.warning(f"News full-text index unavailable: {e}")
+        finally:
+            db.session.remove()
+
+def fts_query(q: str) -> str:
+    """Turn free text into an FTS5 query of quoted terms, so user input cannot be FTS syntax
+
+    A trailing * on a word makes it a prefix search.
+    """
+    terms = re.findall(r'[\w.&-]+\*?', q)
+    return ' '.join(f'"{term.rstrip("*")}"*' if term.endswith('*') else f'"{term}"' for term in terms)
+
+def symbol_terms(symbol: str) -> List[str]:
+    """Words an article about a symbol would use: its ticker, index name and company name"""
+    symbol = symbol.strip().upper()
+    terms = [symbol.split('.')[0].lstrip('^')]
+    terms += [name for name, index_symbol in Config.STOCK_INDICES.items() if index_symbol == symbol]
+    name = db.session.execute(
+        select(StockData.name).where(StockData.symbol == symbol).order_by(StockData.last_updated.desc()).limit(1)
+    ).scalar()
+    if name:
+        terms.append(name)
+    return [term for term in dict.fromkeys(terms) if term]
+
+def encode_cursor(published_at: datetime, item_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{published_at.isoformat()}|{item_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        published_at, item_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.fromisoformat(published_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor") from None
+
+def search_news(q: str = '', symbol: str = '', limit: int = DEFAULT_PAGE_SIZE,
+                cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Newest matching articles first, one page at a time
+
+    Pages continue from the (published_at, id) of the previous page's last
+    row, so each page is an index range scan however deep it is.
+    """
+    query = select(NewsItem.id, NewsItem.title, NewsItem.description, NewsItem.url, NewsItem.source,
+                   NewsItem.published_at).where(NewsItem.url_hash.is_not(None))
+    words = fts_query(q)
+    names = symbol_terms(symbol) if symbol else []
+    if _fts_available():
+        match = ' AND '.join(part for part in [
+            f'({words})' if words else '',
+            '(' + ' OR '.join('"{}"'.format(name.replace('"', '""')) for name in names) + ')' if names else ''
+        ] if part)
+        if match:
+            query = query.join(news_fts, news_fts.c.rowid == NewsItem.id).where(news_fts.c.news_fts.op('MATCH')(match))
+    else:
+        for word in re.findall(r'\w+', q):
+            pattern = f'%{word}%'
+            query = query.where(or_(NewsItem.title.ilike(pattern), NewsItem.description.ilike(pattern)))
+        if names:
+            query = query.where(or_(*[NewsItem.title.ilike(f'%{name}%') for name in names],
+                                    *[NewsItem.description.ilike(f'%{name}%') for name in names]))
+    if cursor:
+        published_at, item_id = decode_cursor(cursor)
+        query = query.where(or_(NewsItem.published_at < published_at,
+                                and_(NewsItem.published_at == published_at, NewsItem.id < item_id)))
+    rows = db.session.execute(
+        query.order_by(NewsItem.published_at.desc(), NewsItem.id.desc()).limit(limit + 1)
+    ).all()
+
+    next_cursor = encode_cursor(rows[limit - 1].published_at, rows[limit - 1].id) if len(rows) > limit else None
+    return [{
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'url': row.url,
+        'source': row.source,
+        'published_at': (IST.localize(row.published_at) if row.published_at.tzinfo is None
+                         else row.published_at).isoformat()
+    } for row in rows[:limit]], next_cursor
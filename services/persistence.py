@@ -0,0 +1,135 @@
+import logging
+from dataclasses import fields
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+import pytz
+from sqlalchemy import func, select
+from db import db
+from models import CurrencyRate, StockIndex, CommodityPrice, CryptoPrice, NewsItem, StockData
+from records import CurrencyQuote, IndexQuote, CommodityQuote, CryptoQuote, NewsArticle, StockQuote
+from services.news import dedupe_rows, insert_new_articles
+from services.ranking import rank_gainers_losers
+
+IST = pytz.timezone('Asia/Kolkata')
+
+def _rows(model, items: Iterable, current_time: datetime) -> List[Dict]:
+    """Turn fetched quote records into plain rows for the model's bulk insert"""
+    columns = [column.name for column in model.__table__.columns if column.name != 'id']
+    rows = []
+    for item in items:
+        # Columns a record doesn't carry, such as a news url_hash, are filled in later
+        row = {column: getattr(item, column, None) for column in columns}
+        if 'last_updated' in row and row['last_updated'] is None:
+            row['last_updated'] = current_time
+        rows.append(row)
+    return rows
+
+def _cycle_rows(results: Dict, current_time: datetime) -> Dict:
+    """Map a fetch cycle's cache entries onto their tables"""
+    tables = {}
+    if results.get('currency_rates'):
+        tables[CurrencyRate] = _rows(CurrencyRate, results['currency_rates'].values(), current_time)
+    if results.get('stock_indices'):
+        tables[StockIndex] = _rows(StockIndex, results['stock_indices'].values(), current_time)
+    if results.get('commodity_prices'):
+        tables[CommodityPrice] = _rows(CommodityPrice, results['commodity_prices'].values(), current_time)
+    if results.get('crypto_prices'):
+        tables[CryptoPrice] = _rows(CryptoPrice, results['crypto_prices'].values(), current_time)
+    if results.get('financial_news'):
+        tables[NewsItem] = dedupe_rows(_rows(NewsItem, results['financial_news'], current_time))
+    if results.get('gainers_losers'):
+        stocks = results['gainers_losers'].get('stocks', [])
+        tables[StockData] = _rows(StockData, stocks, current_time)
+    return {model: rows for model, rows in tables.items() if rows}
+
+def persist_snapshot(app, results: Dict) -> Dict[str, int]:
+    """Append one fetch cycle to the time-series tables
+
+    Each table gets a single executemany INSERT, all in one transaction;
+    news articles already stored are skipped. Returns the number of rows
+    written per table.
+    """
+    tables = _cycle_rows(results, datetime.now(IST))
+    if not tables:
+        return {}
+
+    written = {}
+    with app.app_context():
+        try:
+            for model, rows in tables.items():
+                if model is NewsItem:
+                    result = db.session.connection().execute(insert_new_articles(), rows)
+                    written[model.__tablename__] = result.rowcount if result.rowcount >= 0 else len(rows)
+                else:
+                    db.session.execute(db.insert(model), rows)
+                    written[model.__tablename__] = len(rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error persisting fetch cycle: {e}")
+            return {}
+        finally:
+            db.session.remove()
+
+    return written
+
+# Cache key -> (model, record type, key of each record in the cached dict)
+LATEST_QUOTES = {
+    'currency_rates': (CurrencyRate, CurrencyQuote, 'symbol'),
+    'stock_indices': (StockIndex, IndexQuote, 'name'),
+    'commodity_prices': (CommodityPrice, CommodityQuote, 'symbol'),
+    'crypto_prices': (CryptoPrice, CryptoQuote, 'symbol'),
+}
+NEWS_LIMIT = 10
+
+def _record(record_type, row):
+    """Rebuild a quote record from a stored row, with the IST zone the fetchers attach"""
+    values = {field.name: getattr(row, field.name) for field in fields(record_type)}
+    for name in ('last_updated', 'published_at'):
+        if values.get(name) is not None and values[name].tzinfo is None:
+            values[name] = IST.localize(values[name])
+    return record_type(**values)
+
+def _latest_rows(model):
+    """The most recent row of every symbol"""
+    latest = select(func.max(model.id)).group_by(model.symbol)
+    return db.session.execute(select(model).where(model.id.in_(latest))).scalars().all()
+
+def load_latest_snapshot(app) -> Tuple[Dict, Dict[str, float]]:
+    """Rebuild the last persisted value of every cache key
+
+    Returns the results in the shape the fetchers produce, plus the Unix
+    time of the newest row behind each key.
+    """
+    results = {}
+    with app.app_context():
+        try:
+            for key, (model, record_type, record_key) in LATEST_QUOTES.items():
+                records = [_record(record_type, row) for row in _latest_rows(model)]
+                if records:
+                    results[key] = {getattr(record, record_key): record for record in records}
+            stocks = [_record(StockQuote, row) for row in _latest_rows(StockData)]
+            if stocks:
+                results['gainers_losers'] = rank_gainers_losers(stocks)
+            news = db.session.execute(
+                select(NewsItem).where(NewsItem.url_hash.is_not(None))
+                .order_by(NewsItem.published_at.desc()).limit(NEWS_LIMIT)
+            ).scalars().all()
+            if news:
+                results['financial_news'] = [_record(NewsArticle, row) for row in news]
+        except Exception as e:
+            logging.error(f"Error loading persisted snapshot: {e}")
+            return {}, {}
+        finally:
+            db.session.remove()
+
+    as_of = {}
+    for key, value in results.items():
+        if key == 'financial_news':
+            times = [item.published_at for item in value]
+        elif key == 'gainers_losers':
+            times = [stock.last_updated for stock in value['stocks']]
+        else:
+            times = [record.last_updated for record in value.values()]
+        as_of[key] = max(times).timestamp()
+    return results, as_of
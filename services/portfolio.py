@@ -0,0 +1,281 @@
+import hashlib
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from db import db
+from models import Holding, Portfolio
+from services.fx import RateTable
+from services.publisher import GENERATION_KEY
+from services.ranking import RankingIndex
+
+# Cache key of the latest QuoteBook, published before each generation
+QUOTE_BOOK_KEY = 'portfolio_quotes'
+
+# Asset class -> the provider cache key its prices come from
+ASSET_CLASSES = {
+    'equity': 'gainers_losers',
+    'crypto': 'crypto_prices',
+    'commodity': 'commodity_prices',
+    'cash': 'currency_rates',
+}
+
+def quote_key(asset_class: str, symbol: str) -> str:
+    return f'{asset_class}:{symbol}'
+
+class QuoteBook:
+    """INR price and day change of every holdable instrument, sorted for vectorized lookups
+
+    Instruments are keyed ``asset_class:symbol``. ``versions`` fingerprints
+    each asset class's prices, so a valuation only has to be redone when a
+    class it holds has actually moved.
+    """
+
+    def __init__(self, classes: Mapping[str, Mapping[str, Tuple[float, float]]]):
+        quotes = {quote_key(asset_class, symbol): value
+                  for asset_class, prices in classes.items() for symbol, value in prices.items()}
+        self.keys = np.array(sorted(quotes), dtype=str)
+        values = np.array([quotes[key] for key in self.keys.tolist()], dtype=np.float64).reshape(-1, 2)
+        self.prices = values[:, 0]
+        self.changes = values[:, 1]
+        self.versions = {asset_class: _fingerprint(prices) for asset_class, prices in classes.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Prices and day changes of many instruments at once, NaN for those not quoted"""
+        if not len(self.keys):
+            missing = np.full(len(keys), np.nan)
+            return missing, missing.copy()
+        found = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        quoted = self.keys[found] == keys
+        return np.where(quoted, self.prices[found], np.nan), np.where(quoted, self.changes[found], np.nan)
+
+def _fingerprint(prices: Mapping[str, Tuple[float, float]]) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for symbol in sorted(prices):
+        digest.update(b'%s=%r,%r;' % (symbol.encode(), *prices[symbol]))
+    return digest.hexdigest()
+
+def equity_prices(ranking: RankingIndex) -> Dict[str, Tuple[float, float]]:
+    return {quote.symbol: (quote.price, quote.change_percent) for quote in ranking.quotes if quote is not None}
+
+def quote_prices(quotes: Mapping, field: str) -> Dict[str, Tuple[float, float]]:
+    return {quote.symbol: (getattr(quote, field), quote.change_percent) for quote in quotes.values()}
+
+def cash_prices(table: RateTable, currency_quotes: Mapping) -> Dict[str, Tuple[float, float]]:
+    """INR per unit of every currency the rate table covers
+
+    Day changes come from the ``XXX-INR`` quotes; other currencies count as
+    unchanged.
+    """
+    if 'INR' not in table:
+        return {}
+    inr = table.usd[table.position('INR')] / table.usd
+    prices = {}
+    for code, price in zip(table.codes.tolist(), inr.tolist()):
+        quote = currency_quotes.get(f'{code}-INR')
+        prices[code] = (price, quote.change_percent if quote is not None else 0.0)
+    prices['INR'] = (1.0, 0.0)
+    return prices
+
+class QuoteBookBuilder:
+    """Keeps each asset class's latest prices and rebuilds the book when a provider refreshes"""
+
+    def __init__(self):
+        self._classes: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        # Providers refresh on their own schedules and may finish together
+        self._lock = threading.Lock()
+
+    def update(self, results: Dict, ranking: Optional[RankingIndex] = None,
+               rates: Optional[RateTable] = None) -> Optional[QuoteBook]:
+        """Take the prices of the asset classes in a fetch cycle's results
+
+        Returns the new book, or None when the results held none of them.
+        """
+        classes = {}
+        if ranking is not None and 'gainers_losers' in results:
+            classes['equity'] = equity_prices(ranking)
+        if 'crypto_prices' in results:
+            classes['crypto'] = quote_prices(results['crypto_prices'], 'price_inr')
+        if 'commodity_prices' in results:
+            classes['commodity'] = quote_prices(results['commodity_prices'], 'price')
+        if rates is not None and 'currency_rates' in results:
+            classes['cash'] = cash_prices(rates, results['currency_rates'])
+        if not classes:
+            return None
+        with self._lock:
+            self._classes.update(classes)
+            return QuoteBook(self._classes)
+
+# (data generation, book) of the last book this process read
+_latest: Tuple[Optional[int], Optional[QuoteBook]] = (None, None)
+
+def latest_quote_book(cache) -> Optional[QuoteBook]:
+    """The published quote book, read from the cache again only when the data generation moves on"""
+    global _latest
+    generation = cache.get(GENERATION_KEY) or 0
+    if _latest[0] != generation:
+        _latest = (generation, cache.get(QUOTE_BOOK_KEY))
+    return _latest[1]
+
+def parse_holding(data) -> Dict:
+    """Validate one holding from a request body into Holding columns"""
+    if not isinstance(data, dict):
+        raise ValueError("A holding must be an object")
+    asset_class = str(data.get('asset_class') or '').lower()
+    if asset_class not in ASSET_CLASSES:
+        raise ValueError(f"Asset class must be one of {', '.join(ASSET_CLASSES)}")
+    symbol = str(data.get('symbol') or '').strip().upper()
+    if not symbol or len(symbol) > 32:
+        raise ValueError("A holding needs a symbol of up to 32 characters")
+    try:
+        quantity = float(data.get('quantity'))
+    except (TypeError, ValueError):
+        raise ValueError("A holding needs a numeric quantity") from None
+    if not math.isfinite(quantity) or quantity < 0:
+        raise ValueError("Holding quantities must be zero or more")
+    return {'asset_class': asset_class, 'symbol': symbol, 'quantity': quantity}
+
+def serialize_portfolio(portfolio: Portfolio, holdings: Iterable[Holding]) -> Dict:
+    return {
+        'id': portfolio.id,
+        'name': portfolio.name,
+        'owner': portfolio.owner,
+        'created_at': portfolio.created_at.isoformat() if portfolio.created_at else None,
+        'holdings': [{
+            'asset_class': holding.asset_class,
+            'symbol': holding.symbol,
+            'quantity': holding.quantity
+        } for holding in holdings]
+    }
+
+def get_portfolio(portfolio_id: int) -> Optional[Tuple[Portfolio, List[Holding]]]:
+    portfolio = db.session.get(Portfolio, portfolio_id)
+    if portfolio is None:
+        return None
+    holdings = db.session.execute(
+        select(Holding).where(Holding.portfolio_id == portfolio_id).order_by(Holding.id)).scalars().all()
+    return portfolio, holdings
+
+def create_portfolio(name: str, owner: Optional[str], holdings: List[Dict]) -> Tuple[Portfolio, List[Holding]]:
+    portfolio = Portfolio(name=name, owner=owner, revision=0)
+    db.session.add(portfolio)
+    db.session.flush()
+    rows = [Holding(portfolio_id=portfolio.id, **holding) for holding in holdings]
+    db.session.add_all(rows)
+    db.session.commit()
+    return portfolio, rows
+
+def replace_holdings(portfolio_id: int, holdings: List[Dict]) -> Optional[Tuple[Portfolio, List[Holding]]]:
+    """Swap a portfolio's holdings for new ones and bump its revision"""
+    portfolio = db.session.get(Portfolio, portfolio_id)
+    if portfolio is None:
+        return None
+    db.session.execute(db.delete(Holding).where(Holding.portfolio_id == portfolio_id))
+    rows = [Holding(portfolio_id=portfolio_id, **holding) for holding in holdings]
+    db.session.add_all(rows)
+    portfolio.revision = Portfolio.revision + 1
+    db.session.commit()
+    return portfolio, rows
+
+@dataclass(frozen=True)
+class Holdings:
+    """A portfolio's holdings as columns"""
+    asset_classes: np.ndarray
+    symbols: np.ndarray
+    quantities: np.ndarray
+    # quote_key of each holding, for QuoteBook.lookup
+    keys: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, float]]) -> 'Holdings':
+        rows = list(rows)
+        asset_classes = np.array([row[0] for row in rows], dtype=str)
+        symbols = np.array([row[1] for row in rows], dtype=str)
+        quantities = np.array([row[2] for row in rows], dtype=np.float64)
+        keys = np.char.add(np.char.add(asset_classes, ':'), symbols) if rows else symbols
+        return cls(asset_classes, symbols, quantities, keys)
+
+def value_holdings(holdings: Holdings, book: Optional[QuoteBook]) -> Dict:
+    """Market value, day P&L and allocation in INR, for all holdings in one vectorized pass
+
+    Day P&L is what the holdings gained against each instrument's previous
+    close; holdings without a quote are valued at zero and listed under
+    ``unpriced``.
+    """
+    if book is not None:
+        prices, changes = book.lookup(holdings.keys)
+    else:
+        prices = changes = np.full(len(holdings.keys), np.nan)
+    quoted = ~np.isnan(prices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(quoted, holdings.quantities * prices, 0.0)
+        previous = values / (1 + changes / 100)
+    previous = np.where(quoted & np.isfinite(previous), previous, values)
+    day_pnl = values - previous
+
+    total = float(values.sum())
+    previous_total = float(previous.sum())
+    weights = values / total if total else np.zeros_like(values)
+    classes, class_positions = np.unique(holdings.asset_classes, return_inverse=True)
+    class_values = np.bincount(class_positions, weights=values, minlength=len(classes))
+    class_pnl = np.bincount(class_positions, weights=day_pnl, minlength=len(classes))
+
+    return {
+        'currency': 'INR',
+        'market_value': total,
+        'day_pnl': total - previous_total,
+        'day_pnl_percent': (total - previous_total) / previous_total * 100 if previous_total else 0.0,
+        'allocation': {asset_class: {
+            'market_value': value,
+            'day_pnl': pnl,
+            'weight': value / total if total else 0.0
+        } for asset_class, value, pnl in zip(classes.tolist(), class_values.tolist(), class_pnl.tolist())},
+        'holdings': [{
+            'asset_class': asset_class,
+            'symbol': symbol,
+            'quantity': quantity,
+            'price': price if is_quoted else None,
+            'change_percent': change if is_quoted else None,
+            'market_value': value,
+            'day_pnl': pnl,
+            'weight': weight
+        } for asset_class, symbol, quantity, price, change, is_quoted, value, pnl, weight in zip(
+            holdings.asset_classes.tolist(), holdings.symbols.tolist(), holdings.quantities.tolist(),
+            prices.tolist(), changes.tolist(), quoted.tolist(), values.tolist(), day_pnl.tolist(), weights.tolist())],
+        'unpriced': holdings.keys[~quoted].tolist()
+    }
+
+# portfolio id -> (revision, holdings, (revision, class versions), valuation)
+_valuations: Dict[int, Tuple[int, Holdings, Tuple, Dict]] = {}
+
+def portfolio_valuation(portfolio_id: int, book: Optional[QuoteBook]) -> Optional[Dict]:
+    """A portfolio's valuation, memoized until its holdings or the prices it holds change
+
+    One primary-key read per call checks the holdings' revision; the
+    holdings themselves are only reloaded when it moves.
+    """
+    revision = db.session.execute(select(Portfolio.revision).where(Portfolio.id == portfolio_id)).scalar()
+    if revision is None:
+        return None
+    memo = _valuations.get(portfolio_id)
+    if memo is not None and memo[0] == revision:
+        holdings = memo[1]
+    else:
+        holdings = Holdings.from_rows(db.session.execute(
+            select(Holding.asset_class, Holding.symbol, Holding.quantity)
+            .where(Holding.portfolio_id == portfolio_id).order_by(Holding.id)).all())
+    versions = book.versions if book is not None else {}
+    key = (revision, tuple(versions.get(asset_class) for asset_class in np.unique(holdings.asset_classes).tolist()))
+    if memo is not None and memo[2] == key:
+        return memo[3]
+
+    valuation = dict(value_holdings(holdings, book), portfolio_id=portfolio_id)
+    if len(_valuations) >= 1024:
+        _valuations.clear()
+    _valuations[portfolio_id] = (revision, holdings, key, valuation)
+    return valuation
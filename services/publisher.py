@@ -0,0 +1,352 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
+import pytz
+from services.columnar import COLUMN_SECTIONS, build_columns, write_snapshot
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+IST = pytz.timezone('Asia/Kolkata')
+
+def dumps(obj) -> bytes:
+    """Encode JSON to bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def serialize_currency_rates(rates) -> Dict:
+    return {symbol: {
+        'symbol': rate.symbol,
+        'rate': rate.rate,
+        'change_percent': rate.change_percent,
+        'last_updated': rate.last_updated.isoformat()
+    } for symbol, rate in rates.items()}
+
+def serialize_stock_indices(indices) -> Dict:
+    return {name: {
+        'name': index.name,
+        'symbol': index.symbol,
+        'value': index.value,
+        'change': index.change,
+        'change_percent': index.change_percent,
+        'last_updated': index.last_updated.isoformat()
+    } for name, index in indices.items()}
+
+def serialize_commodity_prices(commodities) -> Dict:
+    return {symbol: {
+        'name': commodity.name,
+        'symbol': commodity.symbol,
+        'price': commodity.price,
+        'change_percent': commodity.change_percent,
+        'unit': commodity.unit,
+        'last_updated': commodity.last_updated.isoformat()
+    } for symbol, commodity in commodities.items()}
+
+def serialize_crypto_prices(cryptos) -> Dict:
+    return {symbol: {
+        'symbol': crypto.symbol,
+        'name': crypto.name,
+        'price_inr': crypto.price_inr,
+        'change_percent': crypto.change_percent,
+        'last_updated': crypto.last_updated.isoformat()
+    } for symbol, crypto in cryptos.items()}
+
+def serialize_financial_news(news) -> list:
+    return [{
+        'title': item.title,
+        'description': item.description,
+        'url': item.url,
+        'source': item.source,
+        'published_at': item.published_at.isoformat()
+    } for item in news]
+
+def _serialize_stock(stock) -> Dict:
+    return {
+        'symbol': stock.symbol,
+        'name': stock.name,
+        'price': stock.price,
+        'change': stock.change,
+        'change_percent': stock.change_percent
+    }
+
+def serialize_gainers_losers(data) -> Dict:
+    return {
+        'gainers': [_serialize_stock(stock) for stock in data.get('gainers', [])],
+        'losers': [_serialize_stock(stock) for stock in data.get('losers', [])]
+    }
+
+# API section -> (cache key of the fetched data, serializer, value when nothing is cached)
+SECTIONS = {
+    'currency-rates': ('currency_rates', serialize_currency_rates, {}),
+    'stock-indices': ('stock_indices', serialize_stock_indices, {}),
+    'commodity-prices': ('commodity_prices', serialize_commodity_prices, {}),
+    'crypto-prices': ('crypto_prices', serialize_crypto_prices, {}),
+    'financial-news': ('financial_news', serialize_financial_news, []),
+    'gainers-losers': ('gainers_losers', serialize_gainers_losers, {'gainers': [], 'losers': []}),
+}
+
+GENERATION_KEY = 'payload:generation'
+
+@dataclass(frozen=True)
+class Payload:
+    """A pre-rendered response body with its validators"""
+    body: bytes
+    etag: str
+    generation: int
+    # Unix time of the next scheduled fetch; clients may reuse the body until then
+    expires_at: float
+    # Unix time the data was fetched, and whether it predates this process
+    as_of: float = 0.0
+    stale: bool = True
+
+def make_etag(data: bytes, stale: bool) -> str:
+    """Content-hash ETag of the data, so unchanged data keeps its ETag across cycles
+
+    The ``as_of`` marker is left out: revalidating clients keep the body they
+    have when only the fetch time moved on.
+    """
+    return hashlib.blake2b(data + (b'\0stale' if stale else b''), digest_size=8).hexdigest()
+
+def payload_key(section: str) -> str:
+    return f'payload:{section}'
+
+def render_data(section: str, value) -> bytes:
+    """Render the ``data`` member of a section's response"""
+    _, serializer, _ = SECTIONS[section]
+    return dumps(serializer(value))
+
+def format_as_of(as_of: float) -> Optional[str]:
+    return datetime.fromtimestamp(as_of, IST).isoformat() if as_of else None
+
+def envelope(data: bytes, as_of: float = 0.0, stale: bool = True) -> bytes:
+    """Wrap rendered data in the standard success envelope without re-encoding it
+
+    ``as_of`` is when the data was fetched (null before the first fetch) and
+    ``stale`` is true until this process has fetched it itself.
+    """
+    return (b'{"success":true,"data":' + data + b',"as_of":' + dumps(format_as_of(as_of))
+            + b',"stale":' + (b'true' if stale else b'false') + b'}')
+
+def make_payload(data: bytes, generation: int, expires_at: float,
+                 as_of: float = 0.0, stale: bool = True) -> Payload:
+    """Wrap rendered section data in its response envelope and validators"""
+    return Payload(envelope(data, as_of, stale), make_etag(data, stale), generation, expires_at, as_of, stale)
+
+def render_payload(section: str, value) -> bytes:
+    """Render the complete API response body for a section"""
+    return envelope(render_data(section, value))
+
+@lru_cache(maxsize=None)
+def empty_data(section: str) -> bytes:
+    _, _, empty = SECTIONS[section]
+    return render_data(section, empty)
+
+@lru_cache(maxsize=None)
+def empty_payload(section: str) -> Payload:
+    return make_payload(empty_data(section), 0, 0.0)
+
+SNAPSHOT_KEY = 'payload:snapshot'
+# (generation, encoded delta) of the latest publish, relayed by follower workers
+DELTA_KEY = 'payload:delta'
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Every section of one generation, published under a single cache key"""
+    # section -> rendered data, used to assemble ?sections= subsets
+    sections: Dict[str, bytes]
+    payload: Payload
+    # Content-Encoding -> compressed payload body
+    encoded: Dict[str, bytes]
+
+def render_sections(sections: Dict[str, bytes]) -> bytes:
+    """Join already rendered section data into one ``data`` object"""
+    return b'{' + b','.join(dumps(section) + b':' + data for section, data in sections.items()) + b'}'
+
+def compress(body: bytes) -> Dict[str, bytes]:
+    """Pre-compress a body for every supported Content-Encoding"""
+    encoded = {'gzip': gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body)
+    return encoded
+
+def make_snapshot(sections: Dict[str, bytes], generation: int, expires_at: float,
+                  as_of: float = 0.0, stale: bool = True) -> Snapshot:
+    """Build the aggregated response; ``as_of``/``stale`` describe its oldest section"""
+    payload = make_payload(render_sections(sections), generation, expires_at, as_of, stale)
+    return Snapshot(sections, payload, compress(payload.body))
+
+@lru_cache(maxsize=None)
+def empty_snapshot() -> Snapshot:
+    return make_snapshot({section: empty_data(section) for section in SECTIONS}, 0, 0.0)
+
+def _without_timestamp(record):
+    if isinstance(record, dict):
+        return {key: value for key, value in record.items() if key != 'last_updated'}
+    return record
+
+def diff_section(old, new) -> Optional[Dict]:
+    """Describe what changed in a section between two serialized versions
+
+    Keyed sections report only the records whose values changed (ignoring
+    the refresh timestamp) plus removed keys; list sections are replaced
+    whole. Returns None when nothing changed.
+    """
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict) and all(isinstance(v, dict) for v in new.values()):
+        changed = {key: record for key, record in new.items()
+                   if _without_timestamp(old.get(key)) != _without_timestamp(record)}
+        removed = [key for key in old if key not in new]
+        if not changed and not removed:
+            return None
+        return {'changed': changed, 'removed': removed}
+    return {'replace': new}
+
+class Publisher:
+    """Renders each API response once per fetch cycle and caches the bytes"""
+
+    def __init__(self, cache, broadcaster=None, snapshot_path: Optional[str] = None):
+        self.cache = cache
+        self.broadcaster = broadcaster
+        # Columnar snapshot file shared with other workers through mmap
+        self.snapshot_path = snapshot_path
+        # Latest rendered data per section, so a partial publish can still
+        # produce a complete snapshot
+        self.sections: Dict[str, bytes] = {}
+        # Latest serialized values per section, to compute stream deltas
+        self.values: Dict = {}
+        self.payloads: Dict[str, Payload] = {}
+        self.columns: Dict[str, Dict] = {}
+        # Whether the last published snapshot still held restored data
+        self.stale = True
+        # Providers refresh on their own schedules and may publish concurrently
+        self._lock = threading.Lock()
+
+    def publish(self, results: Dict, next_fetch_at: Optional[Dict[str, float]] = None,
+                as_of: Optional[Dict[str, float]] = None, stale: bool = False) -> int:
+        """Cache the rendered payload of every section present in ``results``
+
+        ``next_fetch_at`` maps cache keys to the Unix time of their next
+        scheduled refresh and ``as_of`` to when they were fetched (now by
+        default). Data restored from an earlier run is published with
+        ``stale`` set until it is fetched again. The aggregated snapshot is rebuilt from the latest
+        data of every section and replaced in one cache write, and expires
+        with the soonest section. Subscribers of the event stream get one
+        delta event with just the records that changed. Returns the new data
+        generation, which increases once per publish.
+        """
+        with self._lock:
+            return self._publish(results, next_fetch_at or {}, as_of or {}, stale)
+
+    def _publish(self, results: Dict, next_fetch_at: Dict[str, float], as_of: Dict[str, float],
+                 stale: bool) -> int:
+        now = time.time()
+        generation = (self.cache.get(GENERATION_KEY) or 0) + 1
+        if not self.sections:
+            self._resume_from_cache()
+        delta = {}
+        for section, (key, serializer, empty) in SECTIONS.items():
+            if key not in results:
+                continue
+            expires_at = next_fetch_at.get(key, 0.0)
+            try:
+                value = serializer(results[key])
+                data = dumps(value)
+            except Exception as e:
+                logging.error(f"Error rendering {section} payload: {e}")
+                continue
+            changes = diff_section(self.values.get(section, serializer(empty)), value)
+            if changes:
+                delta[section] = changes
+            self.values[section] = value
+            self.sections[section] = data
+            self.payloads[section] = make_payload(data, generation, expires_at, as_of.get(key, now), stale)
+            # Entries live until replaced: a paused provider keeps serving its last data
+            self.cache.set(payload_key(section), self.payloads[section], timeout=0)
+
+        sections = {section: self.sections.get(section) or empty_data(section) for section in SECTIONS}
+        # The snapshot is as old as its oldest published section
+        payloads = self.payloads.values()
+        snapshot = make_snapshot(
+            sections, generation,
+            min((payload.expires_at for payload in payloads if payload.expires_at), default=0.0),
+            min((payload.as_of for payload in payloads), default=0.0),
+            any(payload.stale for payload in payloads) if payloads else True
+        )
+        self.cache.set(SNAPSHOT_KEY, snapshot, timeout=0)
+        if self.snapshot_path:
+            self._write_columnar(results, snapshot, generation)
+        self.cache.set(GENERATION_KEY, generation, timeout=0)
+
+        # Clients also hear when restored data has been replaced by fresh data
+        stale_changed = snapshot.payload.stale != self.stale
+        self.stale = snapshot.payload.stale
+        event = None
+        if delta or stale_changed:
+            event = dumps({'generation': generation, 'sections': delta,
+                           'as_of': format_as_of(snapshot.payload.as_of), 'stale': snapshot.payload.stale})
+        self.cache.set(DELTA_KEY, (generation, event), timeout=0)
+        if self.broadcaster is not None and event:
+            self.broadcaster.publish('delta', event, generation)
+        return generation
+
+    def _write_columnar(self, results: Dict, snapshot: Snapshot, generation: int):
+        """Write numeric columns and every rendered body to the shared snapshot file"""
+        for section, (key, extract) in COLUMN_SECTIONS.items():
+            if key in results:
+                self.columns[section] = build_columns(extract(results[key]))
+        blobs = {section: payload.body for section, payload in self.payloads.items()}
+        meta = {section: {'etag': payload.etag, 'expires_at': payload.expires_at}
+                for section, payload in self.payloads.items()}
+        blobs['snapshot'] = snapshot.payload.body
+        for encoding, body in snapshot.encoded.items():
+            blobs[f'snapshot.{encoding}'] = body
+        meta['snapshot'] = {'etag': snapshot.payload.etag, 'expires_at': snapshot.payload.expires_at}
+        try:
+            write_snapshot(self.snapshot_path, generation, self.columns, blobs, meta)
+        except Exception as e:
+            logging.error(f"Error writing snapshot file {self.snapshot_path}: {e}")
+
+    def _resume_from_cache(self):
+        """Pick up the sections another process published, e.g. after taking over as leader"""
+        snapshot = self.cache.get(SNAPSHOT_KEY)
+        if snapshot is None:
+            return
+        self.sections = dict(snapshot.sections)
+        self.values = {section: json.loads(data) for section, data in snapshot.sections.items()}
+        for section in SECTIONS:
+            payload = self.cache.get(payload_key(section))
+            if payload is not None:
+                self.payloads[section] = payload
+
+def relay_published_delta(cache, broadcaster, seen_generation: int) -> int:
+    """Re-broadcast deltas published by another process to this process's subscribers
+
+    Returns the generation now seen. When more than one generation was
+    missed, subscribers are told to reload the snapshot instead.
+    """
+    generation = cache.get(GENERATION_KEY) or 0
+    if generation <= seen_generation:
+        return seen_generation
+    published = cache.get(DELTA_KEY)
+    if seen_generation and published and published[0] == generation == seen_generation + 1:
+        if published[1]:
+            broadcaster.publish('delta', published[1], generation)
+    elif seen_generation:
+        broadcaster.publish('reset', b'{}', generation)
+    return generation
@@ -0,0 +1,138 @@
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from records import StockQuote
+from services.universe import Listing
+
+# Cache key of the latest RankingIndex, published with the gainers/losers
+RANKING_KEY = 'stock_ranking'
+
+class RankingIndex:
+    """Latest change percentage of every stock, ranked on demand with argpartition
+
+    Quotes are written into preallocated columns as they arrive, so an
+    update costs O(quotes) whatever the size of the universe. A top-n query
+    over m matching stocks costs O(m + n log n): argpartition picks the n
+    best, and only those are sorted. Filter masks for each sector and index
+    are built once per set of symbols.
+    """
+
+    def __init__(self, listings: Optional[Mapping[str, Listing]] = None, capacity: int = 64):
+        self.listings = dict(listings or {})
+        self.symbols: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.quotes: List[Optional[StockQuote]] = []
+        self.changes = np.full(capacity, np.nan, dtype=np.float64)
+        # Identifies this state of the index across processes
+        self.updated_at = 0.0
+        self._masks: Dict[Tuple[Optional[str], Optional[str]], np.ndarray] = {}
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, Sequence], listings: Optional[Mapping[str, Listing]] = None,
+                     updated_at: float = 0.0) -> 'RankingIndex':
+        """An index over the stock columns of a mapped snapshot (see services.columnar)
+
+        A NaN timestamp, written for a quote without one, comes back as None.
+        """
+        ranking = cls(listings, capacity=max(len(columns['symbol']), 1))
+        ranking.update(StockQuote(symbol, name, price, change, change_percent, datetime.fromtimestamp(timestamp) if timestamp == timestamp else None)
+                       for symbol, name, price, change, change_percent, timestamp in zip(
+                           columns['symbol'], columns['name'], columns['price'].tolist(), columns['change'].tolist(),
+                           columns['change_percent'].tolist(), columns['timestamp'].tolist()))
+        ranking.updated_at = updated_at
+        return ranking
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_masks'] = {}
+        return state
+
+    def _position(self, symbol: str) -> int:
+        position = self.positions.get(symbol)
+        if position is None:
+            position = self.positions[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.quotes.append(None)
+            if position == len(self.changes):
+                self.changes = np.concatenate([self.changes, np.full(len(self.changes), np.nan)])
+            # New symbols change every filter
+            self._masks.clear()
+        return position
+
+    def update(self, quotes: Iterable[StockQuote]):
+        """Record the latest quote of each symbol; symbols not quoted keep their last one"""
+        for quote in quotes:
+            position = self._position(quote.symbol)
+            self.quotes[position] = quote
+            self.changes[position] = quote.change_percent
+        self.updated_at = time.time()
+
+    def _mask(self, sector: Optional[str], index: Optional[str]) -> np.ndarray:
+        key = (sector, index)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.ones(len(self.symbols), dtype=bool)
+            if sector or index:
+                for position, symbol in enumerate(self.symbols):
+                    listing = self.listings.get(symbol)
+                    mask[position] = listing is not None and listing.matches(sector, index)
+            self._masks[key] = mask
+        return mask
+
+    def top(self, count: int, sector: Optional[str] = None,
+            index: Optional[str] = None) -> Dict[str, List[StockQuote]]:
+        """The ``count`` biggest gainers and losers among the matching stocks
+
+        The two lists never share a stock: with fewer than 2 * count
+        matches, the better half are gainers and the rest losers.
+        """
+        sector = sector.upper() if sector else None
+        index = index.upper() if index else None
+        changes = self.changes[:len(self.symbols)]
+        candidates = np.flatnonzero(self._mask(sector, index) & ~np.isnan(changes))
+        matched = len(candidates)
+        gainers = self._extreme(candidates, changes, min(count, (matched + 1) // 2), largest=True)
+        losers = self._extreme(candidates, changes, min(count, matched // 2), largest=False)
+        return {
+            'gainers': [self.quotes[position] for position in gainers],
+            # Like the gainers, best first, so the biggest loser comes last
+            'losers': [self.quotes[position] for position in losers[::-1]],
+        }
+
+    @staticmethod
+    def _extreme(candidates: np.ndarray, changes: np.ndarray, count: int, largest: bool) -> np.ndarray:
+        if count <= 0:
+            return candidates[:0]
+        keys = -changes[candidates] if largest else changes[candidates]
+        if count < len(candidates):
+            chosen = np.argpartition(keys, count - 1)[:count]
+        else:
+            chosen = np.arange(len(candidates))
+        return candidates[chosen[np.argsort(keys[chosen], kind='stable')]]
+
+def rank_gainers_losers(stocks: List[StockQuote], count: int = 5,
+                        listings: Optional[Mapping[str, Listing]] = None) -> Dict[str, List[StockQuote]]:
+    """Split stock quotes into the top gainers and losers by change percentage"""
+    ranking = RankingIndex(listings, capacity=max(len(stocks), 1))
+    ranking.update(stocks)
+    ranked = ranking.top(count)
+    ranked['stocks'] = stocks
+    return ranked
+
+# This process's copy of the latest index, with its filter masks built
+_current: Optional[RankingIndex] = None
+
+def current(ranking: Optional[RankingIndex]) -> Optional[RankingIndex]:
+    """Swap a freshly unpickled index for this process's copy of the same update"""
+    global _current
+    if ranking is None:
+        return None
+    kept = _current
+    if kept is not None and kept.updated_at == ranking.updated_at and len(kept) == len(ranking):
+        return kept
+    _current = ranking
+    return ranking
@@ -0,0 +1,199 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+import requests
+
+T = TypeVar('T')
+
+class ProviderUnavailable(Exception):
+    """Raised without contacting a provider whose circuit is open or whose quota is spent"""
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, in bursts of up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take a token, waiting up to ``timeout`` seconds for one to accrue
+
+        Gives up at once when the next token is further away than the timeout.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > timeout:
+                return False
+            # Claim the token now so concurrent callers queue behind it
+            self._tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return True
+
+class RetryBudget:
+    """Caps retries at a fraction of requests, so retries cannot multiply load on a failing provider"""
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 2):
+        self.ratio = ratio
+        self.minimum = minimum
+        self._balance = float(minimum)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """Credit one request"""
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.minimum + 10 * self.ratio)
+
+    def withdraw(self) -> bool:
+        """Spend one retry, if the budget allows it"""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through after ``reset_timeout``"""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self._open_until:
+                # Let a single probe through; everyone else keeps failing fast
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open(self.reset_timeout)
+
+    def release(self):
+        """Give back a probe that never reached the provider; the next waits out a fresh timeout"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open(self.reset_timeout)
+
+    def trip(self, seconds: float):
+        """Open for at least ``seconds``, e.g. as long as a provider asked us to back off"""
+        with self._lock:
+            self._open(max(seconds, self._open_until - time.monotonic()))
+
+    def _open(self, seconds: float):
+        self.state = self.OPEN
+        self._open_until = time.monotonic() + seconds
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a 429/503 response's Retry-After header, if it has one"""
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code not in (429, 503):
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    """Connection problems, timeouts, rate limiting and server errors are worth retrying"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, 'response', None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+class ProviderGuard:
+    """Rate limit, retry budget and circuit breaker for one upstream provider"""
+
+    def __init__(self, name: str, bucket: Optional[TokenBucket] = None, budget: Optional[RetryBudget] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = 2, backoff: float = 0.5):
+        self.name = name
+        self.bucket = bucket
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def call(self, func: Callable[[], T], remaining: Callable[[], float]) -> T:
+        """Run ``func`` with retries, never past the ``remaining()`` seconds of the cycle
+
+        Raises ProviderUnavailable without calling ``func`` while the circuit
+        is open or the rate limit has no token left in time.
+        """
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ProviderUnavailable(f"{self.name} is unavailable (circuit open)")
+            if self.bucket is not None and not self.bucket.acquire(timeout=remaining()):
+                # Otherwise a refused probe would leave the circuit half-open for good
+                self.breaker.release()
+                raise ProviderUnavailable(f"{self.name} rate limit reached")
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The provider answered; the request itself was wrong
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = retry_after(e)
+                if delay is not None:
+                    self.breaker.trip(delay)
+                    logging.warning(f"{self.name} asked to back off for {delay:.0f}s")
+                    raise
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if (attempt >= self.max_retries or self.breaker.state == CircuitBreaker.OPEN
+                        or delay >= remaining() or not self.budget.withdraw()):
+                    raise
+                logging.info(f"Retrying {self.name} in {delay:.2f}s after: {e}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+def build_guards(rate_limits: Dict[str, Dict], failure_threshold: int, reset_timeout: float,
+                 max_retries: int) -> Dict[str, ProviderGuard]:
+    """One guard per provider, with a token bucket sized to its quota"""
+    guards = {}
+    for name, limit in rate_limits.items():
+        bucket = TokenBucket(limit['requests'] / limit['per'], limit['burst'])
+        guards[name] = ProviderGuard(name, bucket, breaker=CircuitBreaker(failure_threshold, reset_timeout),
+                                     max_retries=max_retries)
+    return guards
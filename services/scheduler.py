@@ -1,59 +1,227 @@
 import logging
+import time
+from datetime import datetime, timedelta
 from apscheduler.triggers.interval import IntervalTrigger
+from config import Config
+from services.alerts import AlertEngine, AlertOutbox, WebhookSink, quote_values
+from services.broadcast import broadcaster
 from services.data_fetcher import DataFetcher
+from services.fx import FX_RATES_KEY, RateTable
+from services.leader import LeaderLock
+from services.market_calendar import IST, SessionGate, next_market_open
+from services.metrics import FETCH_CYCLE_SECONDS, PROVIDER_FETCH_SECONDS
+from services.portfolio import QUOTE_BOOK_KEY, QuoteBookBuilder
+from services.persistence import load_latest_snapshot, persist_snapshot
+from services.publisher import GENERATION_KEY, SNAPSHOT_KEY, Publisher, relay_published_delta
+from services.ranking import RANKING_KEY
+from services.ticks import TICK_STATS_KEY
 
-def start_data_fetching(scheduler, cache):
+# Cache key -> how its fetch results are described in the logs
+PROVIDER_LABELS = {
+    'currency_rates': 'currency rates',
+    'stock_indices': 'stock indices',
+    'commodity_prices': 'commodity prices',
+    'crypto_prices': 'crypto prices',
+    'financial_news': 'news items',
+    'gainers_losers': 'gainers/losers',
+}
+
+def has_data(key, value) -> bool:
+    """Whether a fetch result holds data, rather than a failed provider's empty value"""
+    if key == 'gainers_losers':
+        return bool(value.get('stocks'))
+    return bool(value)
+
+def start_data_fetching(scheduler, cache, app):
     """Start background data fetching tasks"""
     data_fetcher = DataFetcher()
-    
+    publisher = Publisher(cache, broadcaster, Config.SNAPSHOT_FILE if Config.COLUMNAR_SNAPSHOT else None)
+    fetchers = {
+        'currency_rates': data_fetcher.fetch_currency_rates,
+        'stock_indices': data_fetcher.fetch_stock_indices,
+        'commodity_prices': data_fetcher.fetch_commodity_prices,
+        'crypto_prices': data_fetcher.fetch_crypto_prices,
+        'financial_news': data_fetcher.fetch_financial_news,
+        'gainers_losers': data_fetcher.fetch_top_gainers_losers,
+    }
+    session = SessionGate(timedelta(minutes=Config.MARKET_CLOSE_GRACE_MINUTES))
+    alert_engine = AlertEngine()
+    quote_books = QuoteBookBuilder()
+    alert_outbox = None
+
+    def next_fetch_at(key):
+        """Unix time of the provider's next scheduled refresh"""
+        schedule = Config.PROVIDER_SCHEDULES[key]
+        job = scheduler.get_job(f'fetch_{key}')
+        # Jobs of a scheduler that has not been started have no run time yet
+        next_run = getattr(job, 'next_run_time', None)
+        if next_run is None:
+            next_run = datetime.now(IST) + timedelta(seconds=schedule['interval'])
+        if schedule.get('market_hours') and not session.due(key, next_run):
+            # Runs outside the session are skipped, so the data holds until the open
+            next_run = next_market_open(next_run)
+        return next_run.timestamp()
+
+    def timed(key):
+        def fetch():
+            with PROVIDER_FETCH_SECONDS.time(key):
+                return fetchers[key]()
+        return fetch
+
+    def fetch_providers(keys):
+        """Fetch the given providers concurrently and publish only their cache keys"""
+        started = time.monotonic()
+        with FETCH_CYCLE_SECONDS.time():
+            results = data_fetcher.engine.run_cycle({key: timed(key) for key in keys})
+        failed = [key for key, value in results.items() if not has_data(key, value)]
+        if failed:
+            # An empty result means the provider failed; keep serving its last good data
+            logging.warning(f"No data from {', '.join(failed)}; keeping the last good values")
+            results = {key: value for key, value in results.items() if key not in failed}
+        if not results:
+            return
+
+        for key, value in results.items():
+            # Held until the provider refreshes it, however long its interval
+            cache.set(key, value, timeout=0)
+        rates = None
+        if 'currency_rates' in results:
+            # Every currency the provider quotes, for cross-rate conversions
+            rates = RateTable(data_fetcher.usd_rates, time.time())
+            cache.set(FX_RATES_KEY, rates, timeout=0)
+        cache.set(TICK_STATS_KEY, data_fetcher.ticks.snapshot(), timeout=0)
+        if 'gainers_losers' in results:
+            cache.set(RANKING_KEY, data_fetcher.ranking, timeout=0)
+        publish_quote_book(results, rates)
+        # Render the changed responses once instead of once per request
+        publisher.publish(results, {key: next_fetch_at(key) for key in results})
+        check_alerts(results)
+
+        for key, value in results.items():
+            if key == 'gainers_losers':
+                logging.info(f"Cached {len(value.get('gainers', []))} gainers and {len(value.get('losers', []))} losers")
+            else:
+                logging.info(f"Cached {len(value)} {PROVIDER_LABELS[key]}")
+
+        # Written after caching so the API serves the new data first
+        if Config.PERSIST_SNAPSHOTS:
+            written = persist_snapshot(app, results)
+            if written:
+                logging.info(f"Persisted {sum(written.values())} rows across {len(written)} tables")
+
+        logging.debug(f"Fetched {', '.join(keys)} in {time.monotonic() - started:.1f}s")
+
+    def publish_quote_book(results, rates):
+        """Publish the prices portfolios are valued at, before the generation that brings them"""
+        book = quote_books.update(results, data_fetcher.ranking, rates)
+        if book is not None:
+            cache.set(QUOTE_BOOK_KEY, book, timeout=0)
+
+    def check_alerts(results):
+        """Fire the alert rules the new prices crossed"""
+        try:
+            alert_engine.sync(app)
+            fired = alert_outbox.dispatch(alert_engine.evaluate(quote_values(results)))
+            if fired:
+                logging.info(f"Fired {len(fired)} price alerts")
+        except Exception as e:
+            logging.error(f"Error checking price alerts: {e}")
+
+    def warm_start():
+        """Publish the last persisted data so the API can serve before the first fetch"""
+        if cache.get(SNAPSHOT_KEY) is not None:
+            # Already published by this cache's previous leader
+            return
+        results, as_of = load_latest_snapshot(app)
+        if not results:
+            return
+        for key, value in results.items():
+            cache.set(key, value, timeout=0)
+        rates = None
+        if 'currency_rates' in results:
+            rates = RateTable.from_quotes(results['currency_rates'], as_of)
+            cache.set(FX_RATES_KEY, rates, timeout=0)
+        if 'gainers_losers' in results:
+            data_fetcher.ranking.update(results['gainers_losers']['stocks'])
+            cache.set(RANKING_KEY, data_fetcher.ranking, timeout=0)
+        publish_quote_book(results, rates)
+        # The persisted prices become the first ticks, e.g. yesterday's close
+        for key, value in results.items():
+            data_fetcher.ticks.record_quotes(key, value.values() if isinstance(value, dict) else value)
+        # and what the first fetch's prices are checked against for alerts
+        alert_engine.prime(quote_values(results))
+        publisher.publish(results, as_of=as_of, stale=True)
+        logging.info(f"Serving persisted data for {len(results)} providers until the first fetch")
+
     def fetch_and_cache_all_data():
-        """Fetch all financial data and cache it"""
+        """Fetch every provider at once to fill the cache at startup"""
         try:
-            logging.info("Starting data fetch cycle...")
-            
-            # Fetch currency rates
-            currencies = data_fetcher.fetch_currency_rates()
-            cache.set('currency_rates', currencies)
-            logging.info(f"Cached {len(currencies)} currency rates")
-            
-            # Fetch stock indices
-            indices = data_fetcher.fetch_stock_indices()
-            cache.set('stock_indices', indices)
-            logging.info(f"Cached {len(indices)} stock indices")
-            
-            # Fetch commodity prices
-            commodities = data_fetcher.fetch_commodity_prices()
-            cache.set('commodity_prices', commodities)
-            logging.info(f"Cached {len(commodities)} commodity prices")
-            
-            # Fetch crypto prices
-            cryptos = data_fetcher.fetch_crypto_prices()
-            cache.set('crypto_prices', cryptos)
-            logging.info(f"Cached {len(cryptos)} crypto prices")
-            
-            # Fetch financial news
-            news = data_fetcher.fetch_financial_news()
-            cache.set('financial_news', news)
-            logging.info(f"Cached {len(news)} news items")
-            
-            # Fetch top gainers/losers
-            gainers_losers = data_fetcher.fetch_top_gainers_losers()
-            cache.set('gainers_losers', gainers_losers)
-            logging.info(f"Cached {len(gainers_losers.get('gainers', []))} gainers and {len(gainers_losers.get('losers', []))} losers")
-            
-            logging.info("Data fetch cycle completed successfully")
-            
+            logging.info("Starting initial data fetch...")
+            fetch_providers(list(fetchers))
         except Exception as e:
             logging.error(f"Error in data fetch cycle: {e}")
-    
-    # Schedule data fetching every 15 minutes
-    scheduler.add_job(
-        func=fetch_and_cache_all_data,
-        trigger=IntervalTrigger(minutes=15),
-        id='fetch_financial_data',
-        name='Fetch Financial Data',
-        replace_existing=True
-    )
-    
-    # Run once immediately
-    fetch_and_cache_all_data()
+
+    def refresh_provider(key):
+        """Scheduled refresh of one provider, skipped while its market is closed"""
+        try:
+            if Config.PROVIDER_SCHEDULES[key].get('market_hours') and not session.claim(key):
+                return
+            fetch_providers([key])
+        except Exception as e:
+            logging.error(f"Error refreshing {PROVIDER_LABELS[key]}: {e}")
+
+    def lead():
+        """Run the fetch jobs in this process"""
+        nonlocal alert_outbox
+        alert_outbox = AlertOutbox(cache, Config.ALERT_HISTORY_SIZE,
+                                   WebhookSink(Config.ALERT_WEBHOOK_URL) if Config.ALERT_WEBHOOK_URL else None)
+        for key, schedule in Config.PROVIDER_SCHEDULES.items():
+            scheduler.add_job(
+                func=refresh_provider,
+                args=[key],
+                trigger=IntervalTrigger(seconds=schedule['interval'], jitter=schedule.get('jitter')),
+                id=f'fetch_{key}',
+                name=f'Fetch {PROVIDER_LABELS[key]}',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1
+            )
+
+        # Serve what is on disk now and fetch fresh data in the background,
+        # so starting a process never waits on the upstream APIs
+        warm_start()
+        scheduler.add_job(
+            func=fetch_and_cache_all_data,
+            id='initial_fetch',
+            name='Initial Data Fetch',
+            replace_existing=True
+        )
+
+    if not Config.SHARED_CACHE:
+        # A per-process cache means every process fetches for itself
+        lead()
+        return
+
+    leader_lock = LeaderLock(Config.LEADER_LOCK_FILE)
+    seen_generation = cache.get(GENERATION_KEY) or 0
+
+    def follow():
+        """Relay the leader's updates to local stream subscribers; take over if it is gone"""
+        nonlocal seen_generation
+        if leader_lock.try_acquire():
+            scheduler.remove_job('follow_leader')
+            lead()
+            return
+        seen_generation = relay_published_delta(cache, broadcaster, seen_generation)
+
+    if leader_lock.try_acquire():
+        lead()
+    else:
+        logging.info("Another process is fetching data; following its cache updates")
+        scheduler.add_job(
+            func=follow,
+            trigger=IntervalTrigger(seconds=Config.FOLLOWER_POLL_SECONDS),
+            id='follow_leader',
+            name='Follow Data Fetch Leader',
+            replace_existing=True
+        )
@@ -0,0 +1,202 @@
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Union
+import numpy as np
+import pytz
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# Cache key of the latest {symbol: TickStats}, published after each fetch
+TICK_STATS_KEY = 'tick_stats'
+
+# Provider cache key -> the quote field that is its price
+QUOTE_VALUES = {
+    'currency_rates': 'rate',
+    'stock_indices': 'value',
+    'commodity_prices': 'price',
+    'crypto_prices': 'price_inr',
+}
+
+HOUR = 3600
+DAY = 86400
+
+@dataclass(frozen=True, slots=True)
+class TickStats:
+    symbol: str
+    last: float
+    as_of: float
+    ticks: int
+    previous_close: Optional[float]
+    # Against the previous close, or the oldest tick held until a day has passed
+    change_percent: float
+    change_1h: Optional[float]
+    change_1d: Optional[float]
+    # Standard deviation of the tick-to-tick log returns held, in percent
+    volatility: Optional[float]
+    low: float
+    high: float
+
+def _percent(value: float, reference: Optional[float]) -> Optional[float]:
+    if not reference:
+        return None
+    return (value - reference) / reference * 100
+
+class TickBuffer:
+    """The last ``capacity`` observations of one symbol in preallocated arrays
+
+    Ticks are numbered from zero and tick ``n`` lives in slot
+    ``n % capacity``. Every statistic is updated as a tick arrives, in
+    amortised O(1): running sums of the log returns in the window,
+    monotonic deques for the low and high, and one pointer per lookback
+    horizon that only ever moves forward.
+    """
+
+    def __init__(self, capacity: int, horizons: Sequence[int] = (HOUR, DAY)):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        # returns[slot of n] is the log return from tick n - 1 to tick n
+        self.returns = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.previous_close: Optional[float] = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._day = None
+        self._lows = deque()
+        self._highs = deque()
+        self._lags = {horizon: 0 for horizon in horizons}
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self.count - self.capacity)
+
+    def _value(self, n: int) -> float:
+        return float(self.values[n % self.capacity])
+
+    def append(self, at: float, value: float) -> bool:
+        """Add an observation; ticks older than the newest one are ignored"""
+        if not math.isfinite(value) or value <= 0:
+            return False
+        n = self.count
+        slot = n % self.capacity
+        if n:
+            last_at = float(self.times[(n - 1) % self.capacity])
+            if at < last_at:
+                return False
+        day = datetime.fromtimestamp(at, IST).date()
+        if self._day is not None and day != self._day:
+            self.previous_close = self._value(n - 1)
+        self._day = day
+
+        if n >= self.capacity:
+            # Tick n - capacity leaves; the return into the new oldest tick leaves with it
+            leaving = self.returns[(n + 1) % self.capacity] if self.capacity > 1 else 0.0
+            self._sum -= leaving
+            self._sum_sq -= leaving * leaving
+        change = math.log(value / self._value(n - 1)) if n else 0.0
+        self.returns[slot] = change
+        if n:
+            self._sum += change
+            self._sum_sq += change * change
+        self.times[slot] = at
+        self.values[slot] = value
+        self.count = n + 1
+
+        oldest = self.oldest
+        for extremes, worse in ((self._lows, float.__ge__), (self._highs, float.__le__)):
+            while extremes and worse(self._value(extremes[-1]), value):
+                extremes.pop()
+            extremes.append(n)
+            while extremes[0] < oldest:
+                extremes.popleft()
+        for horizon, lag in self._lags.items():
+            lag = max(lag, oldest)
+            while lag < n and self.times[(lag + 1) % self.capacity] <= at - horizon:
+                lag += 1
+            self._lags[horizon] = lag
+
+        if self.count % self.capacity == 0:
+            # Recompute the sums now and then so rounding errors cannot accumulate
+            held = self.returns[np.arange(oldest + 1, self.count) % self.capacity]
+            self._sum = float(held.sum())
+            self._sum_sq = float((held * held).sum())
+        return True
+
+    def change_since(self, horizon: int) -> Optional[float]:
+        """Percent change against the newest tick at least ``horizon`` seconds old, if one is held"""
+        lag = self._lags[horizon]
+        n = self.count - 1
+        if n < 1 or self.times[lag % self.capacity] > self.times[n % self.capacity] - horizon:
+            return None
+        return _percent(self._value(n), self._value(lag))
+
+    def volatility(self) -> Optional[float]:
+        held = min(self.count, self.capacity) - 1
+        if held < 2:
+            return None
+        variance = (self._sum_sq - self._sum * self._sum / held) / (held - 1)
+        return math.sqrt(max(variance, 0.0)) * 100
+
+    def stats(self, symbol: str) -> Optional[TickStats]:
+        if not self.count:
+            return None
+        n = self.count - 1
+        last = self._value(n)
+        reference = self.previous_close if self.previous_close is not None else self._value(self.oldest)
+        return TickStats(
+            symbol=symbol,
+            last=last,
+            as_of=float(self.times[n % self.capacity]),
+            ticks=min(self.count, self.capacity),
+            previous_close=self.previous_close,
+            change_percent=_percent(last, reference) or 0.0,
+            change_1h=self.change_since(HOUR) if HOUR in self._lags else None,
+            change_1d=self.change_since(DAY) if DAY in self._lags else None,
+            volatility=self.volatility(),
+            low=self._value(self._lows[0]),
+            high=self._value(self._highs[0])
+        )
+
+class TickStore:
+    """Ring buffers of recent prices for every symbol the fetchers see"""
+
+    def __init__(self, capacity: int, horizons: Sequence[int] = (HOUR, DAY)):
+        self.capacity = capacity
+        self.horizons = tuple(horizons)
+        self._buffers: Dict[str, TickBuffer] = {}
+        self._lock = threading.Lock()
+
+    def record(self, symbol: str, value: float, at: Union[datetime, float]) -> TickStats:
+        """Add a price and return the symbol's updated statistics"""
+        if isinstance(at, datetime):
+            at = at.timestamp()
+        with self._lock:
+            buffer = self._buffers.get(symbol)
+            if buffer is None:
+                buffer = self._buffers[symbol] = TickBuffer(self.capacity, self.horizons)
+            buffer.append(at, float(value))
+            stats = buffer.stats(symbol)
+        if stats is None:
+            # Nothing valid recorded yet, e.g. a zero price
+            return TickStats(symbol, value, at, 0, None, 0.0, None, None, None, value, value)
+        return stats
+
+    def record_quotes(self, key: str, quotes: Iterable):
+        """Add a provider's quote records, e.g. persisted ones at startup"""
+        field = QUOTE_VALUES.get(key)
+        if field is None:
+            return
+        for quote in quotes:
+            self.record(quote.symbol, getattr(quote, field), quote.last_updated)
+
+    def stats(self, symbol: str) -> Optional[TickStats]:
+        with self._lock:
+            buffer = self._buffers.get(symbol)
+            return buffer.stats(symbol) if buffer else None
+
+    def snapshot(self) -> Dict[str, TickStats]:
+        with self._lock:
+            return {symbol: buffer.stats(symbol) for symbol, buffer in self._buffers.items() if buffer.count}
@@ -0,0 +1,60 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+from config import Config
+
+@dataclass(frozen=True, slots=True)
+class Listing:
+    """A tracked stock with its sector and the indices it belongs to, upper-cased"""
+    symbol: str
+    sector: Optional[str] = None
+    indices: FrozenSet[str] = frozenset()
+
+    def matches(self, sector: Optional[str] = None, index: Optional[str] = None) -> bool:
+        return (not sector or self.sector == sector) and (not index or index in self.indices)
+
+def parse_listing(line: str) -> Optional[Listing]:
+    """Parse ``SYMBOL[,Sector[,INDEX|INDEX...]]``; blank lines and # comments give None"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    symbol, _, rest = line.partition(',')
+    sector, _, indices = rest.partition(',')
+    return Listing(
+        symbol=symbol.strip(),
+        sector=sector.strip().upper() or None,
+        indices=frozenset(name.strip().upper() for name in indices.split('|') if name.strip())
+    )
+
+def _read_listings(path: str) -> List[Listing]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [listing for listing in map(parse_listing, f) if listing]
+    except OSError as e:
+        logging.error(f"Error reading stock list {path}: {e}")
+        return []
+
+def load_listings() -> Dict[str, Listing]:
+    """Load the tracked stocks from STOCK_UNIVERSE_FILE or STOCK_UNIVERSE
+
+    Sectors and index memberships come from the universe file's own
+    columns, or else from STOCK_METADATA_FILE.
+    """
+    listings = _read_listings(Config.STOCK_UNIVERSE_FILE) if Config.STOCK_UNIVERSE_FILE else []
+    if not listings:
+        listings = [Listing(symbol.strip()) for symbol in Config.STOCK_UNIVERSE.split(',') if symbol.strip()]
+    metadata = {listing.symbol: listing
+                for listing in (_read_listings(Config.STOCK_METADATA_FILE) if Config.STOCK_METADATA_FILE else [])}
+    universe = {}
+    for listing in listings:
+        # Preserve order, drop duplicates
+        if listing.symbol in universe:
+            continue
+        if listing.sector is None and not listing.indices and listing.symbol in metadata:
+            listing = metadata[listing.symbol]
+        universe[listing.symbol] = listing
+    return universe
+
+def load_stock_universe() -> List[str]:
+    """Load the tracked stock symbols from STOCK_UNIVERSE_FILE or STOCK_UNIVERSE"""
+    return list(load_listings())
@@ -1,17 +1,23 @@
 // charts.js - Chart rendering functions for Indian Financial Dashboard
 
 async function fetchData(url) {
-    const response = await fetch(url);
-    const data = await response.json();
+    // Shares the dashboard's ETag cache, so unchanged data costs a 304 at most
+    const data = await fetchApi(url);
     if (!data.success) {
         throw new Error(data.error || 'Failed to fetch data');
     }
     return data.data;
 }
 
+async function fetchSection(section) {
+    // Charts read from the dashboard's snapshot instead of their own requests
+    const data = await fetchData('/api/snapshot');
+    return data[section];
+}
+
 async function renderCurrencyRatesChart() {
     try {
-        const data = await fetchData('/api/currency-rates');
+        const data = await fetchSection('currency-rates');
         const labels = Object.keys(data);
         const rates = labels.map(symbol => data[symbol].rate);
         
@@ -43,7 +49,7 @@ async function renderCurrencyRatesChart() {
 
 async function renderStockIndicesChart() {
     try {
-        const data = await fetchData('/api/stock-indices');
+        const data = await fetchSection('stock-indices');
         const labels = Object.keys(data);
         const values = labels.map(name => data[name].value);
         
@@ -77,7 +83,7 @@ async function renderStockIndicesChart() {
 
 async function renderCommodityPricesChart() {
     try {
-        const data = await fetchData('/api/commodity-prices');
+        const data = await fetchSection('commodity-prices');
         const labels = Object.keys(data);
         const prices = labels.map(symbol => data[symbol].price);
         
@@ -109,7 +115,7 @@ async function renderCommodityPricesChart() {
 
 async function renderCryptoPricesChart() {
     try {
-        const data = await fetchData('/api/crypto-prices');
+        const data = await fetchSection('crypto-prices');
         const labels = Object.keys(data);
         const prices = labels.map(symbol => data[symbol].price_inr);
         
@@ -140,3 +146,53 @@ async function renderCryptoPricesChart() {
         console.error('Error rendering cryptocurrency prices chart:', error);
     }
 }
+
+async function renderHistoryChart(canvasId, kind, symbol, from = null, to = null) {
+    try {
+        const params = new URLSearchParams();
+        if (from) params.set('from', from);
+        if (to) params.set('to', to);
+        const data = await fetchData(`/api/history/${kind}/${encodeURIComponent(symbol)}?${params}`);
+        const labels = data.time.map(time => new Date(time).toLocaleString());
+        
+        const ctx = document.getElementById(canvasId).getContext('2d');
+        window.historyChartInstances = window.historyChartInstances || {};
+        if (window.historyChartInstances[canvasId]) {
+            window.historyChartInstances[canvasId].destroy();
+        }
+        window.historyChartInstances[canvasId] = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: labels,
+                datasets: [{
+                    label: `${symbol} (close)`,
+                    data: data.close,
+                    borderColor: 'rgba(75, 192, 192, 1)',
+                    fill: false,
+                    tension: 0.1,
+                    pointRadius: 0
+                }, {
+                    label: 'High',
+                    data: data.high,
+                    borderColor: 'rgba(40, 167, 69, 0.4)',
+                    fill: false,
+                    pointRadius: 0
+                }, {
+                    label: 'Low',
+                    data: data.low,
+                    borderColor: 'rgba(220, 53, 69, 0.4)',
+                    fill: false,
+                    pointRadius: 0
+                }]
+            },
+            options: {
+                responsive: true,
+                scales: {
+                    y: { beginAtZero: false }
+                }
+            }
+        });
+    } catch (error) {
+        console.error(`Error rendering history chart for ${symbol}:`, error);
+    }
+}
@@ -1,11 +1,53 @@
 // Dashboard JavaScript for Indian Financial Dashboard
 
+// Responses kept per URL with their ETag and the time they stay fresh until
+const apiCache = new Map();
+// Requests in flight per URL, shared by concurrent callers
+const apiPending = new Map();
+
+function fetchApi(url, { force = false } = {}) {
+    const cached = apiCache.get(url);
+    if (cached && !force && Date.now() < cached.freshUntil) {
+        return Promise.resolve(cached.data);
+    }
+    if (!force && apiPending.has(url)) {
+        return apiPending.get(url);
+    }
+    
+    const request = requestApi(url, cached).finally(() => apiPending.delete(url));
+    apiPending.set(url, request);
+    return request;
+}
+
+async function requestApi(url, cached) {
+    const headers = {};
+    if (cached && cached.etag) {
+        headers['If-None-Match'] = cached.etag;
+    }
+    const response = await fetch(url, { headers, cache: 'no-store' });
+    const maxAge = /max-age=(\d+)/.exec(response.headers.get('Cache-Control') || '');
+    const freshUntil = Date.now() + (maxAge ? parseInt(maxAge[1], 10) * 1000 : 0);
+    
+    if (response.status === 304 && cached) {
+        cached.freshUntil = freshUntil;
+        return cached.data;
+    }
+    
+    const data = await response.json();
+    if (response.ok && response.headers.get('ETag')) {
+        apiCache.set(url, { etag: response.headers.get('ETag'), freshUntil, data });
+    }
+    return data;
+}
+
 class FinancialDashboard {
     constructor() {
         this.refreshInterval = 15 * 60 * 1000; // 15 minutes
         this.refreshTimer = null;
         this.lastUpdateTime = null;
         this.countdownTimer = null;
+        this.eventSource = null;
+        this.data = null;
         
         this.init();
     }
@@ -13,7 +55,65 @@ class FinancialDashboard {
     init() {
         this.setupEventListeners();
         this.loadAllData();
-        this.startAutoRefresh();
+        if (window.EventSource) {
+            this.startStream();
+        } else {
+            this.startAutoRefresh();
+        }
+        this.updateLastUpdateTime();
+    }
+    
+    startStream() {
+        // The server pushes only the records that changed in each fetch cycle
+        this.eventSource = new EventSource('/api/stream');
+        this.eventSource.addEventListener('open', () => {
+            document.getElementById('refreshCountdown').textContent = 'Live';
+        });
+        this.eventSource.addEventListener('delta', (event) => {
+            this.applyDelta(JSON.parse(event.data));
+        });
+        this.eventSource.addEventListener('reset', () => {
+            this.loadAllData(true);
+        });
+        this.eventSource.addEventListener('error', () => {
+            if (this.eventSource.readyState === EventSource.CLOSED) {
+                // Streaming is unavailable; fall back to polling
+                this.eventSource = null;
+                this.startAutoRefresh();
+            }
+        });
+    }
+    
+    applyDelta(delta) {
+        if (!this.data) {
+            this.loadAllData(true);
+            return;
+        }
+        apiCache.clear();
+        
+        Object.entries(delta.sections).forEach(([section, changes]) => {
+            if ('replace' in changes) {
+                this.data[section] = changes.replace;
+            } else {
+                const current = { ...(this.data[section] || {}) };
+                Object.assign(current, changes.changed);
+                changes.removed.forEach(key => delete current[key]);
+                this.data[section] = current;
+            }
+            this.renderSection(section, this.data[section]);
+        });
+        
+        this.updateFreshness(delta);
+    }
+    
+    updateFreshness({ as_of, stale }) {
+        // Saved data from before the server started is shown until it refetches
+        if (stale) {
+            this.updateDataStatus('Showing saved data, refreshing...', 'loading');
+        } else {
+            this.updateDataStatus('Data loaded successfully', 'success');
+        }
+        this.lastUpdateTime = as_of ? new Date(as_of) : new Date();
         this.updateLastUpdateTime();
     }
     
@@ -26,36 +126,75 @@ class FinancialDashboard {
         document.getElementById('fromCurrency').addEventListener('change', this.convertCurrency.bind(this));
         document.getElementById('toCurrency').addEventListener('change', this.convertCurrency.bind(this));
         
+        // Clicking a quote charts its history in its card's canvas
+        [['currencyRatesContainer', 'currencyRatesChart', 'currency'],
+         ['stockIndicesContainer', 'stockIndicesChart', 'index'],
+         ['commodityPricesContainer', 'commodityPricesChart', 'commodity'],
+         ['cryptoPricesContainer', 'cryptoPricesChart', 'crypto']].forEach(([containerId, canvasId, kind]) => {
+            document.getElementById(containerId).addEventListener('click', (event) => {
+                const row = event.target.closest('[data-symbol]');
+                if (row) {
+                    renderHistoryChart(canvasId, kind, row.dataset.symbol);
+                }
+            });
+        });
+        
         // Auto-convert on page load
         setTimeout(() => this.convertCurrency(), 1000);
     }
     
-    async loadAllData() {
+    async loadAllData(force = false) {
         this.updateDataStatus('Loading data...', 'loading');
         
         try {
-            await Promise.all([
-                this.loadCurrencyRates(),
-                this.loadStockIndices(),
-                this.loadCommodityPrices(),
-                this.loadCryptoPrices(),
-                this.loadFinancialNews(),
-                this.loadGainersLosers()
-            ]);
-            
-            this.updateDataStatus('Data loaded successfully', 'success');
-            this.lastUpdateTime = new Date();
-            this.updateLastUpdateTime();
+            // One round trip for every section
+            const snapshot = await fetchApi('/api/snapshot', { force });
+            if (!snapshot.success) {
+                throw new Error(snapshot.error || 'Failed to load snapshot');
+            }
+            this.data = { ...snapshot.data };
+            this.renderSnapshot(this.data);
+            this.updateFreshness(snapshot);
         } catch (error) {
             console.error('Error loading data:', error);
             this.updateDataStatus('Error loading data', 'error');
         }
     }
     
-    async loadCurrencyRates() {
+    renderSnapshot(data) {
+        Object.entries(data).forEach(([section, sectionData]) => this.renderSection(section, sectionData));
+    }
+    
+    renderSection(section, data) {
+        switch (section) {
+            case 'currency-rates':
+                this.renderCurrencyRates(data);
+                this.updateQuickStats('currency', data);
+                break;
+            case 'stock-indices':
+                this.renderStockIndices(data);
+                this.updateQuickStats('stocks', data);
+                break;
+            case 'commodity-prices':
+                this.renderCommodityPrices(data);
+                this.updateQuickStats('commodities', data);
+                break;
+            case 'crypto-prices':
+                this.renderCryptoPrices(data);
+                this.updateQuickStats('crypto', data);
+                break;
+            case 'financial-news':
+                this.renderFinancialNews(data);
+                break;
+            case 'gainers-losers':
+                this.renderGainersLosers(data);
+                break;
+        }
+    }
+    
+    async loadCurrencyRates(force = false) {
         try {
-            const response = await fetch('/api/currency-rates');
-            const data = await response.json();
+            const data = await fetchApi('/api/currency-rates', { force });
             
             if (data.success) {
                 this.renderCurrencyRates(data.data);
@@ -69,10 +208,9 @@ class FinancialDashboard {
         }
     }
     
-    async loadStockIndices() {
+    async loadStockIndices(force = false) {
         try {
-            const response = await fetch('/api/stock-indices');
-            const data = await response.json();
+            const data = await fetchApi('/api/stock-indices', { force });
             
             if (data.success) {
                 this.renderStockIndices(data.data);
@@ -86,10 +224,9 @@ class FinancialDashboard {
         }
     }
     
-    async loadCommodityPrices() {
+    async loadCommodityPrices(force = false) {
         try {
-            const response = await fetch('/api/commodity-prices');
-            const data = await response.json();
+            const data = await fetchApi('/api/commodity-prices', { force });
             
             if (data.success) {
                 this.renderCommodityPrices(data.data);
@@ -103,10 +240,9 @@ class FinancialDashboard {
         }
     }
     
-    async loadCryptoPrices() {
+    async loadCryptoPrices(force = false) {
         try {
-            const response = await fetch('/api/crypto-prices');
-            const data = await response.json();
+            const data = await fetchApi('/api/crypto-prices', { force });
             
             if (data.success) {
                 this.renderCryptoPrices(data.data);
@@ -120,10 +256,9 @@ class FinancialDashboard {
         }
     }
     
-    async loadFinancialNews() {
+    async loadFinancialNews(force = false) {
         try {
-            const response = await fetch('/api/financial-news');
-            const data = await response.json();
+            const data = await fetchApi('/api/financial-news', { force });
             
             if (data.success) {
                 this.renderFinancialNews(data.data);
@@ -136,10 +271,9 @@ class FinancialDashboard {
         }
     }
     
-    async loadGainersLosers() {
+    async loadGainersLosers(force = false) {
         try {
-            const response = await fetch('/api/gainers-losers');
-            const data = await response.json();
+            const data = await fetchApi('/api/gainers-losers', { force });
             
             if (data.success) {
                 this.renderGainersLosers(data.data);
@@ -162,7 +296,7 @@ class FinancialDashboard {
         }
         
         const html = Object.entries(rates).map(([symbol, rate]) => `
-            <div class="d-flex justify-content-between align-items-center py-2 border-bottom">
+            <div class="d-flex justify-content-between align-items-center py-2 border-bottom" role="button" data-symbol="${rate.symbol}">
                 <div>
                     <strong>${symbol}</strong>
                     <small class="text-muted d-block">${new Date(rate.last_updated).toLocaleString()}</small>
@@ -187,7 +321,7 @@ class FinancialDashboard {
         }
         
         const html = Object.entries(indices).map(([name, index]) => `
-            <div class="d-flex justify-content-between align-items-center py-2 border-bottom">
+            <div class="d-flex justify-content-between align-items-center py-2 border-bottom" role="button" data-symbol="${index.symbol}">
                 <div>
                     <strong>${index.name}</strong>
                     <small class="text-muted d-block">${new Date(index.last_updated).toLocaleString()}</small>
@@ -213,7 +347,7 @@ class FinancialDashboard {
         }
         
         const html = Object.entries(commodities).map(([symbol, commodity]) => `
-            <div class="d-flex justify-content-between align-items-center py-2 border-bottom">
+            <div class="d-flex justify-content-between align-items-center py-2 border-bottom" role="button" data-symbol="${commodity.symbol}">
                 <div>
                     <strong>${commodity.name}</strong>
                     <small class="text-muted d-block">${commodity.unit}</small>
@@ -238,7 +372,7 @@ class FinancialDashboard {
         }
         
         const html = Object.entries(cryptos).map(([symbol, crypto]) => `
-            <div class="d-flex justify-content-between align-items-center py-2 border-bottom">
+            <div class="d-flex justify-content-between align-items-center py-2 border-bottom" role="button" data-symbol="${crypto.symbol}">
                 <div>
                     <strong>${crypto.name}</strong>
                     <small class="text-muted d-block">${crypto.symbol}</small>
@@ -471,23 +605,23 @@ class FinancialDashboard {
 
 // Global refresh functions
 function refreshCurrencyData() {
-    dashboard.loadCurrencyRates();
+    dashboard.loadCurrencyRates(true);
 }
 
 function refreshStockData() {
-    dashboard.loadStockIndices();
+    dashboard.loadStockIndices(true);
 }
 
 function refreshCommodityData() {
-    dashboard.loadCommodityPrices();
+    dashboard.loadCommodityPrices(true);
 }
 
 function refreshCryptoData() {
-    dashboard.loadCryptoPrices();
+    dashboard.loadCryptoPrices(true);
 }
 
 function refreshNewsData() {
-    dashboard.loadFinancialNews();
+    dashboard.loadFinancialNews(true);
 }
 
 function convertCurrency() {
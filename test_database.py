@@ -1,12 +1,42 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
 import unittest
-from datetime import datetime
-from core import app
+from unittest import mock
+from datetime import datetime, timedelta
+import requests
+from cachelib import SimpleCache
+from werkzeug.serving import make_server
+
+# Build the app against a throwaway database and runtime directory, without
+# the scheduler's background fetches; this has to happen before core is imported
+_workdir = tempfile.mkdtemp(prefix='wealth_vista_test_')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    'RUNTIME_DIR': os.path.join(_workdir, 'runtime'),
+    'SCHEDULER_ENABLED': 'false',
+})
+
+from core import app, cache
+import routes.api
 from db import db
 from models import CurrencyRate, StockIndex, CommodityPrice, CryptoPrice, NewsItem, StockData
+from records import CurrencyQuote, NewsArticle, StockQuote
+from services.alerts import ALERTS_KEY, Alert
+from services.fx import FX_RATES_KEY, RateTable
+from services.history import query_ohlc
+from services.portfolio import QUOTE_BOOK_KEY, QuoteBook
+from services.columnar import SnapshotReader
+from services.publisher import GENERATION_KEY, Publisher
+from services.news import init_news_search
+from services.ranking import RANKING_KEY, RankingIndex
+from services.ticks import TICK_STATS_KEY, TickStore
+from services.persistence import load_latest_snapshot, persist_snapshot
 
 class DatabaseTestCase(unittest.TestCase):
     def setUp(self):
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         app.config['TESTING'] = True
         self.app = app.test_client()
         with app.app_context():
@@ -100,5 +130,272 @@ class DatabaseTestCase(unittest.TestCase):
             self.assertIsNotNone(stock_from_db)
             self.assertEqual(stock_from_db.price, 150.0)
 
+    def test_time_series_indexes(self):
+        with app.app_context():
+            inspector = db.inspect(db.engine)
+            indexes = {index['name']: index['column_names'] for index in inspector.get_indexes('stock_data')}
+            self.assertEqual(indexes['ix_stock_data_symbol_last_updated'], ['symbol', 'last_updated'])
+
+    def test_persist_snapshot(self):
+        now = datetime.utcnow()
+        results = {
+            'currency_rates': {
+                'USD-INR': CurrencyQuote(symbol='USD-INR', rate=83.2, change_percent=0.0, last_updated=now),
+                'EUR-INR': CurrencyQuote(symbol='EUR-INR', rate=90.1, change_percent=0.0, last_updated=now)
+            },
+            'gainers_losers': {
+                'gainers': [],
+                'losers': [],
+                'stocks': [StockQuote(symbol='TCS.NS', name='TCS', price=3900.0, change=10.0, change_percent=0.26, last_updated=now)]
+            }
+        }
+        written = persist_snapshot(app, results)
+        self.assertEqual(written, {'currency_rates': 2, 'stock_data': 1})
+        persist_snapshot(app, results)
+
+        with app.app_context():
+            self.assertEqual(CurrencyRate.query.filter_by(symbol='USD-INR').count(), 2)
+            stock = StockData.query.filter_by(symbol='TCS.NS').first()
+            self.assertIsNotNone(stock.last_updated)
+
+    def test_load_latest_snapshot(self):
+        now = datetime.utcnow()
+        for rate in (83.2, 83.4):
+            persist_snapshot(app, {'currency_rates': {
+                'USD-INR': CurrencyQuote(symbol='USD-INR', rate=rate, change_percent=0.0, last_updated=now)
+            }})
+
+        results, as_of = load_latest_snapshot(app)
+        self.assertEqual(list(results), ['currency_rates'])
+        self.assertEqual(results['currency_rates']['USD-INR'].rate, 83.4)
+        self.assertIsNotNone(results['currency_rates']['USD-INR'].last_updated.tzinfo)
+        self.assertIn('currency_rates', as_of)
+
+    def test_history_ohlc_buckets(self):
+        start = datetime(2025, 7, 1, 10, 0)
+        with app.app_context():
+            for minute, price in enumerate([100.0, 105.0, 95.0, 101.0, 110.0, 108.0]):
+                db.session.add(StockData(symbol='INFY.NS', name='Infosys', price=price, change=0.0,
+                                         change_percent=0.0, last_updated=start + timedelta(minutes=minute)))
+            db.session.commit()
+
+            history = query_ohlc('stock', 'INFY.NS', start, start + timedelta(minutes=6), bucket=180)
+            self.assertEqual(history['bucket'], 180)
+            self.assertEqual(history['open'], [100.0, 101.0])
+            self.assertEqual(history['high'], [105.0, 110.0])
+            self.assertEqual(history['low'], [95.0, 101.0])
+            self.assertEqual(history['close'], [95.0, 108.0])
+
+            # A year-long range is downsampled to at most max_points buckets
+            history = query_ohlc('stock', 'INFY.NS', start - timedelta(days=365), start + timedelta(minutes=6), max_points=100)
+            self.assertGreaterEqual(history['bucket'], 86400)
+            self.assertEqual(len(history['close']), 1)
+
+    def test_payload_conditional_request(self):
+        response = self.app.get('/api/currency-rates')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+        response = self.app.get('/api/currency-rates', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_snapshot_endpoint(self):
+        response = self.app.get('/api/snapshot')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['data']), 6)
+
+        response = self.app.get('/api/snapshot?sections=currency-rates,financial-news',
+                                headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.data))['data']
+        self.assertEqual(list(data), ['currency-rates', 'financial-news'])
+
+        response = self.app.get('/api/snapshot?sections=bonds')
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_endpoint(self):
+        self.app.get('/api/currency-rates')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('# TYPE wealthvista_request_seconds histogram', body)
+        self.assertIn('wealthvista_api_cache_total{route="currency-rates"', body)
+
+    def test_convert_cross_rates(self):
+        cache.set(FX_RATES_KEY, RateTable({'USD': 1.0, 'INR': 80.0, 'EUR': 0.8, 'GBP': 0.5}, 1.0), timeout=0)
+        data = self.app.get('/api/convert?from=eur&to=gbp&amount=8').get_json()['data']
+        self.assertAlmostEqual(data['rate'], 0.625)
+        self.assertAlmostEqual(data['converted_amount'], 5.0)
+
+        data = self.app.get('/api/convert?from=EUR,GBP,USD&to=INR&amount=1,2,3').get_json()['data']
+        self.assertEqual([row['from_currency'] for row in data], ['EUR', 'GBP', 'USD'])
+        self.assertEqual([round(row['converted_amount'], 6) for row in data], [100.0, 320.0, 240.0])
+
+        self.assertEqual(self.app.get('/api/convert?from=XYZ&to=INR').status_code, 400)
+        self.assertEqual(self.app.get('/api/convert?from=EUR,GBP&to=INR,USD,EUR').status_code, 400)
+        # NaN and Infinity are not JSON
+        self.assertEqual(self.app.get('/api/convert?from=EUR&to=INR&amount=nan').status_code, 400)
+        self.assertEqual(self.app.get('/api/convert?from=EUR&to=INR&amount=1e308').status_code, 400)
+        self.assertEqual(self.app.get('/api/convert?from=EUR,GBP&to=INR&amount=1e308,1e308').status_code, 400)
+
+    def test_convert_same_currency_before_rates_arrive(self):
+        cache.delete(FX_RATES_KEY)
+        data = self.app.get('/api/convert?from=inr&to=INR&amount=5').get_json()['data']
+        self.assertEqual((data['rate'], data['converted_amount']), (1.0, 5.0))
+        self.assertEqual(self.app.get('/api/convert?from=USD&to=INR').status_code, 400)
+
+    def test_convert_batch(self):
+        cache.set(FX_RATES_KEY, RateTable({'USD': 1.0, 'INR': 80.0, 'EUR': 0.8}, 2.0), timeout=0)
+        rows = [{'from': 'EUR', 'to': 'INR', 'amount': 2}, {'from': 'usd', 'to': 'EUR', 'amount': 5}]
+        response = self.app.post('/api/convert/batch', json=rows)
+        self.assertEqual(response.mimetype, 'application/json')
+        body = response.get_json()
+        self.assertEqual(body['count'], 2)
+        self.assertEqual([row['converted_amount'] for row in body['data']], [200.0, 4.0])
+
+        response = self.app.post('/api/convert/batch', data='amount,from,to\n2,EUR,INR\n', content_type='text/csv')
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(response.get_data(as_text=True).splitlines()[1], 'EUR,INR,2,200,100')
+
+        response = self.app.post('/api/convert/batch', data='from,to,amount\n2,EUR,INR\n', content_type='text/csv',
+                                 headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.post('/api/convert/batch', json={'from': ['EUR'], 'to': ['XYZ'],
+                                                                   'amount': [1]}).status_code, 400)
+
+    def test_convert_batch_rejects_malformed_bodies(self):
+        cache.set(FX_RATES_KEY, RateTable({'USD': 1.0, 'INR': 80.0, 'EUR': 0.8}, 2.0), timeout=0)
+        for body in ({'from': ['EUR'], 'to': ['INR'], 'amount': 5}, {'from': 'EUR', 'to': 'INR', 'amount': [5]},
+                     {'from': ['EUR'], 'to': ['INR'], 'amount': [[5]]}, [{'from': 1, 'to': 'INR'}],
+                     {'from': ['EUR'], 'to': ['INR'], 'amount': [True]}, [{'from': 'EUR', 'to': 'INR', 'amount': True}]):
+            response = self.app.post('/api/convert/batch', json=body)
+            self.assertEqual((response.status_code, response.get_json()['success']), (400, False), body)
+        response = self.app.post('/api/convert/batch', data=b'from,to,amount\n\xff\xfe,INR,1\n',
+                                 content_type='text/csv')
+        self.assertEqual((response.status_code, response.get_json()['success']), (400, False))
+
+    def test_tick_stats_endpoint(self):
+        ticks = TickStore(16)
+        ticks.record('USD-INR', 80.0, 1000.0)
+        ticks.record('USD-INR', 82.0, 2000.0)
+        cache.set(TICK_STATS_KEY, ticks.snapshot(), timeout=0)
+        cache.set(GENERATION_KEY, (cache.get(GENERATION_KEY) or 0) + 1, timeout=0)
+        data = self.app.get('/api/stats/usd-inr').get_json()['data']
+        self.assertEqual((data['low'], data['high'], data['ticks']), (80.0, 82.0, 2))
+        self.assertEqual(self.app.get('/api/stats/XYZ').status_code, 404)
+
+    def test_gainers_losers_query(self):
+        now = datetime.now()
+        ranking = RankingIndex()
+        ranking.update([StockQuote(symbol=f'S{i}.NS', name=f'S{i}', price=100.0, change=float(i),
+                                   change_percent=float(i), last_updated=now) for i in range(-5, 6)])
+        cache.set(RANKING_KEY, ranking, timeout=0)
+        cache.set(GENERATION_KEY, (cache.get(GENERATION_KEY) or 0) + 1, timeout=0)
+        data = self.app.get('/api/gainers-losers?n=2').get_json()['data']
+        self.assertEqual([stock['symbol'] for stock in data['gainers']], ['S5.NS', 'S4.NS'])
+        self.assertEqual([stock['symbol'] for stock in data['losers']], ['S-4.NS', 'S-5.NS'])
+        self.assertEqual(self.app.get('/api/gainers-losers?n=0').status_code, 400)
+        self.assertEqual(self.app.get('/api/gainers-losers?sector=energy').get_json()['data'],
+                         {'gainers': [], 'losers': []})
+
+    def test_alert_rules_endpoints(self):
+        response = self.app.post('/api/alerts', json=[{'symbol': 'tcs.ns', 'kind': 'above', 'threshold': 4000, 'owner': 'asha'},
+                                                       {'symbol': 'USD-INR', 'kind': 'move', 'threshold': 1.5}])
+        self.assertEqual(response.status_code, 201)
+        created = response.get_json()['data']
+        self.assertEqual([rule['symbol'] for rule in created], ['TCS.NS', 'USD-INR'])
+        self.assertEqual(len(self.app.get('/api/alerts?owner=asha').get_json()['data']), 1)
+        self.assertEqual(self.app.post('/api/alerts', json={'symbol': 'TCS.NS', 'kind': 'above', 'threshold': -1}).status_code, 400)
+        self.assertEqual(self.app.post('/api/alerts', json={'symbol': 'TCS.NS', 'kind': 'near', 'threshold': 1}).status_code, 400)
+        self.assertEqual(self.app.delete(f"/api/alerts/{created[0]['id']}").status_code, 200)
+        self.assertEqual(self.app.delete(f"/api/alerts/{created[0]['id']}").status_code, 404)
+        self.assertEqual(len(self.app.get('/api/alerts').get_json()['data']), 1)
+
+        cache.set(ALERTS_KEY, [Alert(created[1]['id'], None, 'USD-INR', 'move', 1.5, 84.0, 82.0, 2.4, 1.0, id=7)], timeout=0)
+        body = self.app.get('/api/alerts/fired?after=6').get_json()
+        self.assertEqual(([alert['rule_id'] for alert in body['data']], body['last_id']), ([created[1]['id']], 7))
+        self.assertEqual(self.app.get('/api/alerts/fired?after=7').get_json()['data'], [])
+
+    def test_portfolio_valuation(self):
+        response = self.app.post('/api/portfolio', json={'name': 'Core', 'holdings': [
+            {'asset_class': 'equity', 'symbol': 'tcs.ns', 'quantity': 10},
+            {'asset_class': 'commodity', 'symbol': 'GOLD', 'quantity': 5}]})
+        self.assertEqual(response.status_code, 201)
+        portfolio_id = response.get_json()['data']['id']
+        cache.set(QUOTE_BOOK_KEY, QuoteBook({'equity': {'TCS.NS': (4000.0, 0.0)},
+                                             'commodity': {'GOLD': (6000.0, 0.0)}}), timeout=0)
+        cache.set(GENERATION_KEY, (cache.get(GENERATION_KEY) or 0) + 1, timeout=0)
+
+        data = self.app.get(f'/api/portfolio/{portfolio_id}/valuation').get_json()['data']
+        self.assertEqual((data['market_value'], data['allocation']['commodity']['weight']), (70000.0, 30000 / 70000))
+
+        # Only a change to a class the portfolio holds is revalued
+        cache.set(QUOTE_BOOK_KEY, QuoteBook({'equity': {'TCS.NS': (4000.0, 0.0)}, 'commodity': {'GOLD': (6000.0, 0.0)},
+                                             'crypto': {'BITCOIN': (5e6, 2.0)}}), timeout=0)
+        cache.set(GENERATION_KEY, cache.get(GENERATION_KEY) + 1, timeout=0)
+        self.assertEqual(self.app.get(f'/api/portfolio/{portfolio_id}/valuation').get_json()['data'], data)
+
+        self.app.put(f'/api/portfolio/{portfolio_id}/holdings', json=[{'asset_class': 'crypto', 'symbol': 'bitcoin',
+                                                                       'quantity': 0.5}])
+        data = self.app.get(f'/api/portfolio/{portfolio_id}/valuation').get_json()['data']
+        self.assertEqual((data['market_value'], list(data['allocation'])), (2.5e6, ['crypto']))
+        self.assertEqual(self.app.get(f'/api/portfolio/{portfolio_id}').get_json()['data']['holdings'][0]['symbol'],
+                         'BITCOIN')
+        self.assertEqual(self.app.get('/api/portfolio/999999/valuation').status_code, 404)
+        self.assertEqual(self.app.post('/api/portfolio', json={'name': 'Bad', 'holdings': [
+            {'asset_class': 'bonds', 'symbol': 'X', 'quantity': 1}]}).status_code, 400)
+
+    def test_news_dedup_and_search(self):
+        init_news_search(app)
+        start = datetime(2025, 7, 7, 9, 0)
+        articles = [NewsArticle(title=f'Zephyrcoin rally {i}', description='Quixotic rupee moves', url=f'https://news.example.com/{i}',
+                                source='Wire', published_at=start + timedelta(minutes=i)) for i in range(5)]
+        self.assertEqual(persist_snapshot(app, {'financial_news': articles})['news_items'], 5)
+        repeat = [NewsArticle(title='Zephyrcoin rally 0', description=None, url='https://www.news.example.com/0/',
+                              source='Wire', published_at=start)]
+        self.assertEqual(persist_snapshot(app, {'financial_news': repeat + articles[:1]})['news_items'], 0)
+
+        body = self.app.get('/api/news/search?q=zephyrcoin&limit=3').get_json()
+        self.assertEqual([item['title'] for item in body['data']], [f'Zephyrcoin rally {i}' for i in (4, 3, 2)])
+        body = self.app.get(f"/api/news/search?q=zephyrcoin&limit=3&cursor={body['next_cursor']}").get_json()
+        self.assertEqual([item['title'] for item in body['data']], ['Zephyrcoin rally 1', 'Zephyrcoin rally 0'])
+        self.assertIsNone(body['next_cursor'])
+        self.assertEqual(self.app.get('/api/news/search?q=quixotic+missing').get_json()['data'], [])
+        self.assertEqual(self.app.get('/api/news/search?cursor=bad').status_code, 400)
+
+        # Edited articles are reindexed
+        with app.app_context():
+            db.session.execute(db.update(NewsItem).where(NewsItem.url == 'https://news.example.com/4')
+                               .values(title='Halcyonbond rally 4'))
+            db.session.commit()
+        body = self.app.get('/api/news/search?q=halcyonbond').get_json()
+        self.assertEqual([item['title'] for item in body['data']], ['Halcyonbond rally 4'])
+        self.assertEqual(len(self.app.get('/api/news/search?q=zephyrcoin&limit=10').get_json()['data']), 4)
+
+    def test_mapped_payloads_through_a_wsgi_server(self):
+        # The test client accepts any body; a real server only writes bytes
+        path = os.path.join(tempfile.mkdtemp(), 'snapshot.bin')
+        Publisher(SimpleCache(), snapshot_path=path).publish({'currency_rates': {'USD-INR': CurrencyQuote(
+            symbol='USD-INR', rate=83.5, change_percent=0.0, last_updated=datetime(2025, 7, 1, 10, 0))}})
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}/api'
+        try:
+            with mock.patch.object(routes.api, 'snapshot_reader', SnapshotReader(path, check_interval=0)):
+                response = requests.get(f'{base_url}/currency-rates', timeout=5)
+                self.assertEqual(response.json()['data']['USD-INR']['rate'], 83.5)
+                for encoding in ('identity', 'gzip'):
+                    response = requests.get(f'{base_url}/snapshot', headers={'Accept-Encoding': encoding}, timeout=5)
+                    self.assertEqual(response.json()['data']['currency-rates']['USD-INR']['rate'], 83.5)
+        finally:
+            server.shutdown()
+
+    def test_history_endpoint_rejects_unknown_kind(self):
+        response = self.app.get('/api/history/bonds/XYZ')
+        self.assertEqual(response.status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,745 @@
+import json
+import math
+import os
+import pickle
+import random
+import requests
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+import numpy as np
+from benchmarks.fake_upstream import start_fake_upstream
+from config import Config
+from profiling import ProfilingMiddleware, phase
+from records import CryptoQuote, CurrencyQuote, StockQuote
+from services.alerts import AlertEngine, AlertOutbox, fired_since
+from services.broadcast import Broadcaster
+from services.columnar import SnapshotReader
+from services.data_fetcher import DataFetcher
+from services.fetch_engine import FetchEngine
+from services.fx import RateTable, UnknownCurrency
+from services.http_cache import HttpCache, cache_key
+from services.leader import LeaderLock
+from services.portfolio import Holdings, QuoteBook, QuoteBookBuilder, value_holdings
+from services.market_calendar import IST, SessionGate, is_market_open, next_market_open
+from services.ticks import DAY, HOUR, TickBuffer, TickStore
+from services.news import decode_cursor, encode_cursor, fts_query, url_hash
+from services.ranking import RankingIndex, rank_gainers_losers
+from services.universe import parse_listing
+from services.resilience import CircuitBreaker, ProviderGuard, ProviderUnavailable, RetryBudget, TokenBucket
+from services.metrics import Counter, Histogram
+from services.publisher import (DELTA_KEY, GENERATION_KEY, SNAPSHOT_KEY, Publisher, diff_section,
+                                empty_payload, payload_key, relay_published_delta)
+
+class DictCache(dict):
+    """Minimal stand-in for the Flask-Caching interface"""
+
+    def set(self, key, value, timeout=None):
+        self[key] = value
+
+class FetchEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = FetchEngine(max_workers=8, provider_limits={'slow': 2}, cycle_deadline=2.0)
+
+    def tearDown(self):
+        self.engine.shutdown()
+
+    def test_map_runs_requests_in_parallel(self):
+        started = time.monotonic()
+        results = self.engine.map('fast', lambda item: time.sleep(0.2) or item * 2, range(4))
+        self.assertEqual(results, {0: 0, 1: 2, 2: 4, 3: 6})
+        self.assertLess(time.monotonic() - started, 0.6)
+
+    def test_map_respects_provider_limit(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def work(item):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.05)
+            with lock:
+                state['active'] -= 1
+            return item
+
+        results = self.engine.map('slow', work, range(6))
+        self.assertEqual(len(results), 6)
+        self.assertLessEqual(state['peak'], 2)
+
+    def test_map_skips_failures(self):
+        def work(item):
+            if item == 1:
+                raise ValueError('boom')
+            return item
+
+        self.assertEqual(self.engine.map('fast', work, range(3)), {0: 0, 2: 2})
+
+    def test_run_cycle_drops_jobs_past_deadline(self):
+        self.engine.cycle_deadline = 0.3
+        started = time.monotonic()
+        results = self.engine.run_cycle({
+            'quick': lambda: 'ok',
+            'stuck': lambda: time.sleep(1) or 'late',
+        })
+        self.assertEqual(results, {'quick': 'ok'})
+        self.assertLess(time.monotonic() - started, 0.8)
+
+class BatchQuoteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fetcher = DataFetcher(FetchEngine(max_workers=4, cycle_deadline=2.0))
+        self.requests = []
+
+        def fake_get_json(provider, url, params=None, timeout=10):
+            self.requests.append((url, params))
+            if url.endswith('/spark'):
+                return {'spark': {'result': [
+                    {'symbol': symbol, 'response': [{'meta': {'shortName': symbol.lower(),
+                                                              'regularMarketPrice': 110.0, 'previousClose': 100.0}}]}
+                    for symbol in params['symbols'].split(',') if symbol != 'MISSING.NS'
+                ]}}
+            return {'chart': {'result': [{'meta': {'regularMarketPrice': 90.0, 'previousClose': 100.0}}]}}
+
+        self.fetcher._get_json = fake_get_json
+
+    def tearDown(self):
+        self.fetcher.engine.shutdown()
+
+    def test_quotes_are_fetched_in_chunks(self):
+        symbols = [f'S{i}.NS' for i in range(120)]
+        with mock.patch.object(Config, 'YAHOO_QUOTE_BATCH_SIZE', 50):
+            quotes = self.fetcher.fetch_quotes(symbols)
+        self.assertEqual(len(quotes), 120)
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(quotes['S7.NS']['previous_close'], 100.0)
+
+    def test_missing_symbols_fall_back_to_chart(self):
+        quotes = self.fetcher.fetch_quotes(['A.NS', 'MISSING.NS'])
+        self.assertEqual(quotes['MISSING.NS']['price'], 90.0)
+        self.assertEqual(sum('/chart/' in url for url, _ in self.requests), 1)
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+class HttpCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fetcher = DataFetcher(FetchEngine(max_workers=2, cycle_deadline=2.0),
+                                   HttpCache(self.directory, max_bytes=1 << 20))
+        for guard in self.fetcher.guards.values():
+            guard.max_retries = 0
+        self.responses = []
+        self.requests = []
+
+        def fake_get(url, params=None, headers=None, timeout=None):
+            self.requests.append(headers or {})
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.fetcher.session.get = fake_get
+
+    def tearDown(self):
+        self.fetcher.engine.shutdown()
+
+    def test_fresh_responses_skip_the_request(self):
+        self.responses.append(FakeResponse(200, b'{"value": 1}'))
+        with mock.patch.dict(Config.HTTP_CACHE_TTLS, {'alphavantage': 3600}):
+            self.assertEqual(self.fetcher._get_json('alphavantage', 'https://example.com/wti'), {'value': 1})
+            self.assertEqual(self.fetcher._get_json('alphavantage', 'https://example.com/wti'), {'value': 1})
+        self.assertEqual(len(self.requests), 1)
+
+    def test_revalidation_and_stale_fallback(self):
+        self.responses += [
+            FakeResponse(200, b'{"value": 1}', {'ETag': '"v1"'}),
+            FakeResponse(304),
+            requests.ConnectionError('down'),
+        ]
+        url = 'https://example.com/quotes'
+        for _ in range(3):
+            self.assertEqual(self.fetcher._get_json('yahoo', url, {'symbols': 'A'}), {'value': 1})
+        self.assertEqual(self.requests[1], {'If-None-Match': '"v1"'})
+
+        # Nothing to fall back on for a URL that was never cached
+        self.responses.append(requests.ConnectionError('down'))
+        with self.assertRaises(requests.ConnectionError):
+            self.fetcher._get_json('yahoo', 'https://example.com/other')
+
+    def test_store_evicts_least_recently_used(self):
+        cache = HttpCache(tempfile.mkdtemp(), max_bytes=1 << 20)
+        for name in ('a', 'b', 'c'):
+            cache.store(f'https://example.com/{name}', None, b'x' * 150)
+        # Room for three entries but not four; timestamps vary the metadata's length by a few bytes
+        cache.max_bytes = cache.size + 100
+        cache.get('https://example.com/a')
+        cache.store('https://example.com/d', None, b'x' * 150)
+        self.assertIsNotNone(cache.get('https://example.com/a'))
+        self.assertIsNone(cache.get('https://example.com/b'))
+        self.assertEqual(len(cache), 3)
+        # The index is rebuilt from the files on disk
+        self.assertEqual(len(HttpCache(cache.directory, max_bytes=cache.max_bytes)), 3)
+
+    def test_cached_files_are_data_not_pickles(self):
+        directory = os.path.join(tempfile.mkdtemp(), 'http')
+        cache = HttpCache(directory, max_bytes=1 << 20)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+        cache.store('https://example.com/a', {'q': 1}, b'{"value": 1}\n', etag='"v1"')
+        cached = cache.get('https://example.com/a', {'q': 1})
+        self.assertEqual((cached.body, cached.etag), (b'{"value": 1}\n', '"v1"'))
+        # A planted pickle is discarded rather than loaded
+        with open(os.path.join(directory, cache_key('https://example.com/b')), 'wb') as f:
+            f.write(pickle.dumps(cached))
+        cache = HttpCache(directory, max_bytes=1 << 20)
+        self.assertIsNone(cache.get('https://example.com/b'))
+        self.assertEqual(len(cache), 1)
+
+class FakeUpstreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server, base_url = start_fake_upstream()
+        self.patch = mock.patch.multiple(Config, HTTP_CACHE_ENABLED=False, EXCHANGE_RATE_API_URL=base_url,
+                                         YAHOO_API_URL=base_url, COINGECKO_API_URL=base_url)
+        self.patch.start()
+        self.fetcher = DataFetcher(FetchEngine(max_workers=4, cycle_deadline=5.0))
+        self.fetcher.exchange_rate_api_key = 'test'
+
+    def tearDown(self):
+        self.fetcher.engine.shutdown()
+        self.patch.stop()
+        self.server.shutdown()
+
+    def test_fetch_cycle_against_fake_upstream(self):
+        results = self.fetcher.engine.run_cycle({
+            'currency_rates': self.fetcher.fetch_currency_rates,
+            'crypto_prices': self.fetcher.fetch_crypto_prices,
+            'stock_indices': self.fetcher.fetch_stock_indices,
+        })
+        self.assertEqual(len(results['currency_rates']), 6)
+        self.assertEqual(len(results['crypto_prices']), 8)
+        self.assertEqual(set(results['stock_indices']), set(Config.STOCK_INDICES))
+
+class TickStoreTestCase(unittest.TestCase):
+    def test_rolling_window(self):
+        buffer = TickBuffer(3)
+        start = IST.localize(datetime(2025, 7, 7, 10, 0)).timestamp()
+        for i, value in enumerate([100.0, 90.0, 120.0, 110.0]):
+            buffer.append(start + i * 1800, value)
+        stats = buffer.stats('X')
+        self.assertEqual(stats.ticks, 3)
+        # 100 has left the window
+        self.assertEqual((stats.low, stats.high), (90.0, 120.0))
+        self.assertAlmostEqual(stats.change_percent, (110 - 90) / 90 * 100)
+        self.assertAlmostEqual(stats.change_1h, (110 - 90) / 90 * 100)
+        self.assertIsNone(stats.change_1d)
+        self.assertFalse(buffer.append(start, 50.0))
+
+    def test_previous_close_and_volatility(self):
+        buffer = TickBuffer(10)
+        close = IST.localize(datetime(2025, 7, 7, 23, 0)).timestamp()
+        buffer.append(close - DAY, 95.0)
+        buffer.append(close, 100.0)
+        buffer.append(close + 2 * HOUR, 102.0)
+        stats = buffer.stats('X')
+        self.assertEqual(stats.previous_close, 100.0)
+        self.assertAlmostEqual(stats.change_percent, 2.0)
+        self.assertAlmostEqual(stats.change_1d, (102 - 95) / 95 * 100)
+        returns = [math.log(100 / 95), math.log(102 / 100)]
+        mean = sum(returns) / 2
+        self.assertAlmostEqual(stats.volatility, math.sqrt(sum((r - mean) ** 2 for r in returns)) * 100)
+
+    def test_currency_change_from_ticks(self):
+        fetcher = DataFetcher(FetchEngine(max_workers=1))
+        fetcher.exchange_rate_api_key = 'test'
+        responses = [{'result': 'success', 'conversion_rates': {'USD': 1, 'INR': rate, 'EUR': 0.8}} for rate in (80.0, 84.0)]
+        with mock.patch.object(fetcher, '_get_json', side_effect=responses):
+            self.assertEqual(fetcher.fetch_currency_rates()['USD-INR'].change_percent, 0.0)
+            rates = fetcher.fetch_currency_rates()
+        fetcher.engine.shutdown()
+        self.assertAlmostEqual(rates['USD-INR'].change_percent, 5.0)
+        self.assertAlmostEqual(rates['EUR-INR'].change_percent, 5.0)
+        self.assertEqual(fetcher.ticks.stats('USD-INR').high, 84.0)
+
+def stock(symbol, change_percent):
+    return StockQuote(symbol, symbol, 100.0, change_percent, change_percent, datetime.now(IST))
+
+class RankingTestCase(unittest.TestCase):
+    def test_lists_are_disjoint(self):
+        ranked = rank_gainers_losers([stock(symbol, change) for symbol, change in
+                                      [('A', 1.0), ('B', -2.0), ('C', 3.0), ('D', 0.5), ('E', -1.0)]])
+        self.assertEqual([s.symbol for s in ranked['gainers']], ['C', 'A', 'D'])
+        self.assertEqual([s.symbol for s in ranked['losers']], ['E', 'B'])
+
+    def test_top_matches_full_sort(self):
+        random.seed(7)
+        stocks = [stock(f'S{i}.NS', random.uniform(-10, 10)) for i in range(2500)]
+        ranking = RankingIndex(capacity=16)
+        ranking.update(stocks)
+        ordered = sorted(stocks, key=lambda s: s.change_percent, reverse=True)
+        ranked = ranking.top(100)
+        self.assertEqual(ranked['gainers'], ordered[:100])
+        self.assertEqual(ranked['losers'], ordered[-100:])
+
+    def test_incremental_updates_and_filters(self):
+        listings = {listing.symbol: listing for listing in map(parse_listing, [
+            'HDFCBANK.NS,Financial Services,NIFTY 50|BANK NIFTY', 'SBIN.NS,Financial Services,NIFTY 50|BANK NIFTY',
+            'TCS.NS,Information Technology,NIFTY 50|SENSEX', '# comment'
+        ]) if listing}
+        ranking = RankingIndex(listings)
+        ranking.update([stock('HDFCBANK.NS', 1.0), stock('SBIN.NS', -1.0), stock('TCS.NS', 2.0)])
+        ranking.update([stock('SBIN.NS', 4.0)])
+        ranked = ranking.top(1, index='bank nifty')
+        self.assertEqual([s.symbol for s in ranked['gainers'] + ranked['losers']], ['SBIN.NS', 'HDFCBANK.NS'])
+        ranked = ranking.top(5, sector='Information Technology')
+        self.assertEqual(([s.symbol for s in ranked['gainers']], ranked['losers']), (['TCS.NS'], []))
+        self.assertEqual(ranking.top(5, sector='Energy'), {'gainers': [], 'losers': []})
+
+class AlertEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = AlertEngine()
+        self.engine.load([(1, 'asha', 'TCS.NS', 'above', 105.0), (2, None, 'TCS.NS', 'above', 110.0),
+                          (3, 'asha', 'TCS.NS', 'below', 95.0), (4, None, 'TCS.NS', 'move', 3.0)])
+
+    def fired(self, price, change=0.0):
+        return [(alert.rule_id, alert.kind) for alert in self.engine.evaluate({'TCS.NS': (price, change)}, at=1.0)]
+
+    def test_first_price_only_sets_the_baseline(self):
+        self.assertEqual(self.fired(120.0), [])
+        self.assertEqual(self.fired(121.0), [])
+
+    def test_fires_each_rule_the_price_crosses_once(self):
+        self.engine.prime({'TCS.NS': (100.0, 0.0)})
+        self.assertEqual(self.fired(110.0), [(1, 'above'), (2, 'above')])
+        self.assertEqual(self.fired(112.0), [])
+        self.assertEqual(self.fired(94.0), [(3, 'below')])
+        self.assertEqual(self.fired(105.0), [(1, 'above')])
+
+    def test_percent_moves_fire_both_ways(self):
+        self.engine.prime({'TCS.NS': (100.0, 0.0)})
+        self.assertEqual(self.fired(100.0, 3.5), [(4, 'move')])
+        self.assertEqual(self.fired(100.0, -3.0), [(4, 'move')])
+        alert = self.engine.evaluate({'TCS.NS': (100.0, 3.0)})[0]
+        self.assertEqual((alert.owner, alert.threshold, alert.previous_price), (None, 3.0, 100.0))
+
+    def test_outbox_numbers_alerts_across_leaders(self):
+        cache = DictCache()
+        self.engine.prime({'TCS.NS': (100.0, 0.0)})
+        outbox = AlertOutbox(cache, history=2)
+        self.assertEqual([alert.id for alert in outbox.dispatch(self.engine.evaluate({'TCS.NS': (111.0, 0.0)}))],
+                         [1, 2])
+        outbox = AlertOutbox(cache, history=2)
+        self.assertEqual([alert.id for alert in outbox.dispatch(self.engine.evaluate({'TCS.NS': (90.0, 0.0)}))], [3])
+        recent = cache.get('fired_alerts')
+        self.assertEqual([alert.id for alert in recent], [2, 3])
+        self.assertEqual([alert.rule_id for alert in fired_since(recent, 2, owner='asha')], [3])
+
+class PortfolioValuationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.book = QuoteBook({'equity': {'TCS.NS': (4000.0, 25.0)}, 'cash': {'USD': (80.0, 0.0), 'INR': (1.0, 0.0)}})
+
+    def test_values_every_asset_class_in_one_pass(self):
+        holdings = Holdings.from_rows([('equity', 'TCS.NS', 10), ('cash', 'USD', 500), ('cash', 'INR', 0),
+                                       ('crypto', 'BITCOIN', 1)])
+        valuation = value_holdings(holdings, self.book)
+        self.assertEqual(valuation['market_value'], 80000.0)
+        # 40000 of TCS was 32000 at the previous close
+        self.assertAlmostEqual(valuation['day_pnl'], 8000.0)
+        self.assertAlmostEqual(valuation['day_pnl_percent'], 11.1111111, places=5)
+        self.assertEqual(valuation['allocation']['cash']['weight'], 0.5)
+        self.assertEqual(valuation['unpriced'], ['crypto:BITCOIN'])
+        self.assertIsNone(valuation['holdings'][3]['price'])
+
+    def test_empty_portfolio(self):
+        valuation = value_holdings(Holdings.from_rows([]), None)
+        self.assertEqual((valuation['market_value'], valuation['holdings'], valuation['allocation']), (0.0, [], {}))
+
+    def test_builder_versions_only_move_with_prices(self):
+        builder = QuoteBookBuilder()
+        now = datetime.now()
+        crypto = {'BITCOIN': CryptoQuote('BITCOIN', 'Bitcoin', 5e6, 1.0, now)}
+        first = builder.update({'crypto_prices': crypto})
+        rates = RateTable({'INR': 80.0, 'EUR': 0.8}, 1.0)
+        second = builder.update({'currency_rates': {}}, rates=rates)
+        self.assertEqual(first.versions['crypto'], second.versions['crypto'])
+        self.assertEqual(second.lookup(np.array(['cash:EUR', 'crypto:BITCOIN']))[0].tolist(), [100.0, 5e6])
+        third = builder.update({'crypto_prices': {'BITCOIN': CryptoQuote('BITCOIN', 'Bitcoin', 5.1e6, 3.0, now)}})
+        self.assertNotEqual(third.versions['crypto'], second.versions['crypto'])
+        self.assertEqual(third.versions['cash'], second.versions['cash'])
+        self.assertIsNone(builder.update({'financial_news': []}))
+
+class NewsSearchTestCase(unittest.TestCase):
+    def test_url_hash_ignores_decoration(self):
+        key = url_hash('https://www.example.com/markets/rupee/')
+        self.assertEqual(url_hash('http://example.com/markets/rupee#top'), key)
+        self.assertNotEqual(url_hash('https://example.com/markets/rupee?page=2'), key)
+        self.assertEqual(url_hash('', 'Rupee  Rallies'), url_hash('', 'rupee rallies'))
+
+    def test_fts_query_quotes_terms(self):
+        self.assertEqual(fts_query('rupee OR "gold" infos*'), '"rupee" "OR" "gold" "infos"*')
+        self.assertEqual(fts_query('  '), '')
+
+    def test_cursor_round_trip(self):
+        published_at = datetime(2025, 7, 7, 9, 15, 30)
+        self.assertEqual(decode_cursor(encode_cursor(published_at, 42)), (published_at, 42))
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+
+class RateTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.table = RateTable({'USD': 1, 'INR': 80.0, 'EUR': 0.8, 'JPY': 160.0, 'BAD': 0, 'NAN': float('nan')}, 1.0)
+
+    def test_cross_rates(self):
+        self.assertEqual(self.table.codes.tolist(), ['EUR', 'INR', 'JPY', 'USD'])
+        self.assertAlmostEqual(self.table.rate('EUR', 'JPY'), 200.0)
+        self.assertAlmostEqual(self.table.rate('JPY', 'EUR'), 0.005)
+        self.assertEqual(self.table.rate('INR', 'INR'), 1.0)
+        with self.assertRaises(UnknownCurrency):
+            self.table.rate('BAD', 'INR')
+
+    def test_convert_many_broadcasts(self):
+        rates, converted = self.table.convert_many(['EUR', 'USD', 'JPY'], 'INR', [2, 3, 160])
+        self.assertEqual([round(value, 6) for value in converted.tolist()], [200.0, 240.0, 80.0])
+        with self.assertRaises(UnknownCurrency) as raised:
+            self.table.convert_many(['EUR', 'EURO', 'XYZ'], 'INR', 1)
+        self.assertIn('EURO, XYZ', str(raised.exception))
+
+    def test_pickle_drops_matrix(self):
+        self.table.rate('EUR', 'INR')
+        copy = pickle.loads(pickle.dumps(self.table))
+        self.assertIsNone(copy._cross)
+        self.assertAlmostEqual(copy.rate('EUR', 'INR'), 100.0)
+
+    def test_from_quotes(self):
+        now = datetime.now(IST)
+        quotes = {'USD-INR': CurrencyQuote('USD-INR', 80.0, 0.0, now), 'EUR-INR': CurrencyQuote('EUR-INR', 100.0, 0.0, now)}
+        table = RateTable.from_quotes(quotes, 1.0)
+        self.assertAlmostEqual(table.rate('EUR', 'USD'), 1.25)
+
+class ResilienceTestCase(unittest.TestCase):
+    def test_token_bucket_refuses_when_no_token_in_time(self):
+        bucket = TokenBucket(rate=1.0, capacity=2)
+        self.assertTrue(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        self.assertFalse(bucket.acquire(timeout=0.1))
+
+    def test_retries_then_opens_circuit(self):
+        guard = ProviderGuard('flaky', breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60),
+                              budget=RetryBudget(minimum=5), max_retries=5, backoff=0.001)
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise requests.ConnectionError('down')
+
+        with self.assertRaises(requests.ConnectionError):
+            guard.call(failing, lambda: 5.0)
+        # Stopped retrying once the circuit opened
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(ProviderUnavailable):
+            guard.call(failing, lambda: 5.0)
+        self.assertEqual(len(calls), 3)
+
+    def test_retry_after_trips_without_retrying(self):
+        guard = ProviderGuard('limited', backoff=0.001)
+        response = FakeResponse(429, headers={'Retry-After': '30'})
+        calls = []
+
+        def limited():
+            calls.append(1)
+            raise requests.HTTPError('429', response=response)
+
+        with self.assertRaises(requests.HTTPError):
+            guard.call(limited, lambda: 5.0)
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(guard.breaker.allow())
+
+    def test_client_errors_are_not_retried(self):
+        guard = ProviderGuard('strict', backoff=0.001)
+        calls = []
+
+        def bad_request():
+            calls.append(1)
+            raise requests.HTTPError('401', response=FakeResponse(401))
+
+        with self.assertRaises(requests.HTTPError):
+            guard.call(bad_request, lambda: 5.0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(guard.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_probe_refused_by_rate_limit_reopens_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        guard = ProviderGuard('quota', TokenBucket(rate=0.001, capacity=1), breaker=breaker)
+        self.assertTrue(guard.bucket.acquire())
+        breaker.record_failure()
+        time.sleep(0.06)
+        with self.assertRaises(ProviderUnavailable):
+            guard.call(lambda: 'ok', lambda: 0.0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # Once the bucket refills, the next probe after a fresh timeout gets through
+        guard.bucket = TokenBucket(rate=1.0, capacity=1)
+        time.sleep(0.06)
+        self.assertEqual(guard.call(lambda: 'ok', lambda: 0.0), 'ok')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+class MetricsTestCase(unittest.TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram('test_seconds', 'Test latency', ['provider'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, 'yahoo')
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{provider="yahoo",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{provider="yahoo",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{provider="yahoo",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{provider="yahoo"} 3', lines)
+
+    def test_counter_escapes_labels(self):
+        counter = Counter('test_total', 'Test counter', ['route'])
+        counter.inc('a"b')
+        counter.inc('a"b', amount=2)
+        self.assertEqual(counter.render()[-1], 'test_total{route="a\\"b"} 3')
+
+class ProfilingTestCase(unittest.TestCase):
+    @staticmethod
+    def app(environ, start_response):
+        with phase('cache'):
+            time.sleep(0.01)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    def call(self, middleware, path='/api/currency-rates'):
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured.update(headers)
+
+        body = middleware({'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}, start_response)
+        self.assertEqual(list(body), [b'ok'])
+        return captured
+
+    def test_phases_are_noops_without_middleware(self):
+        self.assertIs(phase('cache'), phase('render'))
+
+    def test_server_timing_and_slow_log(self):
+        middleware = ProfilingMiddleware(self.app, slow_request_ms=5)
+        with self.assertLogs(level='WARNING') as logs:
+            headers = self.call(middleware)
+        self.assertRegex(headers['Server-Timing'], r'^cache;dur=\d+\.\d+, total;dur=')
+        self.assertIn('Slow request GET /api/currency-rates', logs.output[0])
+
+    def test_sampled_requests_are_profiled(self):
+        directory = tempfile.mkdtemp()
+        middleware = ProfilingMiddleware(self.app, sample_rate=1.0, profile_dir=directory,
+                                         slow_request_ms=10000, routes=['/api/'])
+        self.call(middleware)
+        self.call(middleware, path='/metrics')
+        self.assertEqual([name.endswith('-GET-api_currency_rates.prof') for name in os.listdir(directory)], [True])
+
+class PublisherTestCase(unittest.TestCase):
+    def test_publish_renders_present_sections(self):
+        cache = DictCache()
+        now = datetime(2025, 7, 1, 10, 0)
+        results = {
+            'currency_rates': {'USD-INR': CurrencyQuote(symbol='USD-INR', rate=83.5, change_percent=0.0, last_updated=now)}
+        }
+        generation = Publisher(cache).publish(results, next_fetch_at={'currency_rates': 1000.0})
+        self.assertEqual(generation, 1)
+        self.assertEqual(set(cache), {payload_key('currency-rates'), SNAPSHOT_KEY, DELTA_KEY, GENERATION_KEY})
+        payload = cache[payload_key('currency-rates')]
+        self.assertEqual(payload.generation, 1)
+        self.assertEqual(payload.expires_at, 1000.0)
+        self.assertEqual(cache[SNAPSHOT_KEY].payload.expires_at, 1000.0)
+        self.assertEqual(json.loads(payload.body)['data'], {'USD-INR': {
+            'symbol': 'USD-INR', 'rate': 83.5, 'change_percent': 0.0, 'last_updated': now.isoformat()
+        }})
+
+        snapshot = json.loads(cache[SNAPSHOT_KEY].payload.body)['data']
+        self.assertEqual(snapshot['currency-rates'], json.loads(payload.body)['data'])
+        self.assertEqual(snapshot['financial-news'], [])
+
+        self.assertIs(json.loads(payload.body)['stale'], False)
+
+        # Unchanged data keeps its ETag in the next generation
+        Publisher(cache).publish(results)
+        self.assertEqual(cache[payload_key('currency-rates')].generation, 2)
+        self.assertEqual(cache[payload_key('currency-rates')].etag, payload.etag)
+
+    def test_restored_data_is_marked_stale(self):
+        cache = DictCache()
+        publisher = Publisher(cache)
+        fetched = datetime(2025, 7, 1, 10, 0)
+        results = {
+            'currency_rates': {'USD-INR': CurrencyQuote(symbol='USD-INR', rate=83.5, change_percent=0.0, last_updated=fetched)}
+        }
+        publisher.publish(results, as_of={'currency_rates': fetched.timestamp()}, stale=True)
+        body = json.loads(cache[payload_key('currency-rates')].body)
+        self.assertTrue(body['stale'])
+        self.assertEqual(datetime.fromisoformat(body['as_of']).timestamp(), fetched.timestamp())
+        self.assertTrue(json.loads(cache[SNAPSHOT_KEY].payload.body)['stale'])
+
+        # Refetching the same values clears the marker and tells stream clients
+        publisher.publish(results)
+        self.assertFalse(json.loads(cache[payload_key('currency-rates')].body)['stale'])
+        self.assertEqual(json.loads(cache[DELTA_KEY][1])['sections'], {})
+
+    def test_followers_relay_deltas(self):
+        cache = DictCache()
+        leader = Publisher(cache)
+        follower_broadcaster = Broadcaster()
+        now = datetime(2025, 7, 1, 10, 0)
+
+        leader.publish({'currency_rates': {'USD-INR': CurrencyQuote(symbol='USD-INR', rate=83.5, change_percent=0.0, last_updated=now)}})
+        seen = relay_published_delta(cache, follower_broadcaster, 0)
+        self.assertEqual((seen, follower_broadcaster.last_id), (1, 0))
+
+        leader.publish({'currency_rates': {'USD-INR': CurrencyQuote(symbol='USD-INR', rate=83.9, change_percent=0.0, last_updated=now)}})
+        seen = relay_published_delta(cache, follower_broadcaster, seen)
+        frames = follower_broadcaster.wait(0, timeout=0)
+        self.assertEqual(seen, 2)
+        self.assertIn(b'event: delta', frames[0][1])
+
+        # A new leader resumes from the published snapshot
+        successor = Publisher(cache)
+        successor.publish({})
+        self.assertIn(b'83.9', cache[SNAPSHOT_KEY].payload.body)
+
+    def test_empty_payload(self):
+        self.assertEqual(json.loads(empty_payload('gainers-losers').body),
+                         {'success': True, 'data': {'gainers': [], 'losers': []}, 'as_of': None, 'stale': True})
+
+class MarketCalendarTestCase(unittest.TestCase):
+    def test_session_hours(self):
+        # 2025-07-04 is a Friday
+        self.assertTrue(is_market_open(IST.localize(datetime(2025, 7, 4, 9, 15))))
+        self.assertFalse(is_market_open(IST.localize(datetime(2025, 7, 4, 15, 40))))
+        self.assertTrue(is_market_open(IST.localize(datetime(2025, 7, 4, 15, 40)), grace=timedelta(minutes=15)))
+        self.assertFalse(is_market_open(IST.localize(datetime(2025, 7, 5, 11, 0))))
+
+    def test_next_open_skips_weekends_and_holidays(self):
+        friday_evening = IST.localize(datetime(2025, 7, 4, 18, 0))
+        self.assertEqual(next_market_open(friday_evening), IST.localize(datetime(2025, 7, 7, 9, 15)))
+        with mock.patch.object(Config, 'NSE_HOLIDAYS', ['2025-07-07']):
+            self.assertEqual(next_market_open(friday_evening), IST.localize(datetime(2025, 7, 8, 9, 15)))
+
+    def test_one_refresh_after_the_close(self):
+        session = SessionGate(timedelta(minutes=15))
+        self.assertTrue(session.claim('gainers_losers', IST.localize(datetime(2025, 7, 4, 15, 29))))
+        self.assertTrue(session.claim('gainers_losers', IST.localize(datetime(2025, 7, 4, 15, 31))))
+        self.assertFalse(session.due('gainers_losers', IST.localize(datetime(2025, 7, 4, 15, 32))))
+        self.assertFalse(session.claim('gainers_losers', IST.localize(datetime(2025, 7, 4, 15, 32))))
+        # Each provider gets its own run
+        self.assertTrue(session.claim('stock_indices', IST.localize(datetime(2025, 7, 4, 15, 40))))
+        self.assertFalse(session.claim('stock_indices', IST.localize(datetime(2025, 7, 4, 15, 50))))
+        # and the next trading day brings another
+        self.assertTrue(session.claim('gainers_losers', IST.localize(datetime(2025, 7, 7, 15, 31))))
+
+class ColumnarSnapshotTestCase(unittest.TestCase):
+    def test_publish_writes_mapped_snapshot(self):
+        path = os.path.join(tempfile.mkdtemp(), 'snapshot.bin')
+        cache = DictCache()
+        publisher = Publisher(cache, snapshot_path=path)
+        now = datetime(2025, 7, 1, 10, 0)
+        publisher.publish({'currency_rates': {
+            'USD-INR': CurrencyQuote(symbol='USD-INR', rate=83.5, change_percent=0.0, last_updated=now),
+            'EUR-INR': CurrencyQuote(symbol='EUR-INR', rate=90.25, change_percent=1.0, last_updated=now)
+        }})
+
+        reader = SnapshotReader(path, check_interval=0)
+        self.assertIsNone(reader.table('stocks'))
+        generation, columns = reader.table('currency-rates')
+        self.assertEqual((generation, columns['symbol']), (1, ['USD-INR', 'EUR-INR']))
+        prices = columns['price']
+        self.assertFalse(prices.flags.owndata)
+        self.assertEqual(prices.tolist(), [83.5, 90.25])
+
+        payload = reader.payload('currency-rates')
+        self.assertEqual(bytes(payload.body), cache[payload_key('currency-rates')].body)
+        self.assertEqual(payload.generation, 1)
+
+        publisher.publish({'currency_rates': {
+            'USD-INR': CurrencyQuote(symbol='USD-INR', rate=84.0, change_percent=0.0, last_updated=now)
+        }})
+        self.assertEqual(reader.table('currency-rates')[1]['price'].tolist(), [84.0])
+        # Arrays from the replaced file stay readable
+        self.assertEqual(prices.tolist(), [83.5, 90.25])
+
+    def test_ranking_from_mapped_stock_columns(self):
+        path = os.path.join(tempfile.mkdtemp(), 'snapshot.bin')
+        now = datetime(2025, 7, 1, 10, 0)
+        stocks = [StockQuote(f'S{i}.NS', f'S{i}', 100.0 + i, float(i), float(i), now) for i in range(-3, 4)]
+        Publisher(DictCache(), snapshot_path=path).publish({'gainers_losers': rank_gainers_losers(stocks)})
+        generation, columns = SnapshotReader(path, check_interval=0).table('stocks')
+        ranking = RankingIndex.from_columns(columns, updated_at=float(generation))
+        top = ranking.top(2)
+        self.assertEqual([stock.symbol for stock in top['gainers']], ['S3.NS', 'S2.NS'])
+        self.assertEqual(top['losers'][-1], stocks[0])
+
+class LeaderLockTestCase(unittest.TestCase):
+    def test_only_one_leader(self):
+        path = os.path.join(tempfile.mkdtemp(), 'leader.lock')
+        first, second = LeaderLock(path), LeaderLock(path)
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+        first.release()
+        self.assertTrue(second.try_acquire())
+        second.release()
+
+class BroadcastTestCase(unittest.TestCase):
+    def test_subscribers_share_one_frame(self):
+        broadcaster = Broadcaster(history=2)
+        received = []
+
+        def subscriber():
+            received.append(broadcaster.wait(0, timeout=2))
+
+        threads = [threading.Thread(target=subscriber) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        broadcaster.publish('delta', b'{}')
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(received), 3)
+        self.assertTrue(all(frames[0][1] is received[0][0][1] for frames in received))
+        self.assertTrue(received[0][0][1].startswith(b'id: 1\nevent: delta\n'))
+
+    def test_wait_times_out_and_detects_gaps(self):
+        broadcaster = Broadcaster(history=2)
+        self.assertEqual(broadcaster.wait(0, timeout=0.01), [])
+        for _ in range(3):
+            broadcaster.publish('delta', b'{}')
+        self.assertIsNone(broadcaster.wait(0, timeout=0))
+        self.assertEqual([event_id for event_id, _ in broadcaster.wait(1, timeout=0)], [2, 3])
+
+    def test_event_ids_follow_generations(self):
+        broadcaster = Broadcaster(history=2)
+        # An id from before a restart is ahead of this process: resynchronise
+        self.assertIsNone(broadcaster.wait(57, timeout=0))
+        for generation in (4, 6, 9):
+            broadcaster.publish('delta', b'{}', generation)
+        self.assertTrue(broadcaster.wait(6, timeout=0)[0][1].startswith(b'id: 9\n'))
+        # Skipped generations are not gaps; events dropped from the history are
+        self.assertEqual([event_id for event_id, _ in broadcaster.wait(5, timeout=0)], [6, 9])
+        self.assertIsNone(broadcaster.wait(3, timeout=0))
+
+    def test_diff_section_ignores_timestamps(self):
+        old = {'BTC': {'price_inr': 1.0, 'last_updated': 'a'}, 'ETH': {'price_inr': 2.0, 'last_updated': 'a'}}
+        new = {'BTC': {'price_inr': 1.0, 'last_updated': 'b'}, 'SOL': {'price_inr': 3.0, 'last_updated': 'b'}}
+        self.assertEqual(diff_section(old, new), {'changed': {'SOL': new['SOL']}, 'removed': ['ETH']})
+        self.assertIsNone(diff_section(new, {'BTC': {'price_inr': 1.0, 'last_updated': 'c'}, 'SOL': new['SOL']}))
+        self.assertEqual(diff_section([], [{'title': 'x'}]), {'replace': [{'title': 'x'}]})
+
+if __name__ == '__main__':
+    unittest.main()